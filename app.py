@@ -1,486 +1,791 @@
+import logging
 import os, re
-from flask import Flask, render_template, request
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context, url_for
 from PyPDF2 import PdfReader
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from werkzeug.exceptions import RequestEntityTooLarge
 import json
 import requests
+import tempfile
 import time
 
+import batch
+from bill_cache import BillCache, digest_cache_key
+from bill_templates import TemplateRegistry
+from claim_decision import clean_and_convert_amount, decide_claim
+from duplicate_index import DuplicateIndex
+from exclusion_index import ExclusionIndex
+from extraction_cascade import ExtractionCascade, Tier
+from hf_client import CircuitBreaker, EndpointUnavailableError, HFInferenceClient
+from job_queue import JobQueue
+from local_model import LOCAL_QA_WARMUP, ask_local_qa, is_local_qa_warm, local_qa_status, warm_up_local_qa
+from metrics import EXTRACTION_TIER, STAGE_SECONDS, TEMPLATE_MATCHES, registry, timed
+from ocr import ocr_pages, page_fingerprint
+from policy_engine import PolicyEngine
+from uploads import UploadError, UploadRequest, looks_like_pdf, open_upload
+
+# LOG_LEVEL=DEBUG shows per-claim extraction details
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
 # Flask App
 app = Flask(__name__)
+# Body size limits (MAX_UPLOAD_BYTES) are enforced before uploads are buffered
+app.request_class = UploadRequest
 
 # Free API tokens (get from Hugging Face)
 HF_TOKEN = os.environ.get('HF_TOKEN', 'your api key')
 
-# Explicitly specify model for local fallback
-try:
-    from transformers import pipeline
-    # Use a smaller, efficient model
-    local_qa = pipeline('question-answering', model="distilbert-base-cased-distilled-squad")
-except ImportError:
-    local_qa = None
-except Exception as e:
-    print(f"Error loading local model: {str(e)}")
-    local_qa = None
-
-general_exclusion_list = ["HIV/AIDS", "Parkinson's disease", "Alzheimer's disease", 
-                         "pregnancy", "substance abuse", "self-inflicted injuries", 
-                         "sexually transmitted diseases(std)", "pre-existing conditions"]
-
-# Policy document cache
-policy_docs = {
-    "claim_approval": "Documents required: ID proof, medical bills, doctor's prescription, hospital discharge summary.",
-    "exclusions": "General exclusions: " + ", ".join(general_exclusion_list)
-}
+# Shared, pooled client for the Hugging Face inference fallback
+hf_client = HFInferenceClient(
+    token=HF_TOKEN,
+    connect_timeout=float(os.environ.get('HF_CONNECT_TIMEOUT', 3)),
+    read_timeout=float(os.environ.get('HF_READ_TIMEOUT', 10)),
+    max_retries=int(os.environ.get('HF_MAX_RETRIES', 2)),
+    max_concurrency=int(os.environ.get('HF_MAX_CONCURRENCY', 8)),
+    breaker=CircuitBreaker(failure_threshold=int(os.environ.get('HF_BREAKER_THRESHOLD', 5)),
+                           reset_timeout=float(os.environ.get('HF_BREAKER_RESET', 30)))
+)
+
+# The local QA fallback model is loaded on first use, not at import;
+# LOCAL_QA_WARMUP=1 starts loading it in the background at boot instead
+if LOCAL_QA_WARMUP:
+    warm_up_local_qa()
+
+# Insurance products (exclusions, tolerances, caps, required fields) live in versioned
+# policy files and are hot-reloaded when they change
+policy_engine = PolicyEngine(
+    os.environ.get('POLICY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'policies')),
+    default_product=os.environ.get('DEFAULT_POLICY_PRODUCT', 'general-health'),
+    reload_interval=float(os.environ.get('POLICY_RELOAD_INTERVAL', 2))
+)
+
+# Layout templates for known hospital chains, read before the generic regex patterns
+template_registry = TemplateRegistry(
+    os.environ.get('BILL_TEMPLATE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bill_templates'))
+)
+
+# Bump whenever text or field extraction changes so stale cache entries are ignored;
+# the loaded template set is part of it
+EXTRACTOR_VERSION = f"3.{template_registry.version}"
 
+# Extracted text and bill_info keyed by the hash of the uploaded PDF
+bill_cache = BillCache(
+    max_entries=int(os.environ.get('BILL_CACHE_SIZE', 256)),
+    db_path=os.environ.get('BILL_CACHE_DB') or None,
+    max_db_bytes=int(os.environ.get('BILL_CACHE_DB_MAX_BYTES', 256 * 1024 * 1024)),
+    ttl_seconds=int(os.environ.get('BILL_CACHE_TTL', 7 * 24 * 3600))
+)
+
+# Every processed bill is added to a MinHash-LSH index shared by all workers, and
+# claims are checked against it for resubmitted or lightly edited bills. The index
+# holds claimants' details, so it needs an explicit (owner-only) DUPLICATE_INDEX_DIR
+DUPLICATE_INDEX_DIR = os.environ.get('DUPLICATE_INDEX_DIR')
+duplicate_index = DuplicateIndex(DUPLICATE_INDEX_DIR) if (
+    DUPLICATE_INDEX_DIR and os.environ.get('DUPLICATE_DETECTION', '1') == '1') else None
+# The only parts of a hit a claimant sees; the earlier claim's details stay in the index
+DUPLICATE_HIT_FIELDS = ('id', 'similarity', 'exact', 'created')
+DUPLICATE_TOP_K = int(os.environ.get('DUPLICATE_TOP_K', 5))
+DUPLICATE_MIN_SIMILARITY = float(os.environ.get('DUPLICATE_MIN_SIMILARITY', 0.8))
+
+# Limits on how much of a PDF is read, to cap memory on very large bills
+PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', 500))
+PDF_MAX_TEXT_BYTES = int(os.environ.get('PDF_MAX_TEXT_BYTES', 5 * 1024 * 1024))
+
+# PDF_STREAMING=1 extracts fields page by page and stops reading once they are found
+PDF_STREAMING = os.environ.get('PDF_STREAMING') == '1'
+
+def iter_pdf_pages(file, edges_first=False, max_pages=PDF_MAX_PAGES, max_text_bytes=PDF_MAX_TEXT_BYTES,
+                   image_pages=None):
+    """Yield (page_index, text) for pages with a text layer, within the page and text limits.
+    
+    With edges_first the first and last pages come before the rest, since that is
+    where bills usually carry the diagnosis and the amount payable. Pages without
+    a text layer are recorded in the image_pages dict (index -> fingerprint) for OCR.
+    """
+    pdf = PdfReader(file)
+    page_count = len(pdf.pages)
+    order = range(page_count)
+    if edges_first and page_count > 2:
+        order = [0, page_count - 1] + list(range(1, page_count - 1))
+    
+    text_bytes = 0
+    for pages_read, index in enumerate(order):
+        if pages_read >= max_pages:
+            logger.warning("PDF page limit reached (%s of %s pages read)", max_pages, page_count)
+            return
+        page = pdf.pages[index]
+        page_text = page.extract_text()
+        if not page_text or not page_text.strip():
+            fingerprint = page_fingerprint(page) if image_pages is not None else None
+            if fingerprint:
+                image_pages[index] = fingerprint
+            continue
+        text_bytes += len(page_text)
+        if text_bytes > max_text_bytes:
+            logger.warning("PDF text limit reached (%s bytes)", max_text_bytes)
+            return
+        yield index, page_text
+
+@timed('get_file_content')
 def get_file_content(file):
     """Enhanced PDF text extraction with better error handling"""
-    text = ""
-    if file.filename.endswith(".pdf"):
-        try:
-            pdf = PdfReader(file)
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:  # Only add if text was extracted
-                    text += page_text + "\n"
-        except Exception as e:
-            print(f"Error reading PDF: {str(e)}")
-            return ""
-    return text.strip()
+    if not looks_like_pdf(file):
+        return ""
+    image_pages = {}
+    try:
+        pages = dict(iter_pdf_pages(file, image_pages=image_pages))
+    except Exception as e:
+        logger.warning("Error reading PDF: %s", e)
+        return ""
+    if image_pages:
+        pages.update(read_scanned_pages(file, image_pages))
+    return "\n".join(pages[index] for index in sorted(pages)).strip()
 
-def extract_expense_with_regex(text):
-    """Enhanced regex method for expense extraction with better patterns"""
-    import re
-    
-    print(f"Extracting from text: {text}")
-    
-    # Split text into lines for better processing
-    lines = text.split('\n')
-    amounts = []
-    
-    # Priority patterns - check for final amounts first
-    priority_patterns = [
-        # High priority: Amount payable, Final amount, Net amount
-        r'(?:Amount payable|Net amount|Final amount|Amount due|Total payable|Payable amount)[:\s-]*(\d{1,6}(?:\.\d{0,2})?)',
-        # Total with various formats
-        r'(?:Total charge|Total amount|Grand total|Final total)[:\s-]*(\d{1,6}(?:\.\d{0,2})?)',
-        # Amount after discount
-        r'(?:After discount|Post discount)[:\s-]*(\d{1,6}(?:\.\d{0,2})?)'
-    ]
-    
-    # Check priority patterns first
-    for pattern in priority_patterns:
-        for line in lines:
-            try:
-                matches = re.findall(pattern, line, re.IGNORECASE)
-                for match in matches:
-                    try:
-                        amount_val = float(str(match).strip())
-                        if amount_val >= 1.0:
-                            print(f"Priority match found: {amount_val} from line: {line.strip()}")
-                            amounts.append(amount_val)
-                    except (ValueError, TypeError):
-                        continue
-            except Exception as e:
-                print(f"Priority pattern error: {str(e)}")
+def read_scanned_pages(file, image_pages):
+    """OCR the pages that have no text layer, caching text per page"""
+    with STAGE_SECONDS.time(stage='ocr'):
+        return ocr_pages(file, image_pages, cache=bill_cache)
+
+def read_bill_streaming(file):
+    """Stream pages edges-first and stop as soon as a labeled diagnosis and a priority amount are found.
+    
+    Returns (text, bill_info). bill_info is None when the early exit did not succeed
+    or the bill has a layout template; text then holds every page read (with scanned
+    pages OCR'd), in page order, for the regular extraction cascade.
+    """
+    if not looks_like_pdf(file):
+        return "", None
+    
+    pages = {}
+    image_pages = {}
+    diagnosis = None
+    priority_amounts = []
+    keyword_lines = []
+    early_exit = True
+    try:
+        for index, page_text in iter_pdf_pages(file, edges_first=True, image_pages=image_pages):
+            pages[index] = page_text
+            if not early_exit:
                 continue
+            diagnosis = diagnosis or extract_labeled_diagnosis(page_text)
+            page_priority, page_keyword_lines = scan_expense_lines(page_text)
+            priority_amounts += page_priority
+            keyword_lines += page_keyword_lines
+            if diagnosis and priority_amounts:
+                # Known layouts are read by their template over the whole bill (e.g. its last
+                # amount payable), as without streaming, so both modes cache the same fields
+                if template_registry.match("\n".join(pages[index] for index in sorted(pages))) is None:
+                    break
+                early_exit = False
+    except Exception as e:
+        logger.warning("Error reading PDF: %s", e)
+        return "", None
     
-    # If priority patterns found amounts, return the highest one
-    if amounts:
-        final_amount = max(amounts)
-        print(f"Using priority amount: {final_amount}")
-        return final_amount
+    if early_exit and diagnosis and priority_amounts:
+        text = "\n".join(pages[index] for index in sorted(pages)).strip()
+        return text, {'disease': diagnosis, 'expense': select_expense(priority_amounts, keyword_lines)}
     
-    # Fallback patterns for other amount formats
-    fallback_patterns = [
-        # Pattern for "Total: $XXX.XX" or "Amount: $XXX.XX"
-        r'(?:Total|Amount|Bill|Charge)[:\s]*[\$₹€£]?\s*(\d{1,6}(?:,\d{3})*(?:\.\d{0,2})?)',
-        
-        # Pattern for standalone currency amounts
-        r'[\$₹€£]\s*(\d{1,6}(?:,\d{3})*(?:\.\d{0,2})?)',
-        
-        # Pattern for amounts at end of lines (common in bills)
-        r'(\d{1,6}(?:\.\d{2}))\s*$',
-        
-        # Pattern for "XXX.XX USD" or similar
-        r'(\d{1,6}(?:,\d{3})*(?:\.\d{0,2}))\s*(?:USD|INR|EUR|GBP)',
-        
-        # Pattern for amounts after dash or colon
-        r'[-:]\s*(\d{1,6}(?:\.\d{0,2})?)\s*$',
-        
-        # Pattern for decimal amounts without currency symbols
-        r'\b(\d{3,6}(?:\.\d{2})?)\b'
-    ]
+    # Scanned pages are only OCR'd once the text layer alone has not been enough
+    if image_pages:
+        pages.update(read_scanned_pages(file, image_pages))
+    return "\n".join(pages[index] for index in sorted(pages)).strip(), None
+
+# Expense patterns are compiled once at import; extract_expense_with_regex runs per claim
+AMOUNT_PRIORITY_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    # High priority: Amount payable, Final amount, Net amount
+    r'(?:Amount payable|Net amount|Final amount|Amount due|Total payable|Payable amount)[:\s-]*(\d{1,6}(?:\.\d{0,2})?)',
+    # Total with various formats
+    r'(?:Total charge|Total amount|Grand total|Final total)[:\s-]*(\d{1,6}(?:\.\d{0,2})?)',
+    # Amount after discount
+    r'(?:After discount|Post discount)[:\s-]*(\d{1,6}(?:\.\d{0,2})?)'
+]]
+
+# Cheap gate so lines without any priority phrase skip the priority patterns entirely
+AMOUNT_PRIORITY_GATE = re.compile(
+    r'amount payable|net amount|final amount|amount due|total payable|payable amount'
+    r'|total charge|total amount|grand total|final total|after discount|post discount',
+    re.IGNORECASE
+)
+
+AMOUNT_FALLBACK_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    # Pattern for "Total: $XXX.XX" or "Amount: $XXX.XX"
+    r'(?:Total|Amount|Bill|Charge)[:\s]*[\$₹€£]?\s*(\d{1,6}(?:,\d{3})*(?:\.\d{0,2})?)',
     
-    for pattern in fallback_patterns:
-        try:
-            # Search line by line for context-aware extraction
-            for line in lines:
-                line = line.strip()
-                if any(keyword in line.lower() for keyword in ['total', 'amount', 'due', 'bill', 'charge', 'pay', 'fee']):
-                    matches = re.findall(pattern, line, re.IGNORECASE)
-                    for match in matches:
-                        try:
-                            clean_amount = str(match).replace(',', '').strip()
-                            amount_val = float(clean_amount)
-                            if amount_val >= 10.0:  # Reasonable minimum for medical bills
-                                print(f"Fallback match found: {amount_val} from line: {line.strip()}")
-                                amounts.append(amount_val)
-                        except (ValueError, TypeError):
-                            continue
-                            
-        except Exception as e:
-            print(f"Fallback pattern error: {str(e)}")
-            continue
+    # Pattern for standalone currency amounts
+    r'[\$₹€£]\s*(\d{1,6}(?:,\d{3})*(?:\.\d{0,2})?)',
     
-    if amounts:
-        # Remove duplicates and sort
-        unique_amounts = list(set(amounts))
-        unique_amounts.sort(reverse=True)
-        
-        # Filter out unrealistic amounts
-        reasonable_amounts = [amt for amt in unique_amounts if 10.0 <= amt <= 1000000]
-        
-        if reasonable_amounts:
-            final_amount = reasonable_amounts[0]
-            print(f"Final extracted amount: {final_amount}")
-            return final_amount
+    # Pattern for amounts at end of lines (common in bills)
+    r'(\d{1,6}(?:\.\d{2}))\s*$',
     
-    print("No amount found")
-    return None
-
-def extract_diagnosis_with_regex(text):
-    """Enhanced regex to find diagnosis with more patterns"""
-    import re
-    
-    patterns = [
-        r'Diagnosis[:\s]+(.*?)(?:\n|$|\.)',
-        r'Condition[:\s]+(.*?)(?:\n|$|\.)',
-        r'Reason for Visit[:\s]+(.*?)(?:\n|$|\.)',
-        r'Treatment for[:\s]+(.*?)(?:\n|$|\.)',
-        r'Presenting Complaint[:\s]+(.*?)(?:\n|$|\.)',
-        r'Chief Complaint[:\s]+(.*?)(?:\n|$|\.)',
-        r'Primary Diagnosis[:\s]+(.*?)(?:\n|$|\.)',
-        r'Medical Condition[:\s]+(.*?)(?:\n|$|\.)',
-        r'Disease[:\s]+(.*?)(?:\n|$|\.)',
-        r'Illness[:\s]+(.*?)(?:\n|$|\.)'
-    ]
-    
-    for pattern in patterns:
-        try:
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-            if match:
-                diagnosis = match.group(1).strip()
-                # Clean up the diagnosis text
-                diagnosis = re.sub(r'\s+', ' ', diagnosis)  # Replace multiple spaces
-                if len(diagnosis) > 3 and len(diagnosis) < 100:  # Reasonable length
-                    return diagnosis
-        except Exception as e:
-            print(f"Diagnosis extraction error: {str(e)}")
-            continue
+    # Pattern for "XXX.XX USD" or similar
+    r'(\d{1,6}(?:,\d{3})*(?:\.\d{0,2}))\s*(?:USD|INR|EUR|GBP)',
     
-    # Fallback: Look for common medical terms
-    medical_terms_pattern = r'\b(pregnancy|fever|cancer|diabetes|fracture|injury|infection|bodyache|headache|asthma|flu|cold|pneumonia|bronchitis|hypertension|migraine|arthritis|gastritis|appendicitis|tonsillitis|sinusitis|dermatitis|conjunctivitis)\b'
-    try:
-        match = re.search(medical_terms_pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(0).title()
-    except Exception as e:
-        print(f"Medical terms extraction error: {str(e)}")
+    # Pattern for amounts after dash or colon
+    r'[-:]\s*(\d{1,6}(?:\.\d{0,2})?)\s*$',
     
-    return None
+    # Pattern for decimal amounts without currency symbols
+    r'\b(\d{3,6}(?:\.\d{2})?)\b'
+]]
+
+# Fallback patterns only apply to lines mentioning one of these keywords
+AMOUNT_KEYWORDS = ('total', 'amount', 'due', 'bill', 'charge', 'pay', 'fee')
 
-def clean_and_convert_amount(amount):
-    """Enhanced amount conversion with better error handling"""
-    if amount is None:
-        return 0.0
+def scan_expense_lines(text):
+    """Classify every line once: returns (priority amounts, lines eligible for the fallback tier)"""
+    priority_amounts = []
+    keyword_lines = []
+    
+    for line in text.split('\n'):
+        if AMOUNT_PRIORITY_GATE.search(line):
+            for pattern in AMOUNT_PRIORITY_PATTERNS:
+                for match in pattern.findall(line):
+                    try:
+                        amount_val = float(match)
+                    except ValueError:
+                        continue
+                    if amount_val >= 1.0:
+                        priority_amounts.append(amount_val)
         
-    if isinstance(amount, str):
-        # Remove currency symbols, commas, and extra spaces
-        clean_amount = re.sub(r'[^\d.]', '', amount.strip())
-        try:
-            if clean_amount:
-                return float(clean_amount)
-            else:
-                return 0.0
-        except ValueError:
-            return 0.0
-    elif isinstance(amount, (int, float)):
-        return float(amount)
-    else:
-        return 0.0
+        # Keyword lines only matter while no priority match exists
+        if not priority_amounts:
+            stripped = line.strip()
+            lowered = stripped.lower()
+            if any(keyword in lowered for keyword in AMOUNT_KEYWORDS):
+                keyword_lines.append(stripped)
+    
+    return priority_amounts, keyword_lines
 
-def get_bill_info(data):
-    """Enhanced bill information extraction with better fallbacks"""
-    print(f"Processing bill text (first 200 chars): {data[:200]}...")
-    
-    # First try to extract with enhanced regex
-    diagnosis = extract_diagnosis_with_regex(data)
-    expense = extract_expense_with_regex(data)
-    
-    print(f"Regex extraction - Diagnosis: {diagnosis}, Expense: {expense}")
+def select_expense(priority_amounts, keyword_lines):
+    """Pick the bill amount from scan_expense_lines output"""
+    # If priority patterns found amounts, return the highest one
+    if priority_amounts:
+        final_amount = max(priority_amounts)
+        logger.debug("Using priority amount: %s", final_amount)
+        return final_amount
     
-    if diagnosis and expense is not None and expense > 0:
-        return {'disease': diagnosis, 'expense': expense}
+    best_amount = None
+    for line in keyword_lines:
+        for pattern in AMOUNT_FALLBACK_PATTERNS:
+            for match in pattern.findall(line):
+                try:
+                    amount_val = float(match.replace(',', ''))
+                except ValueError:
+                    continue
+                # Reasonable range for medical bills
+                if 10.0 <= amount_val <= 1000000 and (best_amount is None or amount_val > best_amount):
+                    best_amount = amount_val
+    
+    if best_amount is not None:
+        logger.debug("Final extracted amount: %s", best_amount)
+        return best_amount
+    
+    logger.debug("No amount found")
+    return None
+
+# Field confidence reported by the regex tier: explicit labels and payable totals
+# are trusted more than a bare medical term or an amount on a keyword line
+REGEX_LABELED_CONFIDENCE = 0.9
+REGEX_UNLABELED_CONFIDENCE = 0.7
+
+@timed('extract_expense_with_regex')
+def regex_expense(text):
+    """(expense, confidence) from one pass over the priority and fallback patterns"""
+    priority_amounts, keyword_lines = scan_expense_lines(text)
+    expense = select_expense(priority_amounts, keyword_lines)
+    if expense is None:
+        return None, 0.0
+    return expense, REGEX_LABELED_CONFIDENCE if priority_amounts else REGEX_UNLABELED_CONFIDENCE
+
+def extract_expense_with_regex(text):
+    """Single-pass expense extraction over precompiled priority and fallback patterns"""
+    return regex_expense(text)[0]
+
+DIAGNOSIS_PATTERNS = [re.compile(p, re.IGNORECASE | re.DOTALL) for p in [
+    r'Diagnosis[:\s]+(.*?)(?:\n|$|\.)',
+    r'Condition[:\s]+(.*?)(?:\n|$|\.)',
+    r'Reason for Visit[:\s]+(.*?)(?:\n|$|\.)',
+    r'Treatment for[:\s]+(.*?)(?:\n|$|\.)',
+    r'Presenting Complaint[:\s]+(.*?)(?:\n|$|\.)',
+    r'Chief Complaint[:\s]+(.*?)(?:\n|$|\.)',
+    r'Primary Diagnosis[:\s]+(.*?)(?:\n|$|\.)',
+    r'Medical Condition[:\s]+(.*?)(?:\n|$|\.)',
+    r'Disease[:\s]+(.*?)(?:\n|$|\.)',
+    r'Illness[:\s]+(.*?)(?:\n|$|\.)'
+]]
+
+MEDICAL_TERMS_PATTERN = re.compile(r'\b(pregnancy|fever|cancer|diabetes|fracture|injury|infection|bodyache|headache|asthma|flu|cold|pneumonia|bronchitis|hypertension|migraine|arthritis|gastritis|appendicitis|tonsillitis|sinusitis|dermatitis|conjunctivitis)\b', re.IGNORECASE)
+
+def extract_labeled_diagnosis(text):
+    """Diagnosis from an explicit label such as 'Diagnosis:' or 'Chief Complaint:'"""
+    for pattern in DIAGNOSIS_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            diagnosis = match.group(1).strip()
+            # Clean up the diagnosis text
+            diagnosis = re.sub(r'\s+', ' ', diagnosis)  # Replace multiple spaces
+            if len(diagnosis) > 3 and len(diagnosis) < 100:  # Reasonable length
+                return diagnosis
+    return None
+
+@timed('extract_diagnosis_with_regex')
+def regex_diagnosis(text):
+    """(diagnosis, confidence) from a label, else from a known medical term"""
+    diagnosis = extract_labeled_diagnosis(text)
+    if diagnosis:
+        return diagnosis, REGEX_LABELED_CONFIDENCE
     
-    # If regex fails, try Hugging Face API
-    API_URL = "https://api-inference.huggingface.co/models/google/flan-t5-xxl"
-    headers = {"Authorization": f"Bearer {HF_TOKEN}"}
+    # Fallback: Look for common medical terms
+    match = MEDICAL_TERMS_PATTERN.search(text)
+    if match:
+        return match.group(0).title(), REGEX_UNLABELED_CONFIDENCE
     
-    prompt = f"""From this medical bill text, extract:
-1. The medical condition or disease being treated
-2. The total amount or expense (as a number only)
+    return None, 0.0
 
-Text: {data[:1000]}
+def extract_diagnosis_with_regex(text):
+    """Enhanced regex to find diagnosis with more patterns"""
+    return regex_diagnosis(text)[0]
 
-Return in this exact JSON format: {{"disease":"condition name","expense":"amount as number"}}"""
-    
+# Questions asked of the local QA model for each bill
+DISEASE_QUESTION = "What is the primary medical condition or disease being treated?"
+EXPENSE_QUESTION = "What is the total expense amount on this medical bill?"
+QA_QUESTIONS = {'disease': DISEASE_QUESTION, 'expense': EXPENSE_QUESTION}
+
+# What the Hugging Face prompt asks for, per field
+HF_FIELD_REQUESTS = {'disease': ("The medical condition or disease being treated", '"disease":"condition name"'),
+                     'expense': ("The total amount or expense (as a number only)", '"expense":"amount as number"')}
+
+# Confidence of Hugging Face answers: well-formed JSON, or JSON recovered from surrounding text
+HF_CONFIDENCE = 0.8
+HF_RECOVERED_CONFIDENCE = 0.7
+
+# Local QA answers below this score are ignored for the diagnosis
+LOCAL_QA_MIN_SCORE = 0.1
+
+# Fields read at a known layout's anchors are trusted over the generic patterns
+TEMPLATE_CONFIDENCE = 0.95
+
+@timed('extract_with_template')
+def template_tier(text, fields, deadline):
+    template = template_registry.match(text)
+    TEMPLATE_MATCHES.inc(template=template.name if template else 'none')
+    if template is None:
+        return {}
+    found = {field: (value, TEMPLATE_CONFIDENCE) for field, value in template.extract(text, fields).items()}
+    logger.debug("Template %s extraction: %s", template.name, found)
+    return found
+
+def regex_tier(text, fields, deadline):
+    found = {}
+    if 'disease' in fields:
+        found['disease'] = regex_diagnosis(text)
+    if 'expense' in fields:
+        found['expense'] = regex_expense(text)
+    logger.debug("Regex extraction: %s", found)
+    return found
+
+def build_hf_prompt(text, fields):
+    """Extraction prompt asking only for ``fields``"""
+    requests_text = "\n".join(f"{number}. {HF_FIELD_REQUESTS[field][0]}" for number, field in enumerate(fields, 1))
+    json_format = "{" + ",".join(HF_FIELD_REQUESTS[field][1] for field in fields) + "}"
+    return f"""From this medical bill text, extract:
+{requests_text}
+
+Text: {text[:1000]}
+
+Return in this exact JSON format: {json_format}"""
+
+def parse_hf_answer(response_text):
+    """(dict, confidence) from generated text; ({}, 0.0) if it holds no JSON object"""
     try:
-        response = requests.post(API_URL, headers=headers, json={"inputs": prompt}, timeout=10)
-        response.raise_for_status()
-        result = response.json()
-        
-        if result and isinstance(result, list) and 'generated_text' in result[0]:
-            response_text = result[0]['generated_text']
-            print(f"API response: {response_text}")
-            
-            try:
-                # Try to parse as JSON
-                parsed_result = json.loads(response_text)
-                api_diagnosis = parsed_result.get('disease', '')
-                api_expense = clean_and_convert_amount(parsed_result.get('expense', 0))
-                
-                # Use API results if they're better than regex
-                final_diagnosis = api_diagnosis if api_diagnosis and len(api_diagnosis) > 2 else diagnosis
-                final_expense = api_expense if api_expense > 0 else expense
-                
-                if final_diagnosis and final_expense and final_expense > 0:
-                    return {'disease': final_diagnosis, 'expense': final_expense}
-                    
-            except json.JSONDecodeError:
-                # Try to extract JSON from text using regex
-                json_match = re.search(r'\{[^}]+\}', response_text)
-                if json_match:
-                    try:
-                        parsed_result = json.loads(json_match.group(0))
-                        api_diagnosis = parsed_result.get('disease', '')
-                        api_expense = clean_and_convert_amount(parsed_result.get('expense', 0))
-                        
-                        final_diagnosis = api_diagnosis if api_diagnosis else diagnosis
-                        final_expense = api_expense if api_expense > 0 else expense
-                        
-                        if final_diagnosis and final_expense and final_expense > 0:
-                            return {'disease': final_diagnosis, 'expense': final_expense}
-                    except json.JSONDecodeError:
-                        pass
-                        
+        parsed, confidence = json.loads(response_text), HF_CONFIDENCE
+    except json.JSONDecodeError:
+        # Try to extract JSON from text using regex
+        json_match = re.search(r'\{[^}]+\}', response_text)
+        if not json_match:
+            return {}, 0.0
+        try:
+            parsed, confidence = json.loads(json_match.group(0)), HF_RECOVERED_CONFIDENCE
+        except json.JSONDecodeError:
+            return {}, 0.0
+    return (parsed, confidence) if isinstance(parsed, dict) else ({}, 0.0)
+
+def hf_api_tier(text, fields, deadline):
+    try:
+        with STAGE_SECONDS.time(stage='hf_api'):
+            result = hf_client.generate(build_hf_prompt(text, fields), deadline=deadline)
+    except EndpointUnavailableError as e:
+        logger.info("Skipping Hugging Face API: %s", e)
+        return {}
     except requests.exceptions.RequestException as e:
-        print(f"Hugging Face API error: {str(e)}")
-    except Exception as e:
-        print(f"API processing error: {str(e)}")
+        logger.warning("Hugging Face API error: %s", e)
+        return {}
+    
+    if not (result and isinstance(result, list) and 'generated_text' in result[0]):
+        return {}
+    response_text = result[0]['generated_text']
+    logger.debug("API response: %s", response_text)
+    
+    parsed, confidence = parse_hf_answer(response_text)
+    found = {}
+    disease = str(parsed.get('disease') or '').strip()
+    if 'disease' in fields and len(disease) > 2:
+        found['disease'] = (disease, confidence)
+    expense = clean_and_convert_amount(parsed.get('expense', 0))
+    if 'expense' in fields and expense > 0:
+        found['expense'] = (expense, confidence)
+    return found
+
+def local_qa_tier(text, fields, deadline):
+    # Questions for one bill go out together so they share a batch
+    timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+    with STAGE_SECONDS.time(stage='local_qa'):
+        answers = ask_local_qa([(QA_QUESTIONS[field], text) for field in fields], timeout=timeout)
+    if not answers:
+        return {}
+    
+    found = {}
+    for field, answer in zip(fields, answers):
+        if field == 'disease':
+            if answer['score'] > LOCAL_QA_MIN_SCORE:
+                found['disease'] = (answer['answer'], answer['score'])
+        else:
+            expense = clean_and_convert_amount(answer['answer'])
+            if expense > 0:
+                found['expense'] = (expense, answer['score'])
+    return found
+
+# Known layouts are read from their template, regex handles the fields a template did not
+# settle, and the remote endpoint and the local model are only asked for what is still
+# missing, within a per-claim cost budget and deadline
+EXTRACTION_DEADLINE = float(os.environ.get('EXTRACTION_DEADLINE', 20))
+extraction_cascade = ExtractionCascade(
+    [Tier('template', template_tier),
+     Tier('regex', regex_tier),
+     Tier('hf_api', hf_api_tier, cost=float(os.environ.get('HF_TIER_COST', 1)),
+          min_seconds=float(os.environ.get('HF_TIER_MIN_SECONDS', 1)),
+          available=lambda: hf_client.breaker.state != 'open'),
+     Tier('local_qa', local_qa_tier, cost=float(os.environ.get('LOCAL_QA_TIER_COST', 2)),
+          min_seconds=float(os.environ.get('LOCAL_QA_TIER_MIN_SECONDS', 0.5)))],
+    min_confidence=float(os.environ.get('EXTRACTION_MIN_CONFIDENCE', 0.7)),
+    cost_budget=float(os.environ.get('EXTRACTION_COST_BUDGET', 3)),
+    deadline_seconds=EXTRACTION_DEADLINE
+)
+
+def get_bill_info(data, deadline=None):
+    """Diagnosis and expense from the extraction cascade, with fallbacks for fields no tier found"""
+    logger.debug("Processing bill text (first 200 chars): %s...", data[:200])
     
-    # Fallback to local model if available
-    if local_qa:
-        try:
-            disease_result = local_qa(question="What is the primary medical condition or disease being treated?", context=data)
-            expense_result = local_qa(question="What is the total expense amount on this medical bill?", context=data)
-            
-            local_disease = disease_result['answer'] if disease_result['score'] > 0.1 else None
-            local_expense = clean_and_convert_amount(expense_result['answer'])
-            
-            final_diagnosis = local_disease if local_disease else diagnosis
-            final_expense = local_expense if local_expense > 0 else expense
-            
-            if final_diagnosis and final_expense and final_expense > 0:
-                return {'disease': final_diagnosis, 'expense': final_expense}
-                
-        except Exception as e:
-            print(f"Local model error: {str(e)}")
-    
-    # Final fallback - use whatever we found
-    final_diagnosis = diagnosis if diagnosis else "See Claim Reason"
-    final_expense = expense if expense and expense > 0 else 0.0
-    
-    return {'disease': final_diagnosis, 'expense': final_expense}
+    found = extraction_cascade.run(data, deadline)
+    
+    # The final tier is the latest one any field needed; 'fallback' if a field is still missing
+    if len(found) < len(extraction_cascade.fields):
+        tier = 'fallback'
+    else:
+        names = [t.name for t in extraction_cascade.tiers]
+        tier = max((source for _, _, source in found.values()), key=names.index)
+    EXTRACTION_TIER.inc(tier=tier)
+    
+    disease = found.get('disease')
+    expense = found.get('expense')
+    return {'disease': disease[0] if disease else "See Claim Reason",
+            'expense': expense[0] if expense else 0.0}
 
 def is_disease_excluded(disease, exclusion_list):
-    """Enhanced disease exclusion check with better matching"""
-    if not disease:
-        return False
-        
-    disease_lower = disease.lower().strip()
-    
-    # Don't exclude if disease is just a placeholder
-    if disease_lower in ['see claim reason', 'extraction failed', 'not found', '']:
-        return False
-        
-    # Check for exact and partial matches
-    for exclusion in exclusion_list:
-        exclusion_lower = exclusion.lower().strip()
-        
-        # Check for exact match or if exclusion is contained in disease
-        if exclusion_lower in disease_lower or disease_lower in exclusion_lower:
-            # Additional check for common false positives
-            if exclusion_lower == "pregnancy" and "pregnancy test" in disease_lower:
-                continue  # Pregnancy test is not the same as pregnancy treatment
-            return True
-            
-    return False
-
-def generate_claim_report(patient_info, bill_info, claim_amount_str):
-    """Enhanced claim report generation with better validation logic"""
-    
-    # Convert claim amount to float with better error handling
+    """Check a diagnosis against an ExclusionIndex, or a list of exclusion rules"""
+    if not isinstance(exclusion_list, ExclusionIndex):
+        # Plain "pregnancy" terms keep the original exemption for pregnancy tests
+        exclusion_list = ExclusionIndex(
+            {'term': rule, 'allow': ["pregnancy test"]} if isinstance(rule, str) and rule.strip().lower() == 'pregnancy'
+            else rule for rule in exclusion_list)
+    return exclusion_list.is_excluded(disease)
+
+@timed('find_duplicate_bills')
+def find_duplicate_bills(bill_text, bill_key, patient_info, bill_info):
+    """Prior claims with the same or a near-identical bill; records this claim as well"""
+    if duplicate_index is None:
+        return []
     try:
-        claim_amount = float(str(claim_amount_str).replace(',', '').replace('$', '').strip())
-    except (ValueError, AttributeError):
-        claim_amount = 0.0
-
-    # Get and clean bill expense
-    bill_expense = clean_and_convert_amount(bill_info.get('expense'))
-    
-    # Get disease from bill or fallback to claim reason
-    disease = bill_info.get('disease', patient_info.get('claim_reason', ''))
-    
-    print(f"Claim validation - Claim Amount: {claim_amount}, Bill Expense: {bill_expense}, Disease: {disease}")
-    
-    # Enhanced validation checks
-    info_complete = all([
-        patient_info.get('name', '').strip(),
-        patient_info.get('address', '').strip(),
-        patient_info.get('claim_reason', '').strip(),
-        claim_amount > 0,  # Claim amount should be positive
-        bill_expense > 0   # Bill expense should be positive
-    ])
-    
-    excluded = is_disease_excluded(disease, general_exclusion_list)
-    
-    # Enhanced decision logic with tolerance for minor differences
-    amount_tolerance = max(1.0, bill_expense * 0.01)  # Allow 1% tolerance or minimum $1
-    amount_difference = abs(claim_amount - bill_expense)
-    amounts_match = amount_difference <= amount_tolerance
-    claim_within_bill = claim_amount <= (bill_expense + amount_tolerance)
-    
-    # Decision logic
-    if not info_complete:
-        missing_fields = []
-        if not patient_info.get('name', '').strip():
-            missing_fields.append('name')
-        if not patient_info.get('address', '').strip():
-            missing_fields.append('address')
-        if not patient_info.get('claim_reason', '').strip():
-            missing_fields.append('claim reason')
-        if claim_amount <= 0:
-            missing_fields.append('valid claim amount')
-        if bill_expense <= 0:
-            missing_fields.append('valid bill amount')
-            
-        decision = f"REJECTED: Incomplete information (missing: {', '.join(missing_fields)})"
-        
-    elif excluded:
-        decision = f"REJECTED: Treatment for '{disease}' is excluded under policy terms"
-        
-    elif not claim_within_bill:
-        excess_amount = claim_amount - bill_expense
-        decision = f"REJECTED: Claim amount (${claim_amount:.2f}) exceeds bill amount (${bill_expense:.2f}) by ${excess_amount:.2f}"
-        
-    else:
-        # Approved cases
-        if amounts_match:
-            decision = f"APPROVED: Full claim amount of ${claim_amount:.2f}"
-        else:
-            # Approve up to the bill amount if claim is higher
-            approved_amount = min(claim_amount, bill_expense)
-            decision = f"APPROVED: ${approved_amount:.2f} (claim: ${claim_amount:.2f}, bill: ${bill_expense:.2f})"
-    
-    # Generate comprehensive report
-    report = f"""
-    CLAIM DECISION: {decision}
-    
-    Executive Summary
-    This report details the analysis of the insurance claim submitted by {patient_info['name']}. 
-    The claim has been evaluated based on completeness of information, policy exclusions, and amount validation.
-    
-    Claim Details
-    - Patient: {patient_info['name']}
-    - Claim Reason: {patient_info['claim_reason']}
-    - Medical Facility: {patient_info['medical_facility']}
-    - Date of Service: {patient_info['date']}
-    - Claim Amount: ${claim_amount:.2f}
-    - Bill Amount: ${bill_expense:.2f}
-    - Detected Condition: {disease}
-    - Amount Difference: ${abs(claim_amount - bill_expense):.2f}
-    
-    Verification Results
-    - Information Complete: {'Yes' if info_complete else 'No'}
-    - Covered Condition: {'No' if excluded else 'Yes'}
-    - Amount Valid: {'Yes' if claim_within_bill else 'No'}
-    - Amounts Match: {'Yes' if amounts_match else 'No'}
-    
-    Final Decision
-    {decision}
-    
-    Additional Notes
-    - Claim processing used enhanced validation with tolerance for minor amount differences
-    - Bill text extraction: {'Successful' if bill_expense > 0 else 'Failed - manual review recommended'}
-    """
-    return report
+        hits = duplicate_index.check_and_add(
+            bill_text or '', bill_key=bill_key, k=DUPLICATE_TOP_K, min_similarity=DUPLICATE_MIN_SIMILARITY,
+            name=patient_info.get('name'), date=patient_info.get('date'),
+            claim_amount=patient_info.get('total_claim_amount'), disease=bill_info.get('disease'))
+    except Exception as e:
+        logger.warning("Duplicate check failed: %s", e)
+        return []
+    return [{field: hit.get(field) for field in DUPLICATE_HIT_FIELDS} for hit in hits]
+
+@timed('generate_claim_report')
+def generate_claim_report(patient_info, bill_info, claim_amount_str, policy=None, duplicates=None):
+    """Plain-text claim report; callers that only need the outcome should use decide_claim"""
+    policy = policy or policy_engine.get()
+    return decide_claim(patient_info, bill_info, claim_amount_str, policy, duplicates).to_text()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/', methods=['POST'])
-def process_claim():
-    # Extract form data
-    patient_info = {
-        'name': request.form.get('name', '').strip(),
-        'address': request.form.get('address', '').strip(),
-        'claim_type': request.form.get('claim_type', '').strip(),
-        'claim_reason': request.form.get('claim_reason', '').strip(),
-        'date': request.form.get('date', '').strip(),
-        'medical_facility': request.form.get('medical_facility', '').strip(),
-        'total_claim_amount': request.form.get('total_claim_amount', '').strip(),
-        'description': request.form.get('description', '').strip()
-    }
+def process_claim_data(patient_info, medical_bill):
+    """Run the full claim pipeline for one set of patient details and one bill upload"""
+    # Extraction fallbacks are cut off EXTRACTION_DEADLINE seconds after the claim arrives
+    deadline = time.monotonic() + EXTRACTION_DEADLINE
+    if not medical_bill or medical_bill.filename == '':
+        return {'status': 'error',
+                'message': "No medical bill uploaded. Please upload a valid PDF file."}
     
-    medical_bill = request.files.get('medical_bill')
+    policy = policy_engine.get(patient_info.get('product'))
+    if policy is None:
+        return {'status': 'error',
+                'message': f"Unknown insurance product '{patient_info.get('product')}'."}
     
-    if not medical_bill or medical_bill.filename == '':
-        return render_template("result.html", 
-                              output="No medical bill uploaded. Please upload a valid PDF file.",
-                              **patient_info)
+    # The upload is size-checked, sniffed and buffered once; hashing and PDF parsing share it
+    try:
+        upload = open_upload(medical_bill)
+    except UploadError as e:
+        return {'status': 'error', 'message': str(e)}
+    with upload:
+        return process_bill_upload(patient_info, policy, upload, deadline)
+
+def process_bill_upload(patient_info, policy, medical_bill, deadline=None):
+    """Extraction, duplicate check and decision for an opened BillUpload"""
+    # Resubmitted bills are served from the cache instead of being parsed again
+    cache_key = digest_cache_key(medical_bill.sha256(), EXTRACTOR_VERSION)
+    cached = bill_cache.get(cache_key) or {}
     
     # Process bill
-    bill_text = get_file_content(medical_bill)
-    if not bill_text.strip():
-        return render_template("result.html", 
-                              output="The uploaded bill is empty or could not be read. Please ensure the PDF contains readable text.",
-                              **patient_info)
+    bill_text = cached.get('text')
+    bill_info = cached.get('bill_info')
+    if bill_info is not None:
+        EXTRACTION_TIER.inc(tier='cache')
+    if bill_text is None and bill_info is None:
+        if PDF_STREAMING:
+            # Early-exit text is partial, so only the extracted fields are cached
+            bill_text, bill_info = read_bill_streaming(medical_bill)
+            if bill_info is not None:
+                EXTRACTION_TIER.inc(tier='regex')
+                bill_cache.put(cache_key, bill_info=bill_info)
+            elif bill_text:
+                bill_cache.put(cache_key, text=bill_text)
+        else:
+            bill_text = get_file_content(medical_bill)
+            if bill_text.strip():
+                bill_cache.put(cache_key, text=bill_text)
+    if bill_info is None and not bill_text.strip():
+        return {'status': 'error',
+                'message': "The uploaded bill is empty or could not be read. Please ensure the PDF contains readable text."}
     
-    print(f"Extracted bill text length: {len(bill_text)}")
+    logger.debug("Extracted bill text length: %s", len(bill_text or ''))
     
-    bill_info = get_bill_info(bill_text)
+    if bill_info is None:
+        bill_info = get_bill_info(bill_text, deadline)
+        # Failed extractions are not cached so a retry can reach the remote fallbacks again
+        if bill_info.get('expense'):
+            bill_cache.put(cache_key, bill_info=bill_info)
     
-    print(f"Final bill info: {bill_info}")
+    logger.info("Final bill info: %s", bill_info)
     
     # Handle expense extraction failures more gracefully
     if bill_info.get('expense') is None or bill_info.get('expense') <= 0:
-        return render_template("result.html", 
-                              output=f"Could not extract expense amount from bill. Bill info extracted: {bill_info}. Please resubmit with clearer documentation or check if the PDF contains readable text.",
-                              **patient_info)
+        return {'status': 'error',
+                'bill_info': bill_info,
+                'message': f"Could not extract expense amount from bill. Bill info extracted: {bill_info}. Please resubmit with clearer documentation or check if the PDF contains readable text."}
     
-    # Generate claim report
-    report = generate_claim_report(patient_info, bill_info, patient_info['total_claim_amount'])
+    duplicates = find_duplicate_bills(bill_text, cache_key, patient_info, bill_info)
     
-    # Format for HTML display
-    formatted_report = report.replace('\n', '<br>')
+    # The report itself is only rendered when a consumer asks for it
+    with STAGE_SECONDS.time(stage='decide_claim'):
+        claim = decide_claim(patient_info, bill_info, patient_info['total_claim_amount'], policy, duplicates)
+    
+    return {'status': 'processed',
+            'bill_info': bill_info,
+            'decision': claim.summary,
+            'duplicates': duplicates,
+            'claim': claim}
+
+def serialize_result(result, report=True):
+    """JSON-safe copy of a process_claim_data result, with the text report unless report=False"""
+    claim = result.get('claim')
+    if claim is None:
+        return result
+    data = {key: value for key, value in result.items() if key != 'claim'}
+    data['claim'] = claim.to_dict()
+    if report:
+        data['report'] = claim.to_text()
+    return data
+
+def get_patient_info(form):
+    """Collect the claim form fields from a request form or manifest row"""
+    return {
+        'name': (form.get('name') or '').strip(),
+        'address': (form.get('address') or '').strip(),
+        'claim_type': (form.get('claim_type') or '').strip(),
+        'claim_reason': (form.get('claim_reason') or '').strip(),
+        'date': (form.get('date') or '').strip(),
+        'medical_facility': (form.get('medical_facility') or '').strip(),
+        'total_claim_amount': str(form.get('total_claim_amount') or '').strip(),
+        'description': (form.get('description') or '').strip(),
+        'product': (form.get('product') or '').strip()
+    }
+
+@app.route('/', methods=['POST'])
+def process_claim():
+    # Extract form data
+    patient_info = get_patient_info(request.form)
+    
+    medical_bill = request.files.get('medical_bill')
+    result = process_claim_data(patient_info, medical_bill)
+    
+    if result['status'] != 'processed':
+        return render_template("result.html", 
+                              output=result['message'],
+                              **patient_info)
     
     return render_template("result.html", 
-                          output=formatted_report,
+                          output=result['claim'].to_html(),
                           **patient_info)
 
+@app.route('/api/claims', methods=['POST'])
+def api_process_claim():
+    """The form submission pipeline for machine clients: the structured decision as JSON.
+
+    ?report=1 also includes the plain-text report.
+    """
+    patient_info = get_patient_info(request.form)
+    result = process_claim_data(patient_info, request.files.get('medical_bill'))
+    if result['status'] != 'processed':
+        return jsonify(result), 422 if 'bill_info' in result else 400
+    return jsonify(serialize_result(result, report=request.args.get('report', type=int) == 1))
+
+def run_claim_job(payload, bill, filename):
+    """Job queue handler: the same pipeline as a synchronous form submission"""
+    medical_bill = batch.NamedBytesIO(bill, filename) if bill is not None else None
+    return serialize_result(process_claim_data(payload['patient_info'], medical_bill))
+
+def default_job_queue_db():
+    """claim_jobs.sqlite3 in the app's owner-only instance folder, not a shared temp directory"""
+    os.makedirs(app.instance_path, mode=0o700, exist_ok=True)
+    return os.path.join(app.instance_path, 'claim_jobs.sqlite3')
+
+# Durable queue for asynchronous submissions. Its workers are started in each serving
+# process (gunicorn's post_worker_init, or below for `python app.py`); JOB_WORKERS=0
+# leaves processing to separate `python job_queue.py work` processes. Finished jobs
+# hold claimants' details and are deleted after JOB_RETENTION_DAYS
+job_queue = JobQueue(
+    os.environ.get('JOB_QUEUE_DB') or default_job_queue_db(),
+    run_claim_job,
+    workers=int(os.environ.get('JOB_WORKERS', 2)),
+    retention=float(os.environ.get('JOB_RETENTION_DAYS', 7)) * 24 * 3600
+)
+
+# Upper bound on how long a status request may long-poll
+JOB_MAX_WAIT = 30.0
+
+@app.route('/jobs', methods=['POST'])
+def submit_claim_job():
+    """Queue a claim for background processing and return immediately with its job id"""
+    patient_info = get_patient_info(request.form)
+    medical_bill = request.files.get('medical_bill')
+    if not medical_bill or medical_bill.filename == '':
+        return jsonify({'error': "No medical bill uploaded. Please upload a valid PDF file."}), 400
+    
+    try:
+        upload = open_upload(medical_bill)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Normally already running; this also covers other WSGI servers and dead worker threads
+    job_queue.start()
+    with upload:
+        job_id = job_queue.enqueue({'patient_info': patient_info}, upload.buffer, upload.filename)
+    status_url = url_for('claim_job_status', job_id=job_id)
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': status_url}), 202, {'Location': status_url}
+
+@app.route('/jobs/<job_id>')
+def claim_job_status(job_id):
+    """Job status and result; ?wait=N long-polls for up to N seconds until the job finishes"""
+    wait = min(request.args.get('wait', 0, type=float), JOB_MAX_WAIT)
+    job = job_queue.wait(job_id, wait) if wait > 0 else job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown job '{job_id}'"}), 404
+    return jsonify(job)
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    """413 for bodies over the upload limit, in the form the endpoint normally answers with"""
+    message = f"The upload is larger than the {request.max_content_length // (1024 * 1024)} MB limit."
+    if request.path == '/':
+        return render_template("result.html", output=message, **get_patient_info({})), 413
+    return jsonify({'status': 'error', 'message': message}), 413
+
+@app.route('/policies')
+def list_policies():
+    return jsonify(policy_engine.products())
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(bill_cache.stats())
+
+def collect_service_metrics():
+    """Bill cache counters and Hugging Face circuit state, read at scrape time"""
+    stats = bill_cache.stats()
+    for name in ('memory_hits', 'disk_hits', 'misses', 'stores', 'memory_evictions', 'disk_evictions'):
+        yield f"bill_cache_{name}_total", 'counter', f"Bill cache {name.replace('_', ' ')}", stats[name]
+    yield 'bill_cache_memory_entries', 'gauge', "Entries in the in-memory bill cache", stats['memory_entries']
+    yield 'bill_cache_hit_rate', 'gauge', "Bill cache hit rate", stats['hit_rate']
+    yield 'hf_circuit_open', 'gauge', "1 while the Hugging Face circuit breaker is open", int(hf_client.breaker.state == 'open')
+
+registry.add_collector(collect_service_metrics)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of stage timings, extraction tiers and cache counters"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the worker is up and answering"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: policies are loaded and a configured model warm-up, preload or server is up (503 until then)"""
+    checks = {'policies': len(policy_engine.products()),
+              'templates': len(template_registry),
+              'local_qa': local_qa_status(),
+              'hf_circuit': hf_client.breaker.state}
+    ready = checks['policies'] > 0 and is_local_qa_warm()
+    return jsonify({'status': 'ready' if ready else 'not_ready', 'pid': os.getpid(), 'checks': checks}), \
+        200 if ready else 503
+
+@app.route('/batch', methods=['POST'])
+def process_batch():
+    """Adjudicate a manifest of claims against a zip of bills, streaming NDJSON results"""
+    manifest_file = request.files.get('manifest')
+    bills_archive = request.files.get('bills')
+    
+    if not manifest_file or not bills_archive:
+        return Response(json.dumps({'error': "Both a 'manifest' file and a 'bills' zip archive are required."}) + "\n",
+                        status=400, mimetype='application/x-ndjson')
+    
+    try:
+        claims = batch.load_manifest(manifest_file.stream, manifest_file.filename)
+    except ValueError as e:
+        return Response(json.dumps({'error': str(e)}) + "\n", status=400, mimetype='application/x-ndjson')
+    
+    # Workers read bills straight from the archive, so spool it to disk once
+    fd, archive_path = tempfile.mkstemp(suffix='.zip')
+    with os.fdopen(fd, 'wb') as archive:
+        bills_archive.save(archive)
+    
+    def generate():
+        try:
+            for result in batch.iter_batch_results(claims, archive_path, workers=request.args.get('workers', type=int)):
+                yield json.dumps(result) + "\n"
+        finally:
+            os.remove(archive_path)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 def test_extraction():
     """Test function for debugging the specific PDF case"""
     test_text = """APOLLO HOSPITALS
@@ -511,4 +816,5 @@ Amount payable - 3150"""
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8081))
+    job_queue.start()
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,175 @@
+"""Batch claim adjudication: a manifest of claims plus a directory or zip of bill PDFs.
+
+Each claim runs through ``app.process_claim_data`` - the same unit of work as the
+web form - inside a process pool sized to the machine's cores, and results are
+produced as one JSON object per claim so they can be streamed as NDJSON.
+
+Usage:
+    python batch.py manifest.csv Bills/ -o decisions.ndjson --workers 8
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from uploads import MAX_UPLOAD_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Column holding the bill file name for each claim in the manifest
+BILL_FIELD = 'bill'
+CLAIM_ID_FIELD = 'claim_id'
+
+# Open zip archives, kept per worker process so each archive is only parsed once
+_archives = {}
+
+
+class NamedBytesIO(io.BytesIO):
+    """In-memory bill upload exposing the ``filename`` attribute Werkzeug files have"""
+
+    def __init__(self, data, filename):
+        super().__init__(data)
+        self.filename = filename
+
+
+def load_manifest(source, name=''):
+    """Load claims from a CSV, JSON array or NDJSON manifest (path or binary stream)"""
+    if isinstance(source, (str, os.PathLike)):
+        name = name or str(source)
+        with open(source, 'rb') as f:
+            raw = f.read()
+    else:
+        raw = source.read()
+
+    text = raw.decode('utf-8-sig') if isinstance(raw, bytes) else raw
+    lowered = name.lower()
+
+    try:
+        if lowered.endswith(('.jsonl', '.ndjson')):
+            claims = [json.loads(line) for line in text.splitlines() if line.strip()]
+        elif lowered.endswith('.json') or text.lstrip().startswith('['):
+            claims = json.loads(text)
+        else:
+            claims = list(csv.DictReader(io.StringIO(text)))
+    except (json.JSONDecodeError, csv.Error) as e:
+        raise ValueError(f"Could not parse manifest {name or ''}: {str(e)}")
+
+    if not isinstance(claims, list) or not all(isinstance(c, dict) for c in claims):
+        raise ValueError("Manifest must contain a list of claim objects")
+
+    for index, claim in enumerate(claims):
+        claim.setdefault(CLAIM_ID_FIELD, str(index + 1))
+        if not claim.get(BILL_FIELD):
+            raise ValueError(f"Claim {claim[CLAIM_ID_FIELD]} has no '{BILL_FIELD}' column")
+    return claims
+
+
+def read_bill(bills_path, bill_name, max_bytes=MAX_UPLOAD_BYTES):
+    """Read one bill from a directory or zip archive of PDFs, refusing bills over ``max_bytes``"""
+    if os.path.isfile(bills_path):
+        archive = _archives.get(bills_path)
+        if archive is None:
+            archive = _archives[bills_path] = zipfile.ZipFile(bills_path)
+        # Checked before decompressing, so a zip bomb is never expanded in memory
+        size = archive.getinfo(bill_name).file_size
+        if size > max_bytes:
+            raise ValueError(f"Bill {bill_name} is larger than the {max_bytes // (1024 * 1024)} MB limit")
+        with archive.open(bill_name) as f:
+            return f.read(max_bytes + 1)
+
+    bill_path = os.path.normpath(os.path.join(bills_path, bill_name))
+    if os.path.commonpath([os.path.abspath(bill_path), os.path.abspath(bills_path)]) != os.path.abspath(bills_path):
+        raise ValueError(f"Bill path escapes the bills directory: {bill_name}")
+    if os.path.getsize(bill_path) > max_bytes:
+        raise ValueError(f"Bill {bill_name} is larger than the {max_bytes // (1024 * 1024)} MB limit")
+    with open(bill_path, 'rb') as f:
+        return f.read(max_bytes + 1)
+
+
+def adjudicate_claim(claim, bills_path):
+    """Process a single manifest claim; runs inside a pool worker"""
+    import app
+
+    claim_id = claim[CLAIM_ID_FIELD]
+    bill_name = claim[BILL_FIELD]
+    try:
+        data = read_bill(bills_path, bill_name)
+    except (KeyError, OSError, ValueError) as e:
+        return {'claim_id': claim_id, 'bill': bill_name, 'status': 'error',
+                'message': f"Could not read bill: {str(e)}"}
+
+    try:
+        patient_info = app.get_patient_info(claim)
+        result = app.process_claim_data(patient_info, NamedBytesIO(data, bill_name))
+    except Exception as e:
+        logger.exception("Batch claim %s failed: %s", claim_id, e)
+        return {'claim_id': claim_id, 'bill': bill_name, 'status': 'error',
+                'message': f"Claim processing failed: {str(e)}"}
+
+    return dict({'claim_id': claim_id, 'bill': bill_name}, **app.serialize_result(result))
+
+
+def _init_worker():
+    """Import the app once per worker so the per-claim cost excludes module setup"""
+    import app  # noqa: F401
+    import ocr
+
+    # Batch workers already use every core, so scanned pages are OCR'd in-process
+    ocr.OCR_WORKERS = 0
+
+
+def iter_batch_results(claims, bills_path, workers=None):
+    """Yield per-claim results in completion order, keeping the pool saturated"""
+    cpu_count = os.cpu_count() or 1
+    workers = min(workers or cpu_count, cpu_count)
+    # Bound in-flight work so huge manifests do not queue every claim up front
+    max_pending = workers * 4
+    claims = iter(claims)
+
+    # Workers come from a forkserver, not a fork of the caller: a threaded web worker may
+    # hold cache, index or logging locks at fork time, which a forked child would never see released
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             mp_context=multiprocessing.get_context('forkserver')) as pool:
+        pending = set()
+        for claim in claims:
+            pending.add(pool.submit(adjudicate_claim, claim, bills_path))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Adjudicate a batch of insurance claims")
+    parser.add_argument('manifest', help="CSV, JSON or NDJSON file with one claim per row")
+    parser.add_argument('bills', help="Directory or zip archive containing the bill PDFs")
+    parser.add_argument('-o', '--output', help="NDJSON output file (default: stdout)")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="Number of worker processes (default and maximum: CPU count)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+    claims = load_manifest(args.manifest)
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in iter_batch_results(claims, args.bills, workers=args.workers):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
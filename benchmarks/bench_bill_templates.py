@@ -0,0 +1,169 @@
+"""Field extraction on known hospital layouts: layout templates vs. generic regex.
+
+Bills come from a synthetic mix of hospital chains. Each known chain prints a
+fixed layout and total label, and a template for it is written to a temporary
+template directory. ``--unknown-share`` of the bills come from chains without a
+template and use random layouts. Two modes run the extraction cascade without
+its remote tiers:
+
+- ``regex``: the generic priority/fallback patterns only (before templates)
+- ``templates``: the template tier, then regex for whatever it did not find
+
+Reported per mode: mean and p95 extraction time per bill, bills/sec, and
+diagnosis, expense and exact accuracy (overall and for known/unknown chains).
+Template dispatch is also timed against registries padded with
+``--registry-sizes`` extra templates, to show it does not grow with their number.
+
+Usage:
+    python -m benchmarks.bench_bill_templates --bills 2000 --unknown-share 0.3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('DUPLICATE_DETECTION', '0')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from benchmarks.corpus import DIAGNOSIS_LABELS, LAYOUTS, generate_bill  # noqa: E402
+
+# Known chains: (layout, total label) printed on every bill
+CHAINS = {
+    "APOLLO HOSPITALS": ('itemized', "Amount payable"),
+    "FORTIS HOSPITAL": ('tabular', "Grand total"),
+    "MAX HEALTHCARE": ('complaint', "Net amount"),
+    "MEDANTA": ('complaint', "Total"),
+    "CITY CARE CLINIC": ('tabular', "Total Bill"),
+}
+UNKNOWN_CHAINS = ["ST. MARY'S MEDICAL CENTRE", "SUNRISE NURSING HOME"]
+
+
+def chain_template(hospital, layout, total_label):
+    return {'name': hospital.lower().replace(' ', '-'), 'version': 1, 'headers': [hospital],
+            'fields': {'disease': {'anchors': [DIAGNOSIS_LABELS[layout]]},
+                       'expense': {'anchors': [total_label], 'type': 'amount', 'occurrence': 'last'}}}
+
+
+def write_templates(directory, padding=0):
+    """Templates for CHAINS, plus ``padding`` for made-up chains that never match"""
+    for hospital, (layout, total_label) in CHAINS.items():
+        with open(os.path.join(directory, chain_template(hospital, layout, total_label)['name'] + '.json'), 'w') as f:
+            json.dump(chain_template(hospital, layout, total_label), f)
+    for number in range(padding):
+        with open(os.path.join(directory, f"padding-{number}.json"), 'w') as f:
+            json.dump(chain_template(f"Hospital Number {number}", 'itemized', "Amount payable"), f)
+
+
+def corpus(count, unknown_share, seed):
+    rng = random.Random(seed)
+    bills = []
+    for _ in range(count):
+        noise = rng.choice([0, 1, 3])
+        if rng.random() < unknown_share:
+            text, truth = generate_bill(rng, noise=noise, layout=rng.choice(LAYOUTS),
+                                        hospital=rng.choice(UNKNOWN_CHAINS))
+            bills.append((text, truth, 'unknown'))
+        else:
+            hospital = rng.choice(list(CHAINS))
+            layout, total_label = CHAINS[hospital]
+            text, truth = generate_bill(rng, noise=noise, layout=layout, hospital=hospital,
+                                        total_labels=[total_label])
+            bills.append((text, truth, 'known'))
+    return bills
+
+
+def accuracy(rows):
+    if not rows:
+        return {}
+    disease = sum(row[0] for row in rows)
+    expense = sum(row[1] for row in rows)
+    exact = sum(row[0] and row[1] for row in rows)
+    return {'disease_accuracy': round(disease / len(rows), 3), 'expense_accuracy': round(expense / len(rows), 3),
+            'exact_accuracy': round(exact / len(rows), 3)}
+
+
+def run_mode(app, bills, mode):
+    from extraction_cascade import ExtractionCascade, Tier
+
+    tiers = [Tier('regex', app.regex_tier)]
+    if mode == 'templates':
+        tiers.insert(0, Tier('template', app.template_tier))
+    cascade = ExtractionCascade(tiers, min_confidence=app.extraction_cascade.min_confidence)
+
+    latencies = []
+    rows = {'known': [], 'unknown': []}
+    for text, truth, chain in bills:
+        start = time.perf_counter()
+        found = cascade.run(text)
+        latencies.append(time.perf_counter() - start)
+        disease = found.get('disease', (None,))[0]
+        expense = found.get('expense', (None,))[0]
+        rows[chain].append((disease == truth['disease'],
+                            expense is not None and abs(float(expense) - truth['expense']) < 0.01))
+
+    latencies.sort()
+    total = sum(latencies)
+    return {'mean_us': round(total / len(latencies) * 1e6, 1),
+            'p95_us': round(latencies[int(len(latencies) * 0.95)] * 1e6, 1),
+            'bills_per_sec': round(len(latencies) / total),
+            **accuracy(rows['known'] + rows['unknown']),
+            'known_chains': accuracy(rows['known']),
+            'unknown_chains': accuracy(rows['unknown'])}
+
+
+def time_dispatch(bills, sizes, repeat=3):
+    """Mean TemplateRegistry.match time per bill for registries of each size"""
+    from bill_templates import TemplateRegistry
+
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            write_templates(directory, padding=size)
+            registry = TemplateRegistry(directory)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text, _, _ in bills:
+                registry.match(text)
+            elapsed = (time.perf_counter() - start) / len(bills)
+            best = elapsed if best is None else min(best, elapsed)
+        results[len(registry)] = round(best * 1e6, 2)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bills', type=int, default=2000)
+    parser.add_argument('--unknown-share', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=19)
+    parser.add_argument('--registry-sizes', type=int, nargs='+', default=[0, 100, 10000],
+                        help="Extra templates to pad the registry with for the dispatch timing")
+    args = parser.parse_args(argv)
+
+    import app
+    from bill_templates import TemplateRegistry
+
+    bills = corpus(args.bills, args.unknown_share, args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        write_templates(directory)
+        app.template_registry = TemplateRegistry(directory)
+
+    results = {}
+    for mode in ('regex', 'templates'):
+        results[mode] = run_mode(app, bills, mode)
+        print(json.dumps({mode: results[mode]}), file=sys.stderr)
+    dispatch = time_dispatch(bills, args.registry_sizes)
+    print(json.dumps({'dispatch_us_by_templates': dispatch}), file=sys.stderr)
+
+    print(json.dumps({'bills': args.bills, 'unknown_share': args.unknown_share, 'results': results,
+                      'dispatch_us_by_templates': dispatch}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Bulk re-adjudication throughput (claims/min), checked against the single-claim report path.
+
+A CSV of synthetic extracted claims is written to a temporary file and decided
+with ``bulk_adjudication.readjudicate``. The claims mix complete and incomplete
+forms, excluded diagnoses, and claims above, at and below the bill. A sample of
+rows is also run through ``app.generate_claim_report``, and the decision and
+approved amount parsed from each report must equal the bulk result. Products
+are a mix of blank, null and explicit ids; ``--format parquet`` keeps the nulls
+in the input file.
+
+Usage:
+    python -m benchmarks.bench_bulk_adjudication --claims 1000000 --verify 2000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('DUPLICATE_DETECTION', '0')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from benchmarks.corpus import DIAGNOSES  # noqa: E402
+
+COLUMNS = ['claim_id', 'name', 'address', 'claim_reason', 'date', 'medical_facility',
+           'total_claim_amount', 'product', 'disease', 'expense']
+
+EXCLUDED = ["HIV/AIDS", "Parkinson's disease", "Antenatal care", "O09.1 supervision of pregnancy",
+            "Alcohol abuse", "Pregnancy test"]
+
+
+def generate_claims(count, seed):
+    """Synthetic claim rows; product is blank, null (None) or explicit"""
+    rng = random.Random(seed)
+    for claim_id in range(1, count + 1):
+        expense = rng.randint(2, 400) * 25
+        claim = rng.choice([expense, expense, expense + 0.5, expense * 0.8, expense * 1.3, 0])
+        yield [str(claim_id),
+               '' if rng.random() < 0.03 else f"Patient {claim_id}",
+               '' if rng.random() < 0.02 else "1 Main Road",
+               "Treatment", "01/02/2024", "City Hospital",
+               f"{claim:,.2f}" if rng.random() < 0.5 else str(claim),
+               rng.choice(['', None, 'general-health']),
+               rng.choice(EXCLUDED) if rng.random() < 0.1 else rng.choice(DIAGNOSES),
+               str(expense) if rng.random() > 0.01 else '']
+
+
+def write_claims(path, count, seed, verify):
+    """Write claims as CSV or (by extension) Parquet; returns the first ``verify`` rows as dicts"""
+    rows = list(generate_claims(count, seed))
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Null product cells stay null in Parquet
+        table = pa.table({name: [row[index] for row in rows] for index, name in enumerate(COLUMNS)})
+        pq.write_table(table, path)
+    else:
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+    return [dict(zip(COLUMNS, row)) for row in rows[:verify]]
+
+
+def report_outcome(report):
+    """(decision code, approved amount) parsed from a text claim report"""
+    decision = re.search(r'CLAIM DECISION: (.*)', report).group(1)
+    if decision.startswith('REJECTED: Incomplete'):
+        return 'REJECTED_INCOMPLETE', 0.0
+    if decision.startswith('REJECTED: Treatment'):
+        return 'REJECTED_EXCLUDED', 0.0
+    if decision.startswith('REJECTED'):
+        return 'REJECTED_AMOUNT', 0.0
+    amount = float(re.search(r'\$([\d.]+)', decision).group(1))
+    if decision.startswith('APPROVED: Full'):
+        return 'APPROVED_FULL', amount
+    if 'coverage cap' in decision:
+        return 'APPROVED_CAPPED', amount
+    return 'APPROVED_PARTIAL', amount
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--claims', type=int, default=1000000)
+    parser.add_argument('--verify', type=int, default=2000, help="Rows checked against generate_claim_report")
+    parser.add_argument('--seed', type=int, default=3)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help="Input format; Parquet keeps null product cells as nulls (needs pyarrow)")
+    args = parser.parse_args(argv)
+
+    import app
+    import bulk_adjudication
+
+    directory = tempfile.mkdtemp(prefix='bulk-bench-')
+    claims_path = os.path.join(directory, 'claims.' + args.format)
+    output_path = os.path.join(directory, 'decisions.csv')
+    try:
+        claims = write_claims(claims_path, args.claims, args.seed, args.verify)
+
+        start = time.perf_counter()
+        bulk_adjudication.readjudicate(claims_path, output_path, app.policy_engine)
+        bulk_seconds = time.perf_counter() - start
+
+        with open(output_path, newline='') as f:
+            decisions = [row for _, row in zip(range(args.verify), csv.DictReader(f))]
+
+        start = time.perf_counter()
+        mismatches = 0
+        for claim, decision in zip(claims, decisions):
+            patient_info = app.get_patient_info(claim)
+            bill_info = {'disease': claim['disease'] or claim['claim_reason'], 'expense': claim['expense']}
+            report = app.generate_claim_report(patient_info, bill_info, patient_info['total_claim_amount'])
+            code, amount = report_outcome(report)
+            if code != decision['decision'] or abs(amount - float(decision['approved_amount'])) > 0.005:
+                mismatches += 1
+        report_seconds = time.perf_counter() - start
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    per_row_report = report_seconds / len(claims)
+    print(json.dumps({
+        'claims': args.claims,
+        'bulk_seconds': round(bulk_seconds, 2),
+        'bulk_claims_per_minute': round(args.claims / bulk_seconds * 60),
+        'report_path_claims_per_minute': round(60 / per_row_report),
+        'format': args.format,
+        'verified_rows': len(claims),
+        'mismatches': mismatches,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Structured decisions vs text reports: per-claim cost of each way to get an outcome.
+
+Decision paths, on synthetic claims decided under the default policy:
+
+- ``text_report``:  render the full text report and regex the decision back out of it
+                    (how results were produced before ``ClaimDecision``)
+- ``object``:       ``decide_claim`` only, reading the code and approved amount
+- ``object_json``:  ``decide_claim`` plus ``to_dict`` and ``json.dumps``
+- ``object_html``:  ``decide_claim`` plus the escaped HTML report
+
+HTTP paths post the same bill to ``POST /`` (HTML page) and ``POST /api/claims``
+(JSON) through Flask's test client, with the bill cache warm, so they measure
+the decision and response rendering rather than PDF extraction.
+
+Usage:
+    python -m benchmarks.bench_claim_decision --claims 20000 --requests 500
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('DUPLICATE_DETECTION', '0')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ.setdefault('HF_API_URL', 'http://127.0.0.1:9/disabled')
+
+from benchmarks.corpus import DIAGNOSES, generate_bill_pdf  # noqa: E402
+
+PATIENT_INFO = {'name': "Benchmark Patient", 'address': "1 Main Road", 'claim_type': "Outpatient",
+                'claim_reason': "Treatment", 'date': "01/01/2024", 'medical_facility': "Benchmark Hospital",
+                'description': '', 'product': ''}
+
+
+def synthetic_claims(count, seed):
+    rng = random.Random(seed)
+    claims = []
+    for _ in range(count):
+        expense = rng.randint(2, 400) * 25
+        claim = rng.choice([expense, expense * 0.8, expense * 1.3])
+        patient_info = dict(PATIENT_INFO, total_claim_amount=f"{claim:.2f}")
+        if rng.random() < 0.05:
+            patient_info['address'] = ''
+        disease = "HIV/AIDS" if rng.random() < 0.1 else rng.choice(DIAGNOSES)
+        claims.append((patient_info, {'disease': disease, 'expense': float(expense)}))
+    return claims
+
+
+def time_path(run, claims):
+    start = time.perf_counter()
+    for patient_info, bill_info in claims:
+        run(patient_info, bill_info)
+    elapsed = time.perf_counter() - start
+    return {'claims_per_second': round(len(claims) / elapsed), 'us_per_claim': round(elapsed / len(claims) * 1e6, 1)}
+
+
+def time_requests(client, url, data, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = client.post(url, data=data(), content_type='multipart/form-data')
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    samples.sort()
+    return {'requests_per_second': round(count / sum(samples), 1),
+            'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+            'p99_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3),
+            'response_bytes': len(response.data)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--claims', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    import io
+
+    import app
+    from claim_decision import decide_claim
+
+    policy = app.policy_engine.get()
+    claims = synthetic_claims(args.claims, args.seed)
+
+    def text_report(patient_info, bill_info):
+        report = app.generate_claim_report(patient_info, bill_info, patient_info['total_claim_amount'], policy)
+        return re.search(r'CLAIM DECISION: (.*)', report).group(1), report.replace('\n', '<br>')
+
+    def object_only(patient_info, bill_info):
+        claim = decide_claim(patient_info, bill_info, patient_info['total_claim_amount'], policy)
+        return claim.code, claim.approved_amount
+
+    def object_json(patient_info, bill_info):
+        return json.dumps(decide_claim(patient_info, bill_info, patient_info['total_claim_amount'], policy).to_dict())
+
+    def object_html(patient_info, bill_info):
+        return decide_claim(patient_info, bill_info, patient_info['total_claim_amount'], policy).to_html()
+
+    paths = {}
+    for name, run in (('text_report', text_report), ('object', object_only),
+                      ('object_json', object_json), ('object_html', object_html)):
+        run(*claims[0])
+        paths[name] = time_path(run, claims)
+
+    pdf, truth = generate_bill_pdf(random.Random(args.seed))
+    form = dict(PATIENT_INFO, total_claim_amount=str(truth['expense']))
+
+    def data():
+        return dict(form, medical_bill=(io.BytesIO(pdf), 'bill.pdf'))
+
+    client = app.app.test_client()
+    http = {}
+    for name, url in (('html_page', '/'), ('json_api', '/api/claims')):
+        client.post(url, data=data(), content_type='multipart/form-data')  # fills the bill cache
+        http[name] = time_requests(client, url, data, args.requests)
+
+    print(json.dumps({'claims': args.claims, 'decision_paths': paths, 'http': http}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
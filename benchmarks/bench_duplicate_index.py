@@ -0,0 +1,112 @@
+"""Duplicate index query latency and recall as the number of stored bills grows.
+
+Bills are backfilled in chunks with ``add_many``. At each checkpoint the
+index is merged and the benchmark queries lightly edited copies of stored bills (another patient name, one
+changed amount) and unrelated new bills. It reports LSH query latency, recall of
+the edited copies, false hits, and the latency of a brute-force scan over every
+stored signature for comparison.
+
+Usage:
+    python -m benchmarks.bench_duplicate_index --bills 1000000 --checkpoints 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_bill  # noqa: E402
+from duplicate_index import DuplicateIndex  # noqa: E402
+
+
+def edited_copy(text, rng):
+    """The same bill with a different patient name and one digit of the total changed"""
+    lines = text.split("\n")
+    lines[2] = f"- Name: Patient {rng.randint(1, 99999)}"
+    total = lines[-1]
+    digits = [i for i, char in enumerate(total) if char.isdigit()]
+    position = rng.choice(digits)
+    lines[-1] = total[:position] + str((int(total[position]) + 1) % 10) + total[position + 1:]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bills', type=int, default=100000)
+    parser.add_argument('--checkpoints', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--min-similarity', type=float, default=0.8)
+    parser.add_argument('--chunk', type=int, default=5000)
+    parser.add_argument('--dir', help="Index directory (default: a temporary directory)")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or tempfile.mkdtemp(prefix='duplicate-index-')
+    index = DuplicateIndex(directory)
+    rng = random.Random(11)
+    stored = []
+    results = []
+    try:
+        added = 0
+        insert_seconds = 0.0
+        for checkpoint in sorted(c for c in args.checkpoints if c <= args.bills):
+            while added < checkpoint:
+                size = min(args.chunk, checkpoint - added)
+                texts = [generate_bill(rng, noise=rng.randint(0, 3), filler_lines=rng.randint(0, 5))[0]
+                         for _ in range(size)]
+                # Keep a sample of stored bills to build edited duplicates from
+                stored.extend((added + i, text) for i, text in enumerate(texts) if rng.random() < 0.01)
+                start = time.perf_counter()
+                index.add_many(texts)
+                insert_seconds += time.perf_counter() - start
+                added += size
+            # Queries at each checkpoint see fully merged arrays, as once background merging catches up
+            index.merge(wait=True)
+
+            samples = rng.sample(stored, min(args.queries, len(stored)))
+            latencies = []
+            found = 0
+            for row_id, text in samples:
+                start = time.perf_counter()
+                hits = index.query(edited_copy(text, rng), min_similarity=args.min_similarity)
+                latencies.append(time.perf_counter() - start)
+                found += any(hit['id'] == row_id for hit in hits)
+
+            false_hits = 0
+            for _ in range(args.queries):
+                text = generate_bill(rng, noise=2)[0]
+                false_hits += bool(index.query(text, min_similarity=args.min_similarity))
+
+            # Brute force: compare one signature with every stored signature
+            signature = index.signature(samples[0][1])
+            index._refresh()
+            start = time.perf_counter()
+            (np.asarray(index._signatures[:added]) == signature).mean(axis=1).argmax()
+            brute_seconds = time.perf_counter() - start
+
+            latencies.sort()
+            results.append({
+                'bills': added,
+                'inserts_per_second': round(added / insert_seconds),
+                'query_p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+                'query_p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+                'brute_force_ms': round(brute_seconds * 1000, 3),
+                'edited_recall': round(found / len(samples), 3),
+                'unrelated_false_hits': f"{false_hits}/{args.queries}",
+            })
+            print(json.dumps(results[-1]), file=sys.stderr)
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
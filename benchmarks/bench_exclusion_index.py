@@ -0,0 +1,92 @@
+"""Exclusion lookup latency as the rule set grows from 8 to 100k entries.
+
+Compares ExclusionIndex against the previous linear scan (kept below), which
+lowercased every exclusion and did bidirectional substring checks per call.
+
+Usage:
+    python -m benchmarks.bench_exclusion_index --sizes 8 100 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from exclusion_index import ExclusionIndex  # noqa: E402
+
+QUERIES = ["Bodyache with fever, cold and cough", "Pregnancy - First trimester care", "Fracture of left wrist",
+           "pregnancy test", "Acute gastritis", "HIV", "Type 2 diabetes follow-up with retinal screening"]
+
+
+def legacy_is_disease_excluded(disease, exclusion_list):
+    """The original linear-scan implementation"""
+    if not disease:
+        return False
+    disease_lower = disease.lower().strip()
+    if disease_lower in ['see claim reason', 'extraction failed', 'not found', '']:
+        return False
+    for exclusion in exclusion_list:
+        exclusion_lower = exclusion.lower().strip()
+        if exclusion_lower in disease_lower or disease_lower in exclusion_lower:
+            if exclusion_lower == "pregnancy" and "pregnancy test" in disease_lower:
+                continue
+            return True
+    return False
+
+
+def synthetic_rules(count, rng):
+    """The general exclusions padded with random multi-word terms, synonyms and ICD-10 codes"""
+    rules = list(app.policy_engine.get().exclusion_rules)
+    while len(rules) < count:
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
+                 for _ in range(rng.randint(1, 4))]
+        rules.append({'term': ' '.join(words),
+                      'synonyms': [' '.join(reversed(words))],
+                      'icd10': [f"{rng.choice('ABCDEGHIJKLMNPQR')}{rng.randint(0, 99):02d}.{rng.randint(0, 9)}"]})
+    return rules[:count]
+
+
+def per_call_us(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            func(query)
+    return (time.perf_counter() - start) / (repeat * len(QUERIES)) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8, 100, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(3)
+    rows = []
+    for size in args.sizes:
+        rules = synthetic_rules(size, rng)
+        terms = [rule['term'] for rule in rules]
+
+        start = time.perf_counter()
+        index = ExclusionIndex(rules)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # The linear scan gets slow quickly, so scale its repetitions down with the rule count
+        legacy_repeat = max(1, args.repeat * 8 // size)
+        rows.append({
+            'rules': size,
+            'index_build_ms': round(build_ms, 1),
+            'index_lookup_us': round(per_call_us(index.is_excluded, args.repeat), 2),
+            'legacy_lookup_us': round(per_call_us(lambda d: legacy_is_disease_excluded(d, terms), legacy_repeat), 2),
+        })
+        print(json.dumps(rows[-1]), file=sys.stderr)
+
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Micro-benchmark and equivalence check for extract_expense_with_regex.
+
+Compares the precompiled single-pass engine in app.py against the previous
+implementation (kept verbatim below) over a synthetic bill corpus, and exits
+non-zero if the two ever disagree.
+
+Usage:
+    python -m benchmarks.bench_expense_extraction --bills 2000 --repeat 5
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks.corpus import generate_corpus  # noqa: E402
+
+
+def legacy_extract_expense_with_regex(text):
+    """The original per-call-compiled, multi-pass implementation"""
+    print(f"Extracting from text: {text}")
+    lines = text.split('\n')
+    amounts = []
+    priority_patterns = [
+        r'(?:Amount payable|Net amount|Final amount|Amount due|Total payable|Payable amount)[:\s-]*(\d{1,6}(?:\.\d{0,2})?)',
+        r'(?:Total charge|Total amount|Grand total|Final total)[:\s-]*(\d{1,6}(?:\.\d{0,2})?)',
+        r'(?:After discount|Post discount)[:\s-]*(\d{1,6}(?:\.\d{0,2})?)'
+    ]
+    for pattern in priority_patterns:
+        for line in lines:
+            try:
+                matches = re.findall(pattern, line, re.IGNORECASE)
+                for match in matches:
+                    try:
+                        amount_val = float(str(match).strip())
+                        if amount_val >= 1.0:
+                            print(f"Priority match found: {amount_val} from line: {line.strip()}")
+                            amounts.append(amount_val)
+                    except (ValueError, TypeError):
+                        continue
+            except Exception as e:
+                print(f"Priority pattern error: {str(e)}")
+                continue
+    if amounts:
+        final_amount = max(amounts)
+        print(f"Using priority amount: {final_amount}")
+        return final_amount
+    fallback_patterns = [
+        r'(?:Total|Amount|Bill|Charge)[:\s]*[\$₹€£]?\s*(\d{1,6}(?:,\d{3})*(?:\.\d{0,2})?)',
+        r'[\$₹€£]\s*(\d{1,6}(?:,\d{3})*(?:\.\d{0,2})?)',
+        r'(\d{1,6}(?:\.\d{2}))\s*$',
+        r'(\d{1,6}(?:,\d{3})*(?:\.\d{0,2}))\s*(?:USD|INR|EUR|GBP)',
+        r'[-:]\s*(\d{1,6}(?:\.\d{0,2})?)\s*$',
+        r'\b(\d{3,6}(?:\.\d{2})?)\b'
+    ]
+    for pattern in fallback_patterns:
+        try:
+            for line in lines:
+                line = line.strip()
+                if any(keyword in line.lower() for keyword in ['total', 'amount', 'due', 'bill', 'charge', 'pay', 'fee']):
+                    matches = re.findall(pattern, line, re.IGNORECASE)
+                    for match in matches:
+                        try:
+                            clean_amount = str(match).replace(',', '').strip()
+                            amount_val = float(clean_amount)
+                            if amount_val >= 10.0:
+                                print(f"Fallback match found: {amount_val} from line: {line.strip()}")
+                                amounts.append(amount_val)
+                        except (ValueError, TypeError):
+                            continue
+        except Exception as e:
+            print(f"Fallback pattern error: {str(e)}")
+            continue
+    if amounts:
+        unique_amounts = list(set(amounts))
+        unique_amounts.sort(reverse=True)
+        reasonable_amounts = [amt for amt in unique_amounts if 10.0 <= amt <= 1000000]
+        if reasonable_amounts:
+            final_amount = reasonable_amounts[0]
+            print(f"Final extracted amount: {final_amount}")
+            return final_amount
+    print("No amount found")
+    return None
+
+
+def time_extractor(extract, texts, repeat):
+    """Best-of-N wall time for extracting every text once"""
+    best = float('inf')
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for text in texts:
+                extract(text)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bills', type=int, default=2000, help="Number of synthetic bills")
+    parser.add_argument('--repeat', type=int, default=5, help="Timing repetitions (best is reported)")
+    parser.add_argument('--noise', type=int, default=3, help="Noise lines per bill")
+    parser.add_argument('--filler', type=int, default=20, help="Filler item lines per bill")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.bills, seed=args.seed, noise=args.noise, filler_lines=args.filler)
+    texts = [text for text, _ in corpus]
+    # Include the single-line-per-word layout PyPDF2 produces for some bills
+    texts += [text.replace(' ', '\n') for text in texts[:args.bills // 10]]
+
+    mismatches = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for text in texts:
+            if app.extract_expense_with_regex(text) != legacy_extract_expense_with_regex(text):
+                mismatches += 1
+
+    legacy = time_extractor(legacy_extract_expense_with_regex, texts, args.repeat)
+    current = time_extractor(app.extract_expense_with_regex, texts, args.repeat)
+
+    print(f"bills: {len(texts)}")
+    print(f"legacy:  {legacy * 1000:.1f} ms ({len(texts) / legacy:,.0f} bills/s)")
+    print(f"current: {current * 1000:.1f} ms ({len(texts) / current:,.0f} bills/s)")
+    print(f"speedup: {legacy / current:.2f}x")
+    print(f"equivalence: {len(texts) - mismatches}/{len(texts)} identical results")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Extraction fallback cost per claim: the confidence cascade vs. the old fixed order.
+
+Bills from the synthetic corpus (all layouts) have their diagnosis line, their
+charge lines, or both removed at random, so a share of them need the fallbacks
+for one field or both. They go through ``app.get_bill_info`` with the Hugging Face tier pointed at
+the local stub from ``benchmarks.hf_stub``. The stub answers after
+``--latency-ms`` and stalls on ``--stall-rate`` of requests, like an overloaded
+endpoint. Two modes run:
+
+- ``fixed_order``: every fallback tier is asked for every field, with no
+  deadline or budget (how ``get_bill_info`` worked before the cascade)
+- ``cascade``: the configured cascade, with ``--deadline`` seconds per claim
+
+Reported per mode: mean and p95 extraction latency, remote calls and fields asked
+per claim, local QA questions per claim (if transformers is installed), tier
+skips, and accuracy.
+
+Usage:
+    python -m benchmarks.bench_extraction_cascade --bills 200 --latency-ms 200 --stall-rate 0.05 --deadline 2
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('DUPLICATE_DETECTION', '0')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from benchmarks.corpus import LAYOUTS, generate_bill  # noqa: E402
+from benchmarks.hf_stub import StubConfig, start_stub_server  # noqa: E402
+
+
+DIAGNOSIS_LABELS = ('diagnosis', 'chief complaint', 'condition', 'reason for visit', 'presenting complaint')
+
+
+def degrade(text, rng, missing_diagnosis=0.3, missing_amounts=0.2):
+    """Drop the diagnosis line and/or every charge line, as on a partly unreadable bill"""
+    lines = text.split("\n")
+    if rng.random() < missing_diagnosis:
+        lines = [line for line in lines if not line.lower().startswith(DIAGNOSIS_LABELS)]
+    if rng.random() < missing_amounts:
+        charges = lines.index("Service charges:") if "Service charges:" in lines else len(lines)
+        lines = lines[:charges + 1] + ["(itemized statement attached separately)"]
+    return "\n".join(lines)
+
+
+def corpus(count, seed):
+    """Synthetic bills, some missing their diagnosis, their amounts, or both"""
+    rng = random.Random(seed)
+    bills = []
+    for _ in range(count):
+        text, truth = generate_bill(rng, noise=rng.choice([0, 2, 5]), layout=rng.choice(LAYOUTS))
+        bills.append((degrade(text, rng), truth))
+    return bills
+
+
+def counting(tier_function, counts, name, all_fields=False):
+    """Wrap a tier to count calls and fields asked; all_fields ignores the cascade's field list"""
+    import extraction_cascade
+
+    def extract(text, fields, deadline):
+        if all_fields:
+            fields, deadline = list(extraction_cascade.FIELDS), None
+        counts[name + '_calls'] += 1
+        counts[name + '_fields'] += len(fields)
+        return tier_function(text, fields, deadline)
+    return extract
+
+
+def run_mode(app, bills, mode, deadline_seconds):
+    from extraction_cascade import ExtractionCascade, Tier
+    from metrics import TIER_SKIPS
+
+    counts = {'hf_api_calls': 0, 'hf_api_fields': 0, 'local_qa_calls': 0, 'local_qa_fields': 0}
+    original = app.extraction_cascade
+    tiers = {tier.name: tier for tier in original.tiers}
+    legacy = mode == 'fixed_order'
+    app.extraction_cascade = ExtractionCascade(
+        [tiers['regex']] + [Tier(name, counting(tiers[name].extract, counts, name, all_fields=legacy),
+                                 cost=0 if legacy else tiers[name].cost,
+                                 min_seconds=0 if legacy else tiers[name].min_seconds,
+                                 available=None if legacy else tiers[name].available)
+                            for name in ('hf_api', 'local_qa')],
+        min_confidence=original.min_confidence,
+        cost_budget=float('inf') if legacy else original.cost_budget)
+    skips_before = {labels: value for _, labels, value in TIER_SKIPS.samples()}
+
+    latencies = []
+    correct = 0
+    try:
+        for text, truth in bills:
+            deadline = None if legacy else time.monotonic() + deadline_seconds
+            start = time.perf_counter()
+            info = app.get_bill_info(text, deadline)
+            latencies.append(time.perf_counter() - start)
+            correct += abs(float(info['expense'] or 0) - truth['expense']) < 0.01
+    finally:
+        app.extraction_cascade = original
+
+    latencies.sort()
+    skips = {labels: value - skips_before.get(labels, 0) for _, labels, value in TIER_SKIPS.samples()
+             if value > skips_before.get(labels, 0)}
+    return {'mean_ms': round(sum(latencies) / len(latencies) * 1000, 1),
+            'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+            'max_ms': round(latencies[-1] * 1000, 1),
+            **{f"{key}_per_claim": round(value / len(bills), 3) for key, value in counts.items()},
+            'tier_skips': skips,
+            'expense_accuracy': round(correct / len(bills), 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bills', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=6)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--stall-rate', type=float, default=0.05)
+    parser.add_argument('--deadline', type=float, default=2.0, help="Per-claim extraction deadline (cascade mode)")
+    parser.add_argument('--modes', nargs='+', choices=['fixed_order', 'cascade'], default=['fixed_order', 'cascade'])
+    args = parser.parse_args(argv)
+
+    config = StubConfig(latency_ms=args.latency_ms, stall_rate=args.stall_rate, stall_seconds=15)
+    server, url = start_stub_server(config)
+    os.environ.setdefault('HF_READ_TIMEOUT', '5')
+    os.environ.setdefault('HF_MAX_RETRIES', '1')
+
+    import app
+
+    # hf_client was imported (by hf_stub) before the stub existed, so point the client at it here
+    app.hf_client.api_url = url
+    # Only stalls should fail, so the breaker stays closed and both modes see the same endpoint
+    app.hf_client.breaker.failure_threshold = 10 ** 9
+    bills = corpus(args.bills, args.seed)
+    results = {}
+    for mode in args.modes:
+        random.seed(args.seed)
+        results[mode] = run_mode(app, bills, mode, args.deadline)
+        print(json.dumps({mode: results[mode]}), file=sys.stderr)
+    server.shutdown()
+
+    print(json.dumps({'bills': args.bills, 'latency_ms': args.latency_ms, 'stall_rate': args.stall_rate,
+                      'deadline': args.deadline, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""OCR throughput (pages/sec on CPU) for scanned bills across OCR pool sizes.
+
+Synthetic bills are rendered to PDF, rasterized and re-saved as image-only PDFs,
+so every page goes through the OCR fallback. Each pool size runs on a cold page
+cache; a final pass shows the cost of a fully cached resubmission. Requires
+easyocr, pdf2image (with poppler) and opencv-python.
+
+Usage:
+    python -m benchmarks.bench_ocr --bills 4 --pages 3 --workers 0 1 2 4
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('JOB_WORKERS', '0')
+
+import app  # noqa: E402
+import ocr  # noqa: E402
+from batch import NamedBytesIO  # noqa: E402
+from benchmarks.corpus import generate_bill_pdf  # noqa: E402
+from bill_cache import BillCache  # noqa: E402
+
+
+def scanned_pdf(data, dpi=150):
+    """Image-only copy of a text PDF, like a scanned paper bill"""
+    from pdf2image import convert_from_bytes
+
+    images = convert_from_bytes(data, dpi=dpi)
+    out = io.BytesIO()
+    images[0].save(out, format='PDF', save_all=True, append_images=images[1:], resolution=dpi)
+    return out.getvalue()
+
+
+def run(bills):
+    start = time.perf_counter()
+    texts = [app.get_file_content(NamedBytesIO(data, f'scan_{index}.pdf')) for index, data in enumerate(bills)]
+    return time.perf_counter() - start, texts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bills', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=3, help="Pages per bill")
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4], help="OCR pool sizes (0 = in-process)")
+    args = parser.parse_args(argv)
+
+    if not ocr.is_ocr_available():
+        sys.exit("easyocr, pdf2image and opencv-python are required")
+
+    rng = random.Random(5)
+    corpus = [generate_bill_pdf(rng, args.pages) for _ in range(args.bills)]
+    bills = [scanned_pdf(data) for data, _ in corpus]
+    page_count = args.bills * args.pages
+
+    results = []
+    for workers in args.workers:
+        ocr.OCR_WORKERS = workers
+        if ocr._pool is not None:
+            ocr._pool.shutdown()
+            ocr._pool = None
+        app.bill_cache = BillCache(max_entries=4096)
+        # Load the reader(s) before timing; model load is a one-off per worker
+        run(bills[:1])
+        app.bill_cache = BillCache(max_entries=4096)
+        elapsed, texts = run(bills)
+        found = sum(app.extract_expense_with_regex(text) == truth['expense'] for text, (_, truth) in zip(texts, corpus))
+        results.append({'workers': workers, 'pages': page_count, 'seconds': round(elapsed, 2),
+                        'pages_per_second': round(page_count / elapsed, 2), 'expense_found': f"{found}/{args.bills}"})
+        print(json.dumps(results[-1]), file=sys.stderr)
+
+        cached_elapsed, _ = run(bills)
+        results[-1]['cached_pages_per_second'] = round(page_count / cached_elapsed, 1)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
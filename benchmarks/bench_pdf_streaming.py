@@ -0,0 +1,80 @@
+"""Latency and peak memory of full vs streaming (early-exit) PDF extraction on large bills.
+
+The full path reads every page with get_file_content and then runs the regex
+extractors; the streaming path reads pages edges-first and stops once the
+diagnosis and the amount payable are found.
+
+Usage:
+    python -m benchmarks.bench_pdf_streaming --pages 10 100 500
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from batch import NamedBytesIO  # noqa: E402
+from benchmarks.corpus import generate_long_bill_pdf  # noqa: E402
+
+
+def full_extraction(data):
+    text = app.get_file_content(NamedBytesIO(data, 'bill.pdf'))
+    return {'disease': app.extract_diagnosis_with_regex(text), 'expense': app.extract_expense_with_regex(text)}
+
+
+def streaming_extraction(data):
+    _, bill_info = app.read_bill_streaming(NamedBytesIO(data, 'bill.pdf'))
+    return bill_info
+
+
+def measure(extract, data, repeat):
+    with contextlib.redirect_stdout(io.StringIO()):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = extract(data)
+            best = min(best, time.perf_counter() - start)
+
+        tracemalloc.start()
+        extract(data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(7)
+    rows = []
+    for page_count in args.pages:
+        data, truth = generate_long_bill_pdf(rng, page_count)
+        full_result, full_seconds, full_peak = measure(full_extraction, data, args.repeat)
+        stream_result, stream_seconds, stream_peak = measure(streaming_extraction, data, args.repeat)
+        rows.append({
+            'pages': page_count,
+            'pdf_bytes': len(data),
+            'full_ms': round(full_seconds * 1000, 1),
+            'streaming_ms': round(stream_seconds * 1000, 1),
+            'full_peak_kb': round(full_peak / 1024),
+            'streaming_peak_kb': round(stream_peak / 1024),
+            'full_correct': full_result == truth,
+            'streaming_correct': stream_result == truth,
+        })
+        print(json.dumps(rows[-1]), file=sys.stderr)
+
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == '__main__':
+    main()
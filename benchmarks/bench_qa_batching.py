@@ -0,0 +1,67 @@
+"""Local QA fallback throughput (bills/sec) as a function of micro-batch size on CPU.
+
+Every bill asks the disease and expense questions together, from ``--concurrency``
+threads at once, the way concurrent claims reach the fallback. Requires
+transformers and torch.
+
+Usage:
+    python -m benchmarks.bench_qa_batching --bills 64 --batch-sizes 1 2 4 8 16 32
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+import local_model  # noqa: E402
+from benchmarks.corpus import generate_corpus  # noqa: E402
+from qa_batcher import QABatcher  # noqa: E402
+
+
+def run(batcher, texts, concurrency):
+    questions = [app.DISEASE_QUESTION, app.EXPENSE_QUESTION]
+
+    def ask_bill(text):
+        return batcher.ask_many([(question, text) for question in questions])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(ask_bill, texts))
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bills', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=32, help="Concurrent claims submitting questions")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--wait-ms', type=float, default=5)
+    parser.add_argument('--filler', type=int, default=10, help="Filler item lines per bill")
+    args = parser.parse_args(argv)
+
+    qa = local_model.get_local_qa()
+    if qa is None:
+        sys.exit("transformers is not installed or the local QA model could not be loaded")
+
+    texts = [text for text, _ in generate_corpus(args.bills, seed=1, filler_lines=args.filler)]
+    # Warm up kernels and caches before timing
+    QABatcher(qa, max_batch_size=1).ask_many([(app.DISEASE_QUESTION, texts[0])])
+
+    results = []
+    for batch_size in args.batch_sizes:
+        batcher = QABatcher(qa, max_batch_size=batch_size, max_wait_ms=args.wait_ms,
+                            max_context_tokens=local_model.LOCAL_QA_MAX_CONTEXT_TOKENS)
+        elapsed = run(batcher, texts, args.concurrency)
+        results.append({'batch_size': batch_size, 'seconds': round(elapsed, 3),
+                        'bills_per_second': round(len(texts) / elapsed, 2)})
+        print(json.dumps(results[-1]), file=sys.stderr)
+
+    print(json.dumps({'bills': len(texts), 'concurrency': args.concurrency, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
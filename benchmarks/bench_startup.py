@@ -0,0 +1,68 @@
+"""Worker startup time and resident memory with the local QA model loaded lazily vs eagerly.
+
+Each scenario runs in a fresh interpreter so import costs are measured cold:
+
+- ``lazy``:   ``import app`` as a worker now does (model untouched)
+- ``eager``:  ``import app`` followed by loading the model, i.e. the previous import-time behaviour
+- ``server``: ``import app`` with ``LOCAL_QA_SOCKET`` set, as workers sharing one model server
+
+Usage:
+    python -m benchmarks.bench_startup --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, resource, time
+start = time.perf_counter()
+import app
+if {eager}:
+    import local_model
+    local_model.get_local_qa()
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'peak_rss_mb': rss_kb / 1024}}))
+"""
+
+
+def run_probe(eager, env_overrides):
+    env = dict(os.environ, **env_overrides)
+    output = subprocess.run([sys.executable, '-c', PROBE.format(eager=eager)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help="Worker count used for the memory projection")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per scenario (best time is reported)")
+    args = parser.parse_args(argv)
+
+    scenarios = {
+        'lazy': (False, {'LOCAL_QA_WARMUP': '0'}),
+        'eager': (True, {'LOCAL_QA_WARMUP': '0'}),
+        'server': (False, {'LOCAL_QA_SOCKET': '/tmp/claim-qa-bench.sock'}),
+    }
+    results = {}
+    for name, (eager, env) in scenarios.items():
+        runs = [run_probe(eager, env) for _ in range(args.repeat)]
+        results[name] = {
+            'startup_seconds': round(min(r['seconds'] for r in runs), 3),
+            'worker_peak_rss_mb': round(max(r['peak_rss_mb'] for r in runs), 1),
+        }
+        results[name]['projected_rss_mb'] = round(results[name]['worker_peak_rss_mb'] * args.workers, 1)
+
+    # With a model server, the model is held once rather than once per worker
+    extra = results['eager']['worker_peak_rss_mb'] - results['lazy']['worker_peak_rss_mb']
+    results['server']['projected_rss_mb'] = round(results['server']['projected_rss_mb'] + extra, 1)
+
+    print(json.dumps({'workers': args.workers, 'scenarios': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Peak RSS and latency of concurrent large bill uploads, before and after uploads.py.
+
+Each upload is a PDF of ``--size-mb`` MB. Its one page carries the diagnosis and
+amount as text, plus a large uncompressed image drawn on the page, like a
+high-resolution scan attached to a bill. ``--concurrency`` uploads are handled
+at once by threads. Each thread gets the upload spooled to a temporary file, as
+Werkzeug hands it over, and then:
+
+- ``legacy``: ``file.read()`` into bytes for the cache key, then
+  ``get_file_content`` on the stream (how ``process_claim_data`` handled uploads
+  before)
+- ``spooled``: ``uploads.open_upload``; the spool file is memory-mapped once,
+  then sniffed, hashed and read by ``get_file_content`` from that mapping
+
+PyPDF2 loads a page's images while extracting its text, so both modes still hold
+each image in memory once.
+
+Every mode runs in a fresh subprocess, so the reported peak RSS is its own.
+
+Usage:
+    python -m benchmarks.bench_uploads --size-mb 50 --concurrency 8
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('DUPLICATE_DETECTION', '0')
+os.environ.setdefault('OCR_ENABLED', '0')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+
+def write_large_pdf(path, size_mb, text="Diagnosis: Fever\nTotal Amount Payable: 1250.00"):
+    """A one-page PDF with ``text`` and a drawn grayscale image of about ``size_mb`` MB"""
+    side = int((size_mb * 1024 * 1024) ** 0.5)
+    lines = " T* ".join(f"({line}) Tj" for line in text.splitlines())
+    content = f"BT /F1 12 Tf 14 TL 72 720 Td {lines} ET q 200 0 0 200 72 400 cm /Im0 Do Q".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> /XObject << /Im0 6 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        offsets.append(f.tell())
+        f.write(b"6 0 obj\n<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Length %d >>\nstream\n" % (side, side, side * side))
+        row = bytes(range(256)) * (side // 256 + 1)
+        for _ in range(side):
+            f.write(row[:side])
+        f.write(b"\nendstream\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref))
+
+
+def spooled_copy(path, spool_bytes):
+    """The upload as Werkzeug's form parser leaves it: a spooled temporary file"""
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_bytes, mode='rb+')
+    with open(path, 'rb') as f:
+        shutil.copyfileobj(f, spool, 1024 * 1024)
+    spool.seek(0)
+    return spool
+
+
+def handle_legacy(spool):
+    import app
+    from bill_cache import bill_cache_key
+
+    data = spool.read()
+    spool.seek(0)
+    key = bill_cache_key(data, app.EXTRACTOR_VERSION)
+    return key, app.get_file_content(spool)
+
+
+def handle_spooled(spool):
+    import app
+    import uploads
+    from bill_cache import digest_cache_key
+
+    with uploads.open_upload(spool, 'bill.pdf') as upload:
+        key = digest_cache_key(upload.sha256(), app.EXTRACTOR_VERSION)
+        return key, app.get_file_content(upload)
+
+
+def run_mode(mode, path, concurrency, rounds):
+    """Runs inside the child process; prints one JSON line"""
+    import app  # noqa: F401  (import cost stays out of the measured window)
+    import uploads
+
+    handle = {'legacy': handle_legacy, 'spooled': handle_spooled}[mode]
+    latencies = []
+    barrier = threading.Barrier(concurrency)
+    errors = []
+
+    def worker():
+        for _ in range(rounds):
+            spool = spooled_copy(path, uploads.UPLOAD_SPOOL_BYTES)
+            barrier.wait()
+            start = time.perf_counter()
+            try:
+                digest, text = handle(spool)
+                if 'Fever' not in text:
+                    errors.append("text not extracted")
+            except Exception as e:
+                errors.append(repr(e))
+            latencies.append(time.perf_counter() - start)
+            spool.close()
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    print(json.dumps({'mode': mode, 'uploads': len(latencies),
+                      'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                      'rss_before_uploads_mb': round(baseline_kb / 1024, 1),
+                      'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+                      'max_ms': round(latencies[-1] * 1000, 1),
+                      'errors': errors[:3]}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=2, help="Uploads per thread")
+    parser.add_argument('--modes', nargs='+', choices=['legacy', 'spooled'], default=['legacy', 'spooled'])
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--pdf', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_mode(args.child, args.pdf, args.concurrency, args.rounds)
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        write_large_pdf(path, args.size_mb)
+        results = []
+        for mode in args.modes:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_uploads', '--child', mode, '--pdf', path,
+                 '--concurrency', str(args.concurrency), '--rounds', str(args.rounds)],
+                check=True, capture_output=True, text=True,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+            print(json.dumps(results[-1]), file=sys.stderr)
+    finally:
+        os.remove(path)
+
+    print(json.dumps({'size_mb': args.size_mb, 'concurrency': args.concurrency, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
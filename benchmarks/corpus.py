@@ -0,0 +1,162 @@
+"""Synthetic medical bill corpus with known ground truth for benchmarks."""
+import random
+
+HOSPITALS = ["APOLLO HOSPITALS", "FORTIS HOSPITAL", "MAX HEALTHCARE", "CITY CARE CLINIC",
+             "MEDANTA", "ST. MARY'S MEDICAL CENTRE", "SUNRISE NURSING HOME"]
+
+DIAGNOSES = ["Bodyache with fever", "Viral fever", "Fracture of left wrist", "Acute gastritis",
+             "Migraine", "Pneumonia", "Type 2 diabetes follow-up", "Tonsillitis",
+             "Pregnancy - First trimester care", "Sinusitis", "Hypertension review"]
+
+LINE_ITEMS = ["Doctor's fee", "Consultation", "Medicines", "Ultrasound", "Blood test",
+              "X-Ray", "Room charges", "Nursing", "Physiotherapy", "Dressing"]
+
+CURRENCIES = ["", "$", "₹", "€", "£"]
+
+PRIORITY_TOTAL_LABELS = ["Amount payable", "Net amount", "Total payable", "Grand total", "Amount due"]
+
+TOTAL_LABELS = PRIORITY_TOTAL_LABELS + ["Total", "Total Bill"]
+
+NOISE_LINES = ["Thank you for choosing us", "This is a computer generated invoice",
+               "Visiting hours: 10am - 8pm", "Ref no 2231 / OPD", "Page generated on 12/03/2024",
+               "Please retain this receipt for insurance purposes"]
+
+# itemized: "Diagnosis:" label and "name - amount" rows (the sample Apollo bill)
+# tabular:  "Condition:" label and a description/qty/amount table with decimals
+# complaint: "Chief Complaint:" label, "Rs." amounts with thousands separators
+LAYOUTS = ('itemized', 'tabular', 'complaint')
+
+DIAGNOSIS_LABELS = {'itemized': "Diagnosis", 'tabular': "Condition", 'complaint': "Chief Complaint"}
+
+
+def _item_line(layout, name, currency, amount, qty):
+    if layout == 'tabular':
+        return f"{name:<16} {qty:>3}   {currency}{amount:.2f}"
+    if layout == 'complaint':
+        return f"{name}: Rs. {amount:,.2f}"
+    return f"{name} - {currency}{amount}"
+
+
+def _total_line(layout, label, separator, currency, total):
+    if layout == 'tabular':
+        return f"{label}{separator}{currency}{total:.2f}"
+    if layout == 'complaint':
+        return f"{label}{separator}Rs. {total:,.2f}"
+    return f"{label}{separator}{currency}{total}"
+
+
+def generate_bill(rng, items=None, noise=0, filler_lines=0, currencies=CURRENCIES, total_labels=TOTAL_LABELS,
+                  layout='itemized', hospital=None):
+    """Build one synthetic bill; returns (text, {'disease', 'expense'}) ground truth"""
+    hospital = hospital or rng.choice(HOSPITALS)
+    diagnosis = rng.choice(DIAGNOSES)
+    currency = rng.choice(currencies)
+    items = items or rng.randint(2, 6)
+
+    lines = [hospital, "Patient Information:",
+             f"- Name: Patient {rng.randint(1, 99999)}",
+             f"- Address: {rng.randint(1, 999)} Main Road",
+             f"- Phone Number:{rng.randint(10**9, 10**10 - 1)}",
+             "Service Details:",
+             f"Date of Service: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024",
+             f"{DIAGNOSIS_LABELS[layout]}: {diagnosis}",
+             "Description      Qty   Amount" if layout == 'tabular' else "Service charges:"]
+
+    total = 0
+    for name in rng.sample(LINE_ITEMS, min(items, len(LINE_ITEMS))):
+        amount = rng.randint(1, 60) * 50
+        total += amount
+        lines.append(_item_line(layout, name, currency, amount, rng.randint(1, 3) if layout == 'tabular' else 1))
+
+    for _ in range(filler_lines):
+        lines.append(f"Item code {rng.randint(1000, 9999)} qty {rng.randint(1, 9)}")
+    for _ in range(noise):
+        lines.insert(rng.randint(1, len(lines)), rng.choice(NOISE_LINES))
+
+    label = rng.choice(total_labels)
+    separator = rng.choice([" - ", ": ", " "])
+    lines.append(_total_line(layout, label, separator, currency, total))
+
+    return "\n".join(lines), {'disease': diagnosis, 'expense': float(total)}
+
+
+def generate_corpus(count, seed=0, **kwargs):
+    """Deterministic list of (text, truth) pairs"""
+    rng = random.Random(seed)
+    return [generate_bill(rng, **kwargs) for _ in range(count)]
+
+
+def _pdf_escape(line):
+    line = line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return line.encode('latin-1', errors='replace')
+
+
+def make_pdf(pages, lines_per_page=60):
+    """Render pages (each a list of text lines) as a minimal text-layer PDF"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for lines in pages:
+        stream = b"BT /F1 10 Tf 12 TL 40 800 Td " + b" ".join(
+            b"(" + _pdf_escape(line) + b") Tj T*" for line in lines[:lines_per_page]) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref)
+        page_refs.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % ref for ref in page_refs) + \
+        b"] /Count %d >>" % len(page_refs)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def generate_long_bill_pdf(rng, page_count, lines_per_page=50):
+    """Multi-page bill: header and diagnosis on page one, itemized pages, total on the last page"""
+    # Long hospital bills end in a labeled amount payable, without a currency sign
+    text, truth = generate_bill(rng, items=4, currencies=("",), total_labels=PRIORITY_TOTAL_LABELS)
+    lines = text.split("\n")
+    header, footer = lines[:-1], lines[-1:]
+    pages = [header]
+    for page in range(1, page_count - 1):
+        pages.append([f"Item {page}-{row} Pharmacy consumable batch {rng.randint(1000, 9999)} qty {rng.randint(1, 9)}"
+                      for row in range(lines_per_page)])
+    pages.append(["Summary of charges"] + footer)
+    return make_pdf(pages, lines_per_page=max(lines_per_page, len(header)) + 1), truth
+
+
+def generate_bill_pdf(rng, page_count=1, layout='itemized', noise=0, lines_per_page=50):
+    """One bill as a PDF; extra pages are itemized filler between the header and the total"""
+    text, truth = generate_bill(rng, noise=noise, layout=layout)
+    lines = text.split("\n")
+    if page_count <= 1:
+        return make_pdf([lines], lines_per_page=max(lines_per_page, len(lines))), truth
+    header, footer = lines[:-1], lines[-1:]
+    pages = [header]
+    for page in range(1, page_count - 1):
+        pages.append([f"Item {page}-{row} Pharmacy consumable batch {rng.randint(1000, 9999)} qty {rng.randint(1, 9)}"
+                      for row in range(lines_per_page)])
+    pages.append(["Summary of charges"] + footer)
+    return make_pdf(pages, lines_per_page=max(lines_per_page, len(header)) + 1), truth
+
+
+def generate_pdf_corpus(count, seed=0, layouts=LAYOUTS, page_counts=(1, 1, 1, 2, 5), noise=(0, 2, 5)):
+    """Deterministic list of bill dicts: name, layout, pages, noise, pdf bytes and ground truth"""
+    rng = random.Random(seed)
+    bills = []
+    for index in range(count):
+        layout = rng.choice(layouts)
+        page_count = rng.choice(page_counts)
+        noise_lines = rng.choice(noise)
+        data, truth = generate_bill_pdf(rng, page_count, layout=layout, noise=noise_lines)
+        bills.append({'name': f"bill_{index:05d}.pdf", 'layout': layout, 'pages': page_count,
+                      'noise': noise_lines, 'pdf': data, 'truth': truth})
+    return bills
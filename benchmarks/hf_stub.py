@@ -0,0 +1,141 @@
+"""Local stand-in for the Hugging Face inference endpoint, plus a driver for HFInferenceClient.
+
+The stub answers like flan-t5 with a JSON ``generated_text`` after a configurable
+latency, and fails a configurable fraction of requests with 503 (or by stalling
+past the client's read timeout). ``main`` runs the client through healthy,
+slow and failing scenarios and reports latency, outcomes and breaker state.
+
+Usage:
+    python -m benchmarks.hf_stub --requests 200 --concurrency 16
+    python -m benchmarks.hf_stub --serve --port 8099 --latency-ms 50 --error-rate 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hf_client import CircuitBreaker, EndpointUnavailableError, HFInferenceClient  # noqa: E402
+
+
+class StubConfig:
+    def __init__(self, latency_ms=20, error_rate=0.0, stall_rate=0.0, stall_seconds=30):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.requests = 0
+
+
+def make_handler(config):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            config.requests += 1
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            prompt = json.loads(body or b'{}').get('inputs', '')
+
+            roll = random.random()
+            if roll < config.stall_rate:
+                time.sleep(config.stall_seconds)
+            time.sleep(config.latency_ms / 1000.0)
+
+            if roll < config.stall_rate + config.error_rate:
+                payload, status = {'error': 'Model is currently loading'}, 503
+            else:
+                amounts = re.findall(r'(\d+(?:\.\d+)?)\s*$', prompt, re.MULTILINE)
+                generated = json.dumps({'disease': 'Stub condition', 'expense': amounts[-1] if amounts else '0'})
+                payload, status = [{'generated_text': generated}], 200
+
+            data = json.dumps(payload).encode()
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up (read timeout) while we were stalling
+                pass
+
+    return StubHandler
+
+
+def start_stub_server(config, port=0):
+    """Serve the stub in a background thread; returns (server, url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/models/stub"
+
+
+def drive(client, count):
+    """Fire ``count`` prompts through agenerate_many and summarize the outcome"""
+    prompts = [f"Text: Amount payable - {100 + i}" for i in range(count)]
+    start = time.perf_counter()
+    results = asyncio.run(client.agenerate_many(prompts))
+    elapsed = time.perf_counter() - start
+
+    outcome = {'ok': 0, 'skipped': 0, 'failed': 0}
+    for result in results:
+        if isinstance(result, EndpointUnavailableError):
+            outcome['skipped'] += 1
+        elif isinstance(result, Exception):
+            outcome['failed'] += 1
+        else:
+            outcome['ok'] += 1
+    return dict(outcome, seconds=round(elapsed, 3), requests_per_second=round(count / elapsed, 1),
+                breaker=client.breaker.state)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--serve', action='store_true', help="Only run the stub server")
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        config = StubConfig(latency_ms=args.latency_ms, error_rate=args.error_rate)
+        server, url = start_stub_server(config, port=args.port)
+        print(f"Stub inference endpoint at {url} (export HF_API_URL={url})")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    scenarios = {
+        'healthy': StubConfig(latency_ms=args.latency_ms),
+        'flaky': StubConfig(latency_ms=args.latency_ms, error_rate=0.3),
+        'slow': StubConfig(latency_ms=args.latency_ms, stall_rate=1.0, stall_seconds=2),
+        'down': StubConfig(latency_ms=args.latency_ms, error_rate=1.0),
+    }
+    report = {}
+    for name, config in scenarios.items():
+        server, url = start_stub_server(config)
+        client = HFInferenceClient(api_url=url, read_timeout=0.5, max_retries=2, backoff_base=0.05,
+                                   max_concurrency=args.concurrency, acquire_timeout=5.0,
+                                   breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30))
+        report[name] = dict(drive(client, args.requests), endpoint_requests=config.requests)
+        server.shutdown()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
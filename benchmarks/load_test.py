@@ -0,0 +1,205 @@
+"""Load test for the claim form endpoint (``POST /``) with the sample bills in ``Bills/``.
+
+``--concurrency`` client threads submit claims for ``--duration`` seconds, cycling
+through the sample PDFs. By default each upload gets a unique trailer, so every
+request misses the bill cache and is parsed and extracted; ``--repeat-bills``
+sends the PDFs unchanged. Reported: requests/sec, p50/p95/p99 and max latency,
+and status counts.
+
+Point it at a running server with ``--url``, or let it start one on a free port
+with ``--serve``:
+
+- ``gunicorn``: ``gunicorn -c gunicorn.conf.py wsgi:app`` (preloaded, forked workers)
+- ``gunicorn-no-preload``: the same with ``GUNICORN_PRELOAD=0``
+- ``flask``: ``python app.py`` (the development server)
+
+A started server gets its own cache and index directories, no job workers, and
+an unreachable Hugging Face endpoint. Its proportional memory (PSS, summed over
+the master and workers) is reported after the run.
+
+Usage:
+    python -m benchmarks.load_test --serve gunicorn --workers 4 --concurrency 16 --duration 30
+    python -m benchmarks.load_test --url http://127.0.0.1:8081/ --concurrency 8
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Claim form fields for each sample bill (by file name); other bills get the defaults
+CLAIMS = {
+    'Bodyache.pdf': {'claim_reason': "Bodyache with fever", 'total_claim_amount': '3150'},
+    'Pregnancy.pdf': {'claim_reason': "Prenatal checkup", 'total_claim_amount': '5800'},
+}
+DEFAULT_CLAIM = {'name': "Load Test", 'address': "1 Test Road", 'claim_type': "Medical",
+                 'claim_reason': "Treatment", 'total_claim_amount': '1000'}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port, workers, threads, state_dir):
+    env = dict(os.environ, PORT=str(port), JOB_WORKERS='0', LOG_LEVEL='WARNING',
+               HF_API_URL='http://127.0.0.1:9/disabled',
+               BILL_CACHE_DB=os.path.join(state_dir, 'bill_cache.sqlite3'),
+               DUPLICATE_INDEX_DIR=os.path.join(state_dir, 'duplicates'),
+               JOB_QUEUE_DB=os.path.join(state_dir, 'jobs.sqlite3'))
+    if mode == 'flask':
+        command = [sys.executable, 'app.py']
+    else:
+        env.update(WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads),
+                   GUNICORN_PRELOAD='0' if mode == 'gunicorn-no-preload' else '1')
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{port}', 'wsgi:app']
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Server exited with status {process.returncode}")
+        try:
+            if requests.get(base_url + 'readyz', timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"Server at {base_url} not ready after {timeout}s")
+
+
+def process_tree_pss_mb(pid):
+    """Proportional set size of a process and its descendants (Linux), or None"""
+    total_kb = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f'/proc/{current}/smaps_rollup') as f:
+                total_kb += sum(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pending.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError):
+        return None
+    return round(total_kb / 1024, 1)
+
+
+def load_bills(pattern):
+    bills = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'rb') as f:
+            bills.append((os.path.basename(path), f.read()))
+    if not bills:
+        raise SystemExit(f"No bills match {pattern}")
+    return bills
+
+
+def run_load(url, bills, concurrency, duration, warmup, unique):
+    counter = itertools.count()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            number = next(counter)
+            name, data = bills[number % len(bills)]
+            if unique:
+                # Bytes after %%EOF are ignored by PDF readers but change the bill's hash
+                data = data + f"\n%load-test {uuid.uuid4().hex}\n".encode()
+            form = dict(DEFAULT_CLAIM, **CLAIMS.get(name, {}))
+            start = time.perf_counter()
+            try:
+                status = session.post(url, data=form, files={'medical_bill': (name, data, 'application/pdf')},
+                                      timeout=120).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            if number < warmup:
+                continue
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    if not latencies:
+        return {'requests': 0, 'status': statuses}
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+    return {'requests': len(latencies),
+            'requests_per_sec': round(len(latencies) / wall, 1),
+            'p50_ms': percentile(0.50), 'p95_ms': percentile(0.95), 'p99_ms': percentile(0.99),
+            'max_ms': round(latencies[-1] * 1000, 1),
+            'status': {str(key): value for key, value in sorted(statuses.items(), key=str)}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help="Claim endpoint of a running server, e.g. http://127.0.0.1:8081/")
+    parser.add_argument('--serve', choices=['gunicorn', 'gunicorn-no-preload', 'flask'],
+                        help="Start a server for the run instead of using --url")
+    parser.add_argument('--workers', type=int, default=4, help="Gunicorn workers (--serve gunicorn)")
+    parser.add_argument('--threads', type=int, default=4, help="Threads per gunicorn worker")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds of load")
+    parser.add_argument('--warmup', type=int, default=20, help="Leading requests left out of the results")
+    parser.add_argument('--bills', default=os.path.join(ROOT, 'Bills', '*.pdf'), help="Glob of PDFs to upload")
+    parser.add_argument('--repeat-bills', action='store_true', help="Send the PDFs unchanged (bill cache hits)")
+    args = parser.parse_args(argv)
+    if not args.url and not args.serve:
+        parser.error("give --url or --serve")
+
+    bills = load_bills(args.bills)
+    process = None
+    with tempfile.TemporaryDirectory() as state_dir:
+        try:
+            if args.serve:
+                port = free_port()
+                process = start_server(args.serve, port, args.workers, args.threads, state_dir)
+                url = f'http://127.0.0.1:{port}/'
+            else:
+                url = args.url if args.url.endswith('/') else args.url + '/'
+            wait_ready(url, process)
+
+            result = run_load(url, bills, args.concurrency, args.duration, args.warmup, not args.repeat_bills)
+            if process is not None:
+                result['server_pss_mb'] = process_tree_pss_mb(process.pid)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=60)
+
+    print(json.dumps({'server': args.serve or args.url, 'workers': args.workers if args.serve != 'flask' else 1,
+                      'concurrency': args.concurrency, 'duration': args.duration,
+                      'unique_bills': not args.repeat_bills, 'bills': [name for name, _ in bills],
+                      'result': result}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""Reproducible extraction benchmark suite over a synthetic bill PDF corpus.
+
+Generates ``--bills`` PDFs with known ground truth (mixed layouts, currencies, page
+counts and noise lines) and measures three paths:
+
+- ``regex``:       PDF text extraction plus the regex extractors, timed per stage
+- ``end_to_end``:  ``app.process_claim_data`` from upload to decision, with the bill cache off
+- ``local_model``: the local QA fallback on the extracted text (skipped without transformers)
+
+For each path it reports bills/sec, p50/p99 latency per stage, peak traced memory
+and extraction accuracy, as JSON. ``--compare`` checks the run against an earlier
+result file and exits non-zero if any metric regressed by more than ``--tolerance``.
+
+The Hugging Face tier is pointed at a closed local port unless ``HF_API_URL`` is
+set (e.g. to ``benchmarks.hf_stub``), so end-to-end numbers exclude the network.
+
+Usage:
+    python -m benchmarks.run_suite --bills 200 -o baseline.json
+    python -m benchmarks.run_suite --bills 200 --compare baseline.json
+    python -m benchmarks.run_suite --bills 50 --corpus-dir /tmp/corpus   # also feeds batch.py
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('HF_API_URL', 'http://127.0.0.1:9/disabled')
+os.environ.setdefault('HF_MAX_RETRIES', '0')
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+# End-to-end runs record every bill; keep them out of the real duplicate index
+os.environ.setdefault('DUPLICATE_INDEX_DIR', tempfile.mkdtemp(prefix='bench-duplicates-'))
+
+import app  # noqa: E402
+import local_model  # noqa: E402
+from batch import NamedBytesIO  # noqa: E402
+from benchmarks.corpus import LAYOUTS, generate_pdf_corpus  # noqa: E402
+from bill_cache import BillCache  # noqa: E402
+
+PATIENT_INFO = {'name': "Benchmark Patient", 'address': "1 Main Road", 'claim_type': "Outpatient",
+                'claim_reason': "Treatment", 'date': "01/01/2024", 'medical_facility': "Benchmark Hospital",
+                'description': '', 'product': ''}
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))]
+
+
+def summarize(samples):
+    return {'p50_ms': round(percentile(samples, 50) * 1000, 3),
+            'p99_ms': round(percentile(samples, 99) * 1000, 3),
+            'mean_ms': round(sum(samples) / len(samples) * 1000, 3)}
+
+
+def is_correct(result, truth):
+    """(disease correct, expense correct) for one extraction"""
+    disease = str(result.get('disease') or '').strip().lower()
+    try:
+        expense = float(result.get('expense') or 0)
+    except (TypeError, ValueError):
+        expense = 0.0
+    return disease == truth['disease'].lower(), abs(expense - truth['expense']) < 0.01
+
+
+def accuracy(outcomes):
+    """outcomes: (layout, disease_ok, expense_ok) per bill"""
+    def rates(rows):
+        return {'disease_accuracy': round(sum(d for _, d, _ in rows) / len(rows), 4),
+                'expense_accuracy': round(sum(e for _, _, e in rows) / len(rows), 4),
+                'exact_accuracy': round(sum(d and e for _, d, e in rows) / len(rows), 4)}
+
+    result = rates(outcomes)
+    result['by_layout'] = {layout: rates([row for row in outcomes if row[0] == layout])
+                           for layout in sorted({row[0] for row in outcomes})}
+    return result
+
+
+def regex_path(bill):
+    """Returns (result, {stage: seconds})"""
+    timings = {}
+    start = time.perf_counter()
+    text = app.get_file_content(NamedBytesIO(bill['pdf'], bill['name']))
+    timings['pdf_text'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    disease = app.extract_diagnosis_with_regex(text)
+    timings['diagnosis_regex'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expense = app.extract_expense_with_regex(text)
+    timings['expense_regex'] = time.perf_counter() - start
+
+    bill['text'] = text
+    return {'disease': disease, 'expense': expense}, timings
+
+
+def end_to_end_path(bill):
+    patient_info = dict(PATIENT_INFO, total_claim_amount=str(bill['truth']['expense']))
+    start = time.perf_counter()
+    result = app.process_claim_data(patient_info, NamedBytesIO(bill['pdf'], bill['name']))
+    timings = {'total': time.perf_counter() - start}
+    return result.get('bill_info') or {}, timings
+
+
+def local_model_path(bill):
+    start = time.perf_counter()
+    answers = local_model.ask_local_qa([(app.DISEASE_QUESTION, bill['text']), (app.EXPENSE_QUESTION, bill['text'])])
+    timings = {'local_qa': time.perf_counter() - start}
+    disease_result, expense_result = answers
+    return {'disease': disease_result['answer'] if disease_result['score'] > 0.1 else None,
+            'expense': app.clean_and_convert_amount(expense_result['answer'])}, timings
+
+
+def run_path(run, bills, trace_memory=True):
+    """Time ``run`` over every bill, then repeat once under tracemalloc for the peak"""
+    run(bills[0])  # warm up imports and regex caches
+    stage_samples = {}
+    outcomes = []
+    start = time.perf_counter()
+    for bill in bills:
+        result, timings = run(bill)
+        for stage, seconds in timings.items():
+            stage_samples.setdefault(stage, []).append(seconds)
+        outcomes.append((bill['layout'],) + is_correct(result, bill['truth']))
+    elapsed = time.perf_counter() - start
+
+    report = {'bills_per_second': round(len(bills) / elapsed, 2),
+              'stages': {stage: summarize(samples) for stage, samples in stage_samples.items()}}
+    if len(stage_samples) > 1:
+        totals = [sum(values) for values in zip(*stage_samples.values())]
+        report['stages']['total'] = summarize(totals)
+    report['accuracy'] = accuracy(outcomes)
+
+    if trace_memory:
+        tracemalloc.start()
+        for bill in bills:
+            run(bill)
+        report['peak_traced_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+    return report
+
+
+def write_corpus(bills, directory):
+    """PDFs plus an NDJSON manifest (with ground truth) usable by batch.py"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'manifest.ndjson'), 'w') as manifest:
+        for index, bill in enumerate(bills):
+            with open(os.path.join(directory, bill['name']), 'wb') as f:
+                f.write(bill['pdf'])
+            row = dict(PATIENT_INFO, claim_id=str(index + 1), bill=bill['name'], layout=bill['layout'],
+                       pages=bill['pages'], total_claim_amount=str(bill['truth']['expense']),
+                       truth=bill['truth'])
+            manifest.write(json.dumps(row) + "\n")
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """Metrics that got worse than the baseline by more than ``tolerance`` (relative)"""
+    current_flat = flatten(current['paths'])
+    regressions = []
+    for name, old in flatten(baseline['paths']).items():
+        new = current_flat.get(name)
+        if new is None or not old:
+            continue
+        if name.endswith(('_ms', '_kb')):
+            worse = new > old * (1 + tolerance)
+        elif 'accuracy' in name:
+            # Accuracy is deterministic on a fixed corpus, so any drop counts
+            worse = new < old - 1e-9
+        elif name.endswith('per_second'):
+            worse = new < old * (1 - tolerance)
+        else:
+            continue
+        if worse:
+            regressions.append({'metric': name, 'baseline': old, 'current': new})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bills', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--layouts', nargs='+', choices=LAYOUTS, default=list(LAYOUTS))
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 1, 1, 2, 5],
+                        help="Page counts sampled per bill")
+    parser.add_argument('--noise', type=int, nargs='+', default=[0, 2, 5],
+                        help="Noise line counts sampled per bill")
+    parser.add_argument('--paths', nargs='+', choices=['regex', 'end_to_end', 'local_model'],
+                        default=['regex', 'end_to_end', 'local_model'])
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--corpus-dir', help="Also write the PDFs and a batch manifest here")
+    parser.add_argument('-o', '--output', help="Write results JSON here (default: stdout)")
+    parser.add_argument('--compare', help="Earlier results JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed relative slowdown or memory growth (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    bills = generate_pdf_corpus(args.bills, seed=args.seed, layouts=args.layouts,
+                                page_counts=args.pages, noise=args.noise)
+    if args.corpus_dir:
+        write_corpus(bills, args.corpus_dir)
+
+    # Every bill must go through extraction, not come back from the cache
+    app.bill_cache = BillCache(max_entries=0)
+
+    paths = {}
+    if 'regex' in args.paths or 'local_model' in args.paths:
+        # The regex pass also fills bill['text'] for the local model path
+        paths['regex'] = run_path(regex_path, bills, trace_memory=not args.no_memory)
+    if 'end_to_end' in args.paths:
+        paths['end_to_end'] = run_path(end_to_end_path, bills, trace_memory=not args.no_memory)
+    if 'local_model' in args.paths:
+        if local_model.get_local_qa() is None:
+            paths['local_model'] = {'skipped': "transformers is not installed or the model could not be loaded"}
+        else:
+            paths['local_model'] = run_path(local_model_path, bills, trace_memory=not args.no_memory)
+    if 'regex' not in args.paths:
+        paths.pop('regex', None)
+
+    results = {
+        'config': {'bills': args.bills, 'seed': args.seed, 'layouts': args.layouts, 'pages': args.pages,
+                   'noise': args.noise, 'extractor_version': app.EXTRACTOR_VERSION,
+                   'python': platform.python_version(), 'machine': platform.machine()},
+        'corpus': {'pages': sum(bill['pages'] for bill in bills),
+                   'pdf_bytes': sum(len(bill['pdf']) for bill in bills)},
+        'paths': paths,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('config', {}).get('bills') != args.bills or baseline.get('config', {}).get('seed') != args.seed:
+            print("warning: baseline was run on a different corpus", file=sys.stderr)
+        results['regressions'] = compare(results, baseline, args.tolerance)
+        for regression in results['regressions']:
+            print(f"REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']}",
+                  file=sys.stderr)
+        exit_code = 1 if results['regressions'] else 0
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
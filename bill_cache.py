@@ -0,0 +1,184 @@
+"""Content-addressed cache of extracted bill text and bill_info.
+
+Entries are keyed by the SHA-256 of the uploaded PDF bytes plus the extractor
+version, so resubmitting the same bill skips PDF parsing and the model fallbacks.
+Lookups go through an in-process LRU first and an optional SQLite file second;
+the SQLite tier is shared by every worker pointed at the same path.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def bill_cache_key(data, version):
+    """Cache key for a bill's raw bytes under a given extractor version"""
+    return digest_cache_key(hashlib.sha256(data).hexdigest(), version)
+
+
+def digest_cache_key(digest, version):
+    """Cache key for a bill whose SHA-256 hex digest is already known"""
+    return f"{digest}:{version}"
+
+
+class BillCache:
+    """Two-tier (memory LRU + optional SQLite) cache with TTL and size-based eviction"""
+
+    def __init__(self, max_entries=256, db_path=None, max_db_bytes=256 * 1024 * 1024, ttl_seconds=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.max_db_bytes = max_db_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0,
+                          'memory_evictions': 0, 'disk_evictions': 0}
+
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute("""CREATE TABLE IF NOT EXISTS bill_cache (
+                    key TEXT PRIMARY KEY,
+                    entry TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL)""")
+                conn.execute("CREATE INDEX IF NOT EXISTS bill_cache_accessed ON bill_cache (accessed)")
+                conn.execute("CREATE INDEX IF NOT EXISTS bill_cache_created ON bill_cache (created)")
+                # Running total of entry sizes, kept by triggers so eviction never sums the table
+                conn.execute("""CREATE TABLE IF NOT EXISTS bill_cache_total (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    size INTEGER NOT NULL)""")
+                conn.execute("INSERT OR IGNORE INTO bill_cache_total (id, size) "
+                             "SELECT 0, COALESCE(SUM(size), 0) FROM bill_cache")
+                conn.execute("""CREATE TRIGGER IF NOT EXISTS bill_cache_total_insert AFTER INSERT ON bill_cache
+                    BEGIN UPDATE bill_cache_total SET size = size + NEW.size WHERE id = 0; END""")
+                conn.execute("""CREATE TRIGGER IF NOT EXISTS bill_cache_total_delete AFTER DELETE ON bill_cache
+                    BEGIN UPDATE bill_cache_total SET size = size - OLD.size WHERE id = 0; END""")
+                conn.execute("""CREATE TRIGGER IF NOT EXISTS bill_cache_total_update AFTER UPDATE OF size ON bill_cache
+                    BEGIN UPDATE bill_cache_total SET size = size - OLD.size + NEW.size WHERE id = 0; END""")
+
+    def _connect(self):
+        """One SQLite connection per thread (and per process, after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _expired(self, created):
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def get(self, key):
+        """Return the cached entry dict for ``key`` or None"""
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                created, entry = item
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return entry
+                del self._memory[key]
+
+        if self.db_path:
+            try:
+                conn = self._connect()
+                row = conn.execute("SELECT entry, created FROM bill_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry_json, created = row
+                    if not self._expired(created):
+                        with conn:
+                            conn.execute("UPDATE bill_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+                        entry = json.loads(entry_json)
+                        self._remember(key, created, entry)
+                        self._count('disk_hits')
+                        return entry
+                    with conn:
+                        conn.execute("DELETE FROM bill_cache WHERE key = ?", (key,))
+            except sqlite3.Error as e:
+                logger.warning("Bill cache read error: %s", e)
+
+        self._count('misses')
+        return None
+
+    def put(self, key, **fields):
+        """Store (or extend) the entry for ``key`` with the given fields"""
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            entry = dict(item[1]) if item else {}
+        entry.update(fields)
+
+        if self.db_path:
+            try:
+                conn = self._connect()
+                with conn:
+                    # Merged with the stored row in the same write transaction, so fields that
+                    # another worker stored, or that were evicted from memory here, are kept
+                    conn.execute("BEGIN IMMEDIATE")
+                    row = conn.execute("SELECT entry, created FROM bill_cache WHERE key = ?", (key,)).fetchone()
+                    if row is not None and not self._expired(row[1]):
+                        entry = dict(json.loads(row[0]), **entry)
+                    entry_json = json.dumps(entry)
+                    if row is None:
+                        conn.execute("INSERT INTO bill_cache (key, entry, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                                     (key, entry_json, len(entry_json), now, now))
+                    else:
+                        # Not INSERT OR REPLACE: its implicit delete would skip the size trigger
+                        conn.execute("UPDATE bill_cache SET entry = ?, size = ?, created = ?, accessed = ? WHERE key = ?",
+                                     (entry_json, len(entry_json), now, now, key))
+                self._evict_disk(conn)
+            except sqlite3.Error as e:
+                logger.warning("Bill cache write error: %s", e)
+
+        self._remember(key, now, entry)
+        self._count('stores')
+
+    def _remember(self, key, created, entry):
+        with self._lock:
+            self._memory[key] = (created, entry)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._counters['memory_evictions'] += 1
+
+    def _evict_disk(self, conn):
+        """Drop expired rows, then least recently used rows until under the size budget"""
+        evicted = 0
+        with conn:
+            if self.ttl_seconds is not None:
+                conn.execute("DELETE FROM bill_cache WHERE created < ?", (time.time() - self.ttl_seconds,))
+            total = conn.execute("SELECT size FROM bill_cache_total WHERE id = 0").fetchone()[0]
+            while total > self.max_db_bytes:
+                rows = conn.execute("SELECT key, size FROM bill_cache ORDER BY accessed LIMIT 64").fetchall()
+                if not rows:
+                    break
+                for key, size in rows:
+                    if total <= self.max_db_bytes:
+                        break
+                    conn.execute("DELETE FROM bill_cache WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+        self._count('disk_evictions', evicted)
+
+    def stats(self):
+        """Hit/miss counters and current hit rate for this process"""
+        with self._lock:
+            stats = dict(self._counters, memory_entries=len(self._memory))
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
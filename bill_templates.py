@@ -0,0 +1,225 @@
+"""Layout templates for known hospital bill formats.
+
+Each template lives in ``<template_dir>/<name>.json`` and describes one chain's
+fixed bill layout::
+
+    name, version,
+    headers      header text that identifies the layout, e.g. ["APOLLO HOSPITALS"]
+    fields       {"disease": {"anchors": ["Diagnosis"], "until": ["Details"]},
+                  "expense": {"anchors": ["Amount payable"], "type": "amount", "occurrence": "last"}}
+
+A field's value is read right after one of its anchors (and an optional ``:`` or
+``-``). ``amount`` fields take the first number there, after a currency prefix.
+``text`` fields (the default) run to the end of the anchor's line. When nothing
+follows the anchor on its line, as in PDFs whose text layer puts every word on
+its own line, the value runs over the next lines up to one of the field's
+``until`` anchors, if it has any. ``occurrence`` picks the ``first``
+(default) or ``last`` anchored value. Words of an anchor may be separated by any
+whitespace.
+
+Templates are compiled once at startup. Headers are fingerprinted as their
+lowercase letters and digits only, so "APOLLO\\nHOSPIT ALS" still matches, and
+kept in a dict. ``match`` probes that dict with the fingerprint of the text at
+each of the first ``HEADER_LINES`` non-empty lines, once per distinct header
+length; dispatch cost does not grow with the number of templates. Bills without
+a known header get None and go through the generic regex extraction.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FILE_PATTERN = re.compile(r'^[A-Za-z0-9_-]+\.json$')
+
+# Headers are looked for at the start of this many leading non-empty lines,
+# within the first HEADER_WINDOW characters of the bill
+HEADER_LINES = 3
+HEADER_WINDOW = 512
+
+NON_ALNUM_PATTERN = re.compile(r'[^a-z0-9]+')
+
+FIELD_TYPES = ('text', 'amount')
+
+# Text values outside this length are treated as misreads, as in the regex tier
+MIN_TEXT_LENGTH = 4
+MAX_TEXT_LENGTH = 99
+
+AMOUNT_VALUE = r'[^\d\n]{0,12}?(\d[\d,]*(?:\.\d+)?)'
+
+
+class TemplateError(ValueError):
+    """Raised for an invalid template file"""
+
+
+def header_fingerprint(text):
+    """'Apollo Hospitals,' -> 'apollohospitals'"""
+    return NON_ALNUM_PATTERN.sub('', text.lower())
+
+
+def parse_amount(value):
+    """'6,950.00' -> 6950.0; None if it is not a number"""
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _anchor_pattern(anchors):
+    # Longest anchors first, so "Amount payable" wins over "Amount"
+    words = [r'\s+'.join(re.escape(word) for word in anchor.split())
+             for anchor in sorted(anchors, key=len, reverse=True)]
+    return r'(?<![A-Za-z0-9])(?:' + '|'.join(words) + r')(?![A-Za-z0-9])'
+
+
+class BillTemplate:
+    """Anchor patterns for one hospital bill layout"""
+
+    def __init__(self, definition, source=None):
+        try:
+            self.name = definition['name']
+            self.version = int(definition.get('version', 1))
+            self.headers = [header_fingerprint(header) for header in definition['headers']]
+            fields = dict(definition['fields'])
+        except (KeyError, TypeError, ValueError):
+            raise TemplateError(f"Template {source or ''} needs a 'name', 'headers' and 'fields'")
+        if not self.headers or not all(self.headers):
+            raise TemplateError(f"Template {self.name} has an empty header")
+
+        self.source = source
+        self._fields = {}
+        for field, spec in fields.items():
+            anchors = spec.get('anchors') or []
+            field_type = spec.get('type', 'text')
+            occurrence = spec.get('occurrence', 'first')
+            if not anchors or field_type not in FIELD_TYPES or occurrence not in ('first', 'last'):
+                raise TemplateError(f"Template {self.name} field '{field}' needs anchors, "
+                                    f"a type in {FIELD_TYPES} and an occurrence of 'first' or 'last'")
+            anchor = _anchor_pattern(anchors)
+            if field_type == 'amount':
+                pattern = anchor + r'\s*[:\-]?\s*' + AMOUNT_VALUE
+            elif spec.get('until'):
+                # Nothing after the anchor on its line: the value runs over the next lines
+                pattern = anchor + r'[ \t]*[:\-]?[ \t]*(?:(\S[^\n]*)|\n\s*(\S.{0,%d}?)\s*%s)' % (
+                    MAX_TEXT_LENGTH * 2, _anchor_pattern(spec['until']))
+            else:
+                pattern = anchor + r'[ \t]*[:\-]?[ \t]*(\S[^\n]*)'
+            self._fields[field] = (re.compile(pattern, re.IGNORECASE | re.DOTALL), field_type,
+                                   occurrence == 'last')
+
+    @property
+    def fields(self):
+        return tuple(self._fields)
+
+    def extract(self, text, fields=None):
+        """{field: value} for the requested fields found at their anchors"""
+        found = {}
+        for field in fields or self._fields:
+            if field not in self._fields:
+                continue
+            pattern, field_type, last = self._fields[field]
+            values = pattern.findall(text)
+            if not values:
+                continue
+            value = values[-1] if last else values[0]
+            if isinstance(value, tuple):
+                value = value[0] or value[1]
+            if field_type == 'amount':
+                value = parse_amount(value)
+                if value:
+                    found[field] = value
+                continue
+            value = ' '.join(value.split()).strip(' *-:')
+            if MIN_TEXT_LENGTH <= len(value) <= MAX_TEXT_LENGTH:
+                found[field] = value
+        return found
+
+    def __repr__(self):
+        return f"<BillTemplate {self.name} v{self.version}>"
+
+
+class TemplateRegistry:
+    """The templates in ``template_dir``, keyed by header fingerprint"""
+
+    def __init__(self, template_dir=None):
+        self.template_dir = template_dir
+        self.version = 'none'
+        self.templates = []
+        self._by_header = {}
+        self._header_lengths = ()
+        if template_dir:
+            self.load(template_dir)
+
+    def load(self, template_dir):
+        """Compile every template file, replacing the loaded ones; invalid files are logged and left out"""
+        templates = []
+        digest = hashlib.sha256()
+        try:
+            names = sorted(name for name in os.listdir(template_dir) if TEMPLATE_FILE_PATTERN.match(name))
+        except OSError as e:
+            logger.warning("Error reading bill template directory %s: %s", template_dir, e)
+            names = []
+        for name in names:
+            path = os.path.join(template_dir, name)
+            try:
+                with open(path, 'rb') as f:
+                    content = f.read()
+                templates.append(BillTemplate(json.loads(content), source=path))
+            except (OSError, ValueError) as e:
+                # json.JSONDecodeError and TemplateError are both ValueErrors
+                logger.error("Error loading bill template %s: %s", path, e)
+                continue
+            digest.update(name.encode() + b'\0' + content)
+
+        self.templates = []
+        self._by_header = {}
+        self.add(templates)
+        # Part of the bill cache key, so editing a template invalidates fields extracted with it
+        self.version = digest.hexdigest()[:12] if templates else 'none'
+        logger.info("Loaded %s bill templates from %s", len(templates), template_dir)
+        return len(templates)
+
+    def add(self, templates):
+        """Register compiled templates; a later template takes over a shared header"""
+        for template in templates:
+            for header in template.headers:
+                other = self._by_header.get(header)
+                if other is not None and other is not template:
+                    logger.warning("Bill templates %s and %s share a header; using %s",
+                                   other.name, template.name, template.name)
+                self._by_header[header] = template
+            self.templates.append(template)
+        # Longest headers first, so "apollohospitalschennai" wins over "apollohospitals"
+        self._header_lengths = tuple(sorted({len(header) for header in self._by_header}, reverse=True))
+
+    def match(self, text):
+        """Template whose header starts one of the first HEADER_LINES non-empty lines, or None"""
+        if not self._by_header:
+            return None
+        # Fingerprint only as many lines as the longest header can span from the last start
+        parts = []
+        starts = []
+        position = 0
+        for line in text[:HEADER_WINDOW].split('\n', HEADER_WINDOW):
+            part = header_fingerprint(line)
+            if not part:
+                continue
+            if len(starts) < HEADER_LINES:
+                starts.append(position)
+            elif position >= starts[-1] + self._header_lengths[0]:
+                break
+            parts.append(part)
+            position += len(part)
+        head = ''.join(parts)
+
+        for start in starts:
+            for length in self._header_lengths:
+                template = self._by_header.get(head[start:start + length])
+                if template is not None:
+                    return template
+        return None
+
+    def __len__(self):
+        return len(self.templates)
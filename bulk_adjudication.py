@@ -0,0 +1,299 @@
+"""Columnar bulk re-adjudication of already-extracted claims.
+
+When a policy changes, historical claims are decided again from their stored
+fields instead of their PDFs. The input is a CSV or Parquet table with the claim
+form columns (``name``, ``address``, ``claim_reason``, ``total_claim_amount``,
+``product``, ...) plus the extracted ``disease`` and ``expense``. Rows are read in
+chunks into NumPy arrays, and the completeness, exclusion, tolerance, cap and amount
+checks run as array operations per product. Exclusions are looked up once per
+distinct diagnosis. The output has one row per claim with a decision code from
+``policy_engine.DECISION_CODES`` and the approved amount. Text reports are only
+built with ``--reports``.
+
+The rules match ``claim_decision.decide_claim``. The one difference is that an
+empty ``disease`` falls back to the claim reason.
+
+Usage:
+    python bulk_adjudication.py claims.parquet -o decisions.csv
+    python bulk_adjudication.py claims.csv -o decisions.parquet --product general-health --reports
+"""
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+from itertools import islice
+
+import numpy as np
+
+from claim_decision import FIELD_LABELS, clean_and_convert_amount, decide_claim, parse_claim_amount
+from policy_engine import CHECK_DECISION_CODES, DECISION_CODES, PolicyEngine
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 262144
+
+CODE = {name: index for index, name in enumerate(DECISION_CODES)}
+
+OUTPUT_COLUMNS = ('claim_id', 'product', 'policy_version', 'decision', 'approved_amount',
+                  'claim_amount', 'bill_amount', 'missing')
+
+
+def amount_array(values, parse):
+    """float64 array from a numeric column, or from strings.
+
+    Plain decimal strings ("3150", "3150.50") are converted in one vectorized
+    step; anything else goes through ``parse`` one value at a time.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'fiub':
+        return np.nan_to_num(values.astype(np.float64), nan=0.0)
+    if values.dtype.kind != 'U':
+        return np.fromiter((parse(value) for value in values), dtype=np.float64, count=len(values))
+
+    plain = np.char.isdecimal(np.char.replace(values, '.', '', count=1))
+    amounts = np.zeros(len(values), dtype=np.float64)
+    amounts[plain] = values[plain].astype(np.float64)
+    for row in np.nonzero(~plain)[0]:
+        amounts[row] = parse(str(values[row]))
+    return amounts
+
+
+def blank_array(values, count):
+    """True where a text column is missing, None or whitespace"""
+    if values is None:
+        return np.ones(count, dtype=bool)
+    values = np.asarray(values)
+    if values.dtype.kind == 'U':
+        return np.char.str_len(np.char.strip(values)) == 0
+    return np.fromiter((not str(value or '').strip() for value in values), dtype=bool, count=count)
+
+
+def adjudicate_columns(columns, policy, exclusion_memo=None):
+    """Decide every claim in ``columns`` (name -> sequence) under ``policy``.
+
+    Returns arrays: 'decision' (index into DECISION_CODES), 'approved_amount',
+    'claim_amount', 'bill_amount', and 'missing', an (n, len(missing_labels))
+    bool matrix whose column names are in 'missing_labels'.
+    """
+    count = len(next(iter(columns.values())))
+    claim = amount_array(columns.get('total_claim_amount', [''] * count), parse_claim_amount)
+    bill = amount_array(columns.get('expense', [0.0] * count), clean_and_convert_amount)
+
+    missing_labels = [FIELD_LABELS.get(field, field) for field in policy.required_fields]
+    missing_labels += ['valid claim amount', 'valid bill amount']
+    missing = np.column_stack([blank_array(columns.get(field), count) for field in policy.required_fields]
+                              + [claim <= 0, bill <= 0])
+    incomplete = missing.any(axis=1)
+
+    # Exclusions depend only on the diagnosis, so each distinct one is matched once
+    memo = exclusion_memo if exclusion_memo is not None else {}
+    diseases = columns.get('disease')
+    diseases = diseases if diseases is not None else [''] * count
+    reasons = columns.get('claim_reason')
+    reasons = reasons if reasons is not None else [''] * count
+    excluded = np.empty(count, dtype=bool)
+    for row, (disease, reason) in enumerate(zip(diseases, reasons)):
+        disease = disease if disease and str(disease).strip() else reason
+        flag = memo.get(disease)
+        if flag is None:
+            flag = memo[disease] = policy.exclusion_index.is_excluded(str(disease or ''))
+        excluded[row] = flag
+
+    tolerance = np.maximum(policy.tolerance_minimum, bill * policy.tolerance_percent / 100.0)
+    amounts_match = np.abs(claim - bill) <= tolerance
+    within_bill = claim <= bill + tolerance
+
+    # A full approval pays the claimed amount, which may be within tolerance above the bill;
+    # the cap applies to whichever amount would be paid
+    approved = np.where(amounts_match, claim, np.minimum(claim, bill))
+    if policy.coverage_cap is not None:
+        capped = approved > policy.coverage_cap
+        approved = np.where(capped, policy.coverage_cap, approved)
+    else:
+        capped = np.zeros(count, dtype=bool)
+
+    decision = np.where(capped, CODE['APPROVED_CAPPED'],
+                        np.where(amounts_match, CODE['APPROVED_FULL'], CODE['APPROVED_PARTIAL'])).astype(np.uint8)
+
+    failed = {'completeness': incomplete, 'exclusion': excluded, 'amount': ~within_bill}
+    # Applied last-to-first so the first failing check in the policy's order wins
+    for check in reversed(policy.decision_order):
+        decision[failed[check]] = CODE[CHECK_DECISION_CODES[check]]
+    approved = np.where(decision >= CODE['REJECTED_INCOMPLETE'], 0.0, approved)
+
+    return {'decision': decision, 'approved_amount': approved, 'claim_amount': claim, 'bill_amount': bill,
+            'missing': missing, 'missing_labels': missing_labels}
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield column dicts of at most ``chunk_rows`` rows from a CSV or Parquet file"""
+    if path.lower().endswith('.parquet'):
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Reading Parquet needs pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            chunk = {}
+            for index, name in enumerate(batch.schema.names):
+                column = batch.column(index)
+                # Null text cells read as '' like empty CSV cells, not as None
+                if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+                    column = pc.fill_null(column, '')
+                chunk[name] = column.to_numpy(zero_copy_only=False)
+            yield chunk
+        return
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        while True:
+            rows = list(islice(reader, chunk_rows))
+            if not rows:
+                return
+            width = len(header)
+            rows = [row + [''] * (width - len(row)) if len(row) < width else row for row in rows]
+            yield dict(zip(header, (np.array(column) for column in zip(*rows))))
+
+
+class ResultWriter:
+    """CSV or Parquet output, one chunk at a time"""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self._parquet = path.lower().endswith('.parquet')
+        if self._parquet:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise SystemExit("Writing Parquet needs pyarrow (pip install pyarrow)")
+            self._writer = None
+        else:
+            self._file = open(path, 'w', newline='') if path != '-' else sys.stdout
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(self.columns)
+
+    def write(self, chunk):
+        if self._parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.table({name: chunk[name] for name in self.columns})
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            self._csv.writerows(zip(*(chunk[name] for name in self.columns)))
+
+    def close(self):
+        if self._parquet:
+            if self._writer is not None:
+                self._writer.close()
+        elif self._file is not sys.stdout:
+            self._file.close()
+
+
+def normalize_products(products, default_product):
+    """Product ids as str, with empty and null cells mapped to ``default_product``"""
+    products = np.asarray(products, dtype=object)
+    # None and NaN (null cells read through pyarrow) are blank; NaN is the value not equal to itself
+    blank = np.equal(products, None) | (products != products) | (products == '')
+    return np.where(blank, default_product, products).astype(str).astype(object)
+
+
+def readjudicate(path, output, policy_engine, product=None, reports=False, chunk_rows=CHUNK_ROWS):
+    """Re-decide every claim in ``path`` and write the results to ``output``; returns row count"""
+    columns = list(OUTPUT_COLUMNS) + (['report'] if reports else [])
+    writer = ResultWriter(output, columns)
+    memos = {}
+    total = 0
+    try:
+        for chunk in iter_chunks(path, chunk_rows):
+            count = len(next(iter(chunk.values())))
+            ids = chunk.get('claim_id')
+            ids = list(ids) if ids is not None else [str(total + row + 1) for row in range(count)]
+            products = np.asarray(chunk['product'] if product is None and 'product' in chunk
+                                  else [product or ''] * count, dtype=object)
+            products = normalize_products(products, policy_engine.default_product)
+
+            out = {'claim_id': ids, 'product': products,
+                   'policy_version': np.zeros(count, dtype=np.int64),
+                   'decision': np.full(count, CODE['UNKNOWN_PRODUCT'], dtype=np.uint8),
+                   'approved_amount': np.zeros(count), 'claim_amount': np.zeros(count),
+                   'bill_amount': np.zeros(count), 'missing': [''] * count}
+            if reports:
+                out['report'] = [''] * count
+
+            for name in np.unique(products):
+                policy = policy_engine.get(name)
+                if policy is None:
+                    continue
+                rows = np.nonzero(products == name)[0]
+                subset = chunk if len(rows) == count else {
+                    key: [values[row] for row in rows] if isinstance(values, list) else values[rows]
+                    for key, values in chunk.items()}
+                memo = memos.setdefault((policy.product, policy.version), {})
+                result = adjudicate_columns(subset, policy, memo)
+
+                out['policy_version'][rows] = policy.version
+                for key in ('decision', 'approved_amount', 'claim_amount', 'bill_amount'):
+                    out[key][rows] = result[key]
+                # Names are only spelled out for incomplete claims
+                labels = result['missing_labels']
+                for offset in np.nonzero(result['decision'] == CODE['REJECTED_INCOMPLETE'])[0]:
+                    out['missing'][rows[offset]] = ', '.join(
+                        label for label, flag in zip(labels, result['missing'][offset]) if flag)
+                if reports:
+                    _add_reports(out['report'], rows, subset, policy)
+
+            out['decision'] = [DECISION_CODES[code] for code in out['decision']]
+            out['approved_amount'] = np.round(out['approved_amount'], 2)
+            writer.write(out)
+            total += count
+    finally:
+        writer.close()
+    return total
+
+
+def _add_reports(reports, rows, columns, policy):
+    """Full text reports through the single-claim path (slow; only on request)"""
+    import app
+
+    names = list(columns)
+    for offset, row in enumerate(rows):
+        record = {name: columns[name][offset] for name in names}
+        patient_info = app.get_patient_info(record)
+        bill_info = {'disease': record.get('disease') or patient_info['claim_reason'], 'expense': record.get('expense')}
+        reports[row] = decide_claim(patient_info, bill_info, patient_info['total_claim_amount'], policy).to_text()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-adjudicate extracted claims in bulk under the current policies")
+    parser.add_argument('claims', help="CSV or Parquet table of claim fields plus 'disease' and 'expense'")
+    parser.add_argument('-o', '--output', default='-', help="CSV or .parquet output (default: CSV on stdout)")
+    parser.add_argument('--product', help="Decide every claim under this product instead of its 'product' column")
+    parser.add_argument('--reports', action='store_true', help="Also render the text report for every claim (slow)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+    engine = PolicyEngine(
+        os.environ.get('POLICY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'policies')),
+        default_product=os.environ.get('DEFAULT_POLICY_PRODUCT', 'general-health'),
+        reload_interval=float('inf'))
+    start = time.perf_counter()
+    total = readjudicate(args.claims, args.output, engine, product=args.product, reports=args.reports,
+                         chunk_rows=args.chunk_rows)
+    elapsed = time.perf_counter() - start
+    logger.info("Re-adjudicated %s claims in %.2fs (%.0f claims/min)", total, elapsed,
+                total / elapsed * 60 if elapsed else 0)
+
+
+if __name__ == '__main__':
+    main()
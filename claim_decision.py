@@ -0,0 +1,227 @@
+"""Structured claim decisions.
+
+``decide_claim`` applies a policy to one claim and returns a ``ClaimDecision``:
+the decision code (one of ``policy_engine.DECISION_CODES``), the failed checks,
+the amounts and the missing fields. Nothing is formatted while deciding. The text
+report, its HTML form and the JSON dict are built only when a caller asks for
+them, and the text is built at most once per decision.
+"""
+import html
+import re
+import time
+
+from policy_engine import CHECK_DECISION_CODES
+
+# Display names for policy required_fields in rejection messages
+FIELD_LABELS = {'claim_reason': 'claim reason', 'medical_facility': 'medical facility',
+                'claim_type': 'claim type', 'date': 'date of service'}
+
+
+def parse_claim_amount(value):
+    """Claimed amount from the form (commas and '$' removed); 0.0 if unreadable"""
+    try:
+        return float(str(value).replace(',', '').replace('$', '').strip())
+    except (ValueError, AttributeError):
+        return 0.0
+
+
+def clean_and_convert_amount(amount):
+    """Enhanced amount conversion with better error handling"""
+    if amount is None:
+        return 0.0
+
+    if isinstance(amount, str):
+        # Remove currency symbols, commas, and extra spaces
+        clean_amount = re.sub(r'[^\d.]', '', amount.strip())
+        try:
+            if clean_amount:
+                return float(clean_amount)
+            else:
+                return 0.0
+        except ValueError:
+            return 0.0
+    elif isinstance(amount, (int, float)):
+        return float(amount)
+    else:
+        return 0.0
+
+
+def format_duplicates(duplicates):
+    """Report lines for duplicate index hits"""
+    if not duplicates:
+        return "    - None found"
+    lines = []
+    for hit in duplicates:
+        match = "identical bill file" if hit['exact'] else f"{hit['similarity']:.0%} similar bill text"
+        submitted = time.strftime('%Y-%m-%d %H:%M', time.localtime(hit['created'])) if hit.get('created') else 'unknown'
+        lines.append(f"    - {match}: earlier claim #{hit['id']} (submitted {submitted})")
+    return "\n".join(lines)
+
+
+class ClaimDecision:
+    """Outcome of one claim under one policy, rendered on demand"""
+
+    __slots__ = ('code', 'reasons', 'claim_amount', 'bill_amount', 'approved_amount', 'missing_fields',
+                 'disease', 'info_complete', 'excluded', 'claim_within_bill', 'amounts_match',
+                 'policy_product', 'policy_name', 'policy_version', 'patient_info', 'duplicates', '_text')
+
+    def __init__(self, code, reasons, claim_amount, bill_amount, approved_amount, missing_fields, disease,
+                 info_complete, excluded, claim_within_bill, amounts_match, policy, patient_info, duplicates=None):
+        self.code = code
+        self.reasons = reasons
+        self.claim_amount = claim_amount
+        self.bill_amount = bill_amount
+        self.approved_amount = approved_amount
+        self.missing_fields = missing_fields
+        self.disease = disease
+        self.info_complete = info_complete
+        self.excluded = excluded
+        self.claim_within_bill = claim_within_bill
+        self.amounts_match = amounts_match
+        self.policy_product = policy.product
+        self.policy_name = policy.name
+        self.policy_version = policy.version
+        self.patient_info = patient_info
+        self.duplicates = duplicates or []
+        self._text = None
+
+    @property
+    def approved(self):
+        return self.code.startswith('APPROVED')
+
+    @property
+    def summary(self):
+        """One-line decision, as on the report's CLAIM DECISION line"""
+        code = self.code
+        if code == 'REJECTED_INCOMPLETE':
+            return f"REJECTED: Incomplete information (missing: {', '.join(self.missing_fields)})"
+        if code == 'REJECTED_EXCLUDED':
+            return f"REJECTED: Treatment for '{self.disease}' is excluded under policy terms"
+        if code == 'REJECTED_AMOUNT':
+            return (f"REJECTED: Claim amount (${self.claim_amount:.2f}) exceeds bill amount "
+                    f"(${self.bill_amount:.2f}) by ${self.claim_amount - self.bill_amount:.2f}")
+        if code == 'APPROVED_CAPPED':
+            return (f"APPROVED: ${self.approved_amount:.2f} (coverage cap applied; "
+                    f"claim: ${self.claim_amount:.2f}, bill: ${self.bill_amount:.2f})")
+        if code == 'APPROVED_FULL':
+            return f"APPROVED: Full claim amount of ${self.claim_amount:.2f}"
+        return f"APPROVED: ${self.approved_amount:.2f} (claim: ${self.claim_amount:.2f}, bill: ${self.bill_amount:.2f})"
+
+    def to_dict(self):
+        """JSON-safe fields for API clients; no report text"""
+        return {
+            'decision': self.code,
+            'summary': self.summary,
+            'reasons': list(self.reasons),
+            'approved_amount': round(self.approved_amount, 2),
+            'claim_amount': round(self.claim_amount, 2),
+            'bill_amount': round(self.bill_amount, 2),
+            'missing_fields': list(self.missing_fields),
+            'disease': self.disease,
+            'checks': {'information_complete': self.info_complete, 'covered_condition': not self.excluded,
+                       'amount_valid': self.claim_within_bill, 'amounts_match': self.amounts_match},
+            'policy': {'product': self.policy_product, 'name': self.policy_name, 'version': self.policy_version},
+            'duplicates': self.duplicates,
+        }
+
+    def to_text(self):
+        """The full plain-text claim report"""
+        if self._text is None:
+            self._text = self._render_text()
+        return self._text
+
+    def to_html(self):
+        """The text report escaped for an HTML page, one <br> per line"""
+        return html.escape(self.to_text()).replace('\n', '<br>')
+
+    def _render_text(self):
+        patient_info = self.patient_info
+        decision = self.summary
+        return f"""
+    CLAIM DECISION: {decision}
+
+    Executive Summary
+    This report details the analysis of the insurance claim submitted by {patient_info['name']}.
+    The claim has been evaluated based on completeness of information, policy exclusions, and amount validation.
+
+    Claim Details
+    - Policy: {self.policy_name} (v{self.policy_version})
+    - Patient: {patient_info['name']}
+    - Claim Reason: {patient_info['claim_reason']}
+    - Medical Facility: {patient_info['medical_facility']}
+    - Date of Service: {patient_info['date']}
+    - Claim Amount: ${self.claim_amount:.2f}
+    - Bill Amount: ${self.bill_amount:.2f}
+    - Detected Condition: {self.disease}
+    - Amount Difference: ${abs(self.claim_amount - self.bill_amount):.2f}
+
+    Verification Results
+    - Information Complete: {'Yes' if self.info_complete else 'No'}
+    - Covered Condition: {'No' if self.excluded else 'Yes'}
+    - Amount Valid: {'Yes' if self.claim_within_bill else 'No'}
+    - Amounts Match: {'Yes' if self.amounts_match else 'No'}
+
+    Possible Duplicates
+{format_duplicates(self.duplicates)}
+
+    Final Decision
+    {decision}
+
+    Additional Notes
+    - Claim processing used enhanced validation with tolerance for minor amount differences
+    - Bill text extraction: {'Successful' if self.bill_amount > 0 else 'Failed - manual review recommended'}
+    - Duplicate check: {'Possible duplicate submission - manual review recommended' if self.duplicates else 'No similar prior bills'}
+    """
+
+    def __repr__(self):
+        return f"<ClaimDecision {self.code} approved={self.approved_amount:.2f}>"
+
+
+def decide_claim(patient_info, bill_info, claim_amount_str, policy, duplicates=None):
+    """Apply ``policy`` to one claim; returns a ClaimDecision"""
+    claim_amount = parse_claim_amount(claim_amount_str)
+    bill_expense = clean_and_convert_amount(bill_info.get('expense'))
+
+    # Get disease from bill or fallback to claim reason
+    disease = bill_info.get('disease', patient_info.get('claim_reason', ''))
+
+    missing_fields = [FIELD_LABELS.get(field, field) for field in policy.required_fields
+                      if not str(patient_info.get(field) or '').strip()]
+    if claim_amount <= 0:
+        missing_fields.append('valid claim amount')
+    if bill_expense <= 0:
+        missing_fields.append('valid bill amount')
+    info_complete = not missing_fields
+
+    excluded = policy.exclusion_index.is_excluded(disease)
+
+    # Tolerance for minor differences between the claim and the bill
+    amount_tolerance = policy.amount_tolerance(bill_expense)
+    amounts_match = abs(claim_amount - bill_expense) <= amount_tolerance
+    claim_within_bill = claim_amount <= (bill_expense + amount_tolerance)
+
+    # Pay the claim when it matches the bill (even within tolerance above it), otherwise up
+    # to the bill amount, and never above the coverage cap
+    approved_amount = claim_amount if amounts_match else min(claim_amount, bill_expense)
+    capped = policy.coverage_cap is not None and approved_amount > policy.coverage_cap
+    if capped:
+        approved_amount = policy.coverage_cap
+
+    # The first failing check in the policy's order rejects the claim
+    failed_checks = {'completeness': not info_complete, 'exclusion': excluded, 'amount': not claim_within_bill}
+    reasons = tuple(check for check in policy.decision_order if failed_checks[check])
+
+    if reasons:
+        code = CHECK_DECISION_CODES[reasons[0]]
+        approved_amount = 0.0
+    elif capped:
+        code = 'APPROVED_CAPPED'
+    elif amounts_match:
+        code = 'APPROVED_FULL'
+    else:
+        code = 'APPROVED_PARTIAL'
+
+    return ClaimDecision(code, reasons, claim_amount, bill_amount=bill_expense, approved_amount=approved_amount,
+                         missing_fields=missing_fields, disease=disease, info_complete=info_complete,
+                         excluded=excluded, claim_within_bill=claim_within_bill, amounts_match=amounts_match,
+                         policy=policy, patient_info=patient_info, duplicates=duplicates)
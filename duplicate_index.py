@@ -0,0 +1,408 @@
+"""Near-duplicate bill detection with MinHash-LSH over extracted bill text.
+
+Each bill's text is reduced to word 3-gram shingles and a MinHash signature of
+``num_perm`` values; the signature is split into ``bands`` bands whose hashes are
+the LSH keys. Two bills sharing any band key are candidates, and candidates are
+ranked by the fraction of equal signature values (an estimate of the Jaccard
+similarity of their shingle sets). Byte-identical bills are found through the
+bill hash regardless of their text.
+
+Everything lives under one directory so all workers share it:
+
+    meta.json          counts and MinHash parameters
+    signatures.u32     memory-mapped (capacity, num_perm) signatures
+    band_keys.u64      memory-mapped (capacity, bands) LSH keys by bill id
+    sorted_keys.N.u64  per-band keys of the first N (``sorted_count``) bills, sorted
+    sorted_ids.N.u32   bill ids in the same order
+    entries.sqlite3    bill hash and claim details per bill id
+
+The claim details are personal data: the directory is created owner-only, and
+claimants are shown only hit ids, similarities and submission times. Reviewers
+look the details up with ``python duplicate_index.py show --dir DIR ID...``.
+
+Lookups binary-search the sorted arrays, so they stay sub-linear at millions of
+bills. Bills added since the last merge are scanned directly; once there are
+``merge_every`` of them a background thread sorts just those and merges them
+into the sorted arrays. Writers take an exclusive ``flock`` on the directory's
+lock file; merging holds it only to switch meta.json to the new arrays.
+"""
+import argparse
+import fcntl
+import json
+import logging
+import os
+import re
+import stat
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Universal hashing modulo a Mersenne prime; a * x stays below 2**63 for 32-bit shingle hashes
+_PRIME = (1 << 31) - 1
+_MAX_HASH = np.uint32(_PRIME)
+
+
+def shingle_hashes(text, size=3):
+    """crc32 of every word ``size``-gram in ``text``"""
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) < size:
+        grams = [' '.join(tokens)] if tokens else []
+    else:
+        grams = {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+    return np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64)
+
+
+class DuplicateIndex:
+    """Persistent MinHash-LSH index answering "top-k similar prior bills" queries"""
+
+    def __init__(self, directory, num_perm=128, bands=16, seed=1, merge_every=16384):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.directory = directory
+        self.merge_every = merge_every
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if stat.S_IMODE(os.stat(directory).st_mode) & 0o077:
+            logger.warning("Duplicate index directory %s is accessible to other users; it holds claim details",
+                           directory)
+        self._meta_path = os.path.join(directory, 'meta.json')
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._meta_stamp = None
+        self._merge_thread = None
+
+        with self._file_lock():
+            if os.path.exists(self._meta_path):
+                with open(self._meta_path) as f:
+                    meta = json.load(f)
+            else:
+                meta = {'num_perm': num_perm, 'bands': bands, 'seed': seed,
+                        'count': 0, 'sorted_count': 0, 'capacity': 0}
+                self._write_meta(meta)
+            self._entries().execute("""CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                bill_key TEXT,
+                details TEXT,
+                created REAL NOT NULL)""")
+            self._entries().execute("CREATE INDEX IF NOT EXISTS entries_bill_key ON entries (bill_key)")
+
+        # Parameters of an existing index win, so signatures stay comparable
+        self.num_perm = meta['num_perm']
+        self.bands = meta['bands']
+        self.rows = self.num_perm // self.bands
+        rng = np.random.RandomState(meta['seed'])
+        self._a = rng.randint(1, _PRIME, size=self.num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _PRIME, size=self.num_perm).astype(np.uint64)
+        self._band_mix = rng.randint(1, 1 << 62, size=self.rows, dtype=np.int64).astype(np.uint64)
+        self._refresh()
+
+    def __len__(self):
+        self._refresh()
+        return self._meta['count']
+
+    # -- storage
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive across threads and processes"""
+        with self._lock, open(self._path('lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _entries(self):
+        """One SQLite connection per thread (and per process, after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._path('entries.sqlite3'), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write_meta(self, meta):
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _open(self, name, dtype, shape):
+        if not shape[0] or not shape[-1]:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode='r', shape=shape)
+
+    def _refresh(self, attempts=3):
+        """Re-map the arrays when another process (or thread) has changed the index"""
+        for attempt in range(attempts):
+            meta_stat = os.stat(self._meta_path)
+            stamp = (meta_stat.st_mtime_ns, meta_stat.st_size, meta_stat.st_ino)
+            if stamp == self._meta_stamp:
+                return
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            capacity, sorted_count = meta['capacity'], meta['sorted_count']
+            try:
+                sorted_keys = self._open(f'sorted_keys.{sorted_count}.u64', np.uint64, (meta['bands'], sorted_count))
+                sorted_ids = self._open(f'sorted_ids.{sorted_count}.u32', np.uint32, (meta['bands'], sorted_count))
+            except FileNotFoundError:
+                # A merge replaced these arrays after meta.json was read; the new meta.json names them
+                if attempt == attempts - 1:
+                    raise
+                continue
+            self._signatures = self._open('signatures.u32', np.uint32, (capacity, meta['num_perm']))
+            self._band_keys = self._open('band_keys.u64', np.uint64, (capacity, meta['bands']))
+            self._sorted_keys = sorted_keys
+            self._sorted_ids = sorted_ids
+            self._meta = meta
+            self._meta_stamp = stamp
+            return
+
+    def _grow(self, meta, needed):
+        capacity = max(1024, meta['capacity'])
+        while capacity < needed:
+            capacity *= 2
+        if capacity == meta['capacity']:
+            return
+        for name, width, itemsize in (('signatures.u32', meta['num_perm'], 4), ('band_keys.u64', meta['bands'], 8)):
+            with open(self._path(name), 'ab') as f:
+                f.truncate(capacity * width * itemsize)
+        meta['capacity'] = capacity
+
+    def merge(self, wait=False):
+        """Merge the bills added since the last merge into the sorted arrays.
+
+        Runs outside the writers' lock: stored rows never change, so only the new
+        rows are sorted and then inserted into the existing sorted arrays. Returns
+        False if another thread or process is already merging this directory,
+        unless ``wait`` is set (e.g. after a backfill), in which case that merge is
+        waited for and the rest merged after it.
+        """
+        with open(self._path('merge.lock'), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                self._merge_unlocked()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return True
+
+    def _merge_unlocked(self):
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        bands, previous, count = meta['bands'], meta['sorted_count'], meta['count']
+        if count == previous:
+            return
+        band_keys = np.memmap(self._path('band_keys.u64'), dtype=np.uint64, mode='r',
+                              shape=(meta['capacity'], bands))[previous:count]
+        order = np.argsort(band_keys, axis=0, kind='stable').T
+        new_keys = np.take_along_axis(band_keys.T, order, axis=1)
+        new_ids = (order + previous).astype(np.uint32)
+        if previous:
+            old_keys = self._open(f'sorted_keys.{previous}.u64', np.uint64, (bands, previous))
+            old_ids = self._open(f'sorted_ids.{previous}.u32', np.uint32, (bands, previous))
+            sorted_keys = np.empty((bands, count), dtype=np.uint64)
+            sorted_ids = np.empty((bands, count), dtype=np.uint32)
+            for band in range(bands):
+                # After equal keys, so older bills stay first as in a full stable sort
+                positions = np.searchsorted(old_keys[band], new_keys[band], side='right')
+                sorted_keys[band] = np.insert(old_keys[band], positions, new_keys[band])
+                sorted_ids[band] = np.insert(old_ids[band], positions, new_ids[band])
+        else:
+            sorted_keys, sorted_ids = new_keys, new_ids
+
+        # Files are named by their length, so readers holding the previous meta.json keep
+        # mapping the previous arrays; those are unlinked once meta.json points at the new ones
+        for name, array in ((f'sorted_keys.{count}.u64', sorted_keys), (f'sorted_ids.{count}.u32', sorted_ids)):
+            tmp_path = self._path(f'{name}.{os.getpid()}.tmp')
+            np.ascontiguousarray(array).tofile(tmp_path)
+            os.replace(tmp_path, self._path(name))
+        with self._file_lock():
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            meta['sorted_count'] = count
+            self._write_meta(meta)
+        if previous:
+            os.remove(self._path(f'sorted_keys.{previous}.u64'))
+            os.remove(self._path(f'sorted_ids.{previous}.u32'))
+
+    def _merge_in_background(self):
+        with self._lock:
+            if self._merge_thread is not None and self._merge_thread.is_alive():
+                return
+            self._merge_thread = threading.Thread(target=self._merge_quietly, name='duplicate-index-merge',
+                                                  daemon=True)
+            self._merge_thread.start()
+
+    def _merge_quietly(self):
+        try:
+            self.merge()
+        except Exception as e:
+            # The unmerged bills are still scanned; the next add retries
+            logger.warning("Duplicate index merge failed: %s", e)
+
+    # -- hashing
+
+    def signature(self, text):
+        """MinHash signature of ``text`` (uint32, length num_perm)"""
+        hashes = shingle_hashes(text)
+        if not len(hashes):
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        values = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % np.uint64(_PRIME)
+        return values.min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature):
+        """One uint64 LSH key per band"""
+        rows = signature.reshape(self.bands, self.rows).astype(np.uint64)
+        # Wrapping uint64 arithmetic is intended; this is only a hash
+        with np.errstate(over='ignore'):
+            return (rows * self._band_mix).sum(axis=1, dtype=np.uint64)
+
+    # -- queries and updates
+
+    def _candidates(self, keys):
+        self._refresh()
+        meta = self._meta
+        found = []
+        if meta['sorted_count']:
+            for band in range(self.bands):
+                row = self._sorted_keys[band]
+                start = np.searchsorted(row, keys[band], side='left')
+                end = np.searchsorted(row, keys[band], side='right')
+                if end > start:
+                    found.append(np.asarray(self._sorted_ids[band, start:end], dtype=np.int64))
+        if meta['count'] > meta['sorted_count']:
+            recent = self._band_keys[meta['sorted_count']:meta['count']]
+            found.append(np.nonzero((recent == keys).any(axis=1))[0] + meta['sorted_count'])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def details(self, ids):
+        """Stored claim details (plus 'created') by bill id, for reviewers"""
+        return self._details(list(ids))
+
+    def _details(self, ids):
+        if not ids:
+            return {}
+        rows = self._entries().execute(
+            f"SELECT id, details, created FROM entries WHERE id IN ({','.join('?' * len(ids))})", ids).fetchall()
+        return {row_id: dict(json.loads(details or '{}'), created=created) for row_id, details, created in rows}
+
+    def query(self, text=None, bill_key=None, k=5, min_similarity=0.8):
+        """Up to ``k`` prior bills at least ``min_similarity`` alike, most similar first.
+
+        Each hit is a dict of the stored claim details plus 'id', 'similarity' and
+        'exact' (same bill hash).
+        """
+        signature = self.signature(text) if text and text.strip() else None
+        return self._query(signature, bill_key, k, min_similarity)
+
+    def _query(self, signature, bill_key, k, min_similarity):
+        scores = {}
+        if bill_key:
+            for (row_id,) in self._entries().execute(
+                    "SELECT id FROM entries WHERE bill_key = ? ORDER BY id DESC LIMIT ?", (bill_key, k)):
+                scores[row_id] = (1.0, True)
+
+        if signature is not None:
+            candidates = self._candidates(self.band_keys(signature))
+            if len(candidates):
+                similarity = (self._signatures[candidates] == signature).mean(axis=1)
+                keep = similarity >= min_similarity
+                for row_id, value in zip(candidates[keep].tolist(), similarity[keep].tolist()):
+                    scores.setdefault(row_id, (round(value, 4), False))
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1][0], -item[0]))[:k]
+        details = self._details([row_id for row_id, _ in ranked])
+        return [dict(details.get(row_id, {}), id=row_id, similarity=similarity, exact=exact)
+                for row_id, (similarity, exact) in ranked]
+
+    def add(self, text, bill_key=None, **details):
+        """Store a bill and return its id"""
+        return self.add_many([text], [bill_key], [details])[0]
+
+    def add_many(self, texts, bill_keys=None, details=None):
+        """Store several bills under one lock (e.g. a backfill); returns their ids"""
+        signatures_new = np.stack([self.signature(text or '') for text in texts])
+        with self._file_lock():
+            ids, merge_due = self._append(signatures_new, bill_keys or [None] * len(texts),
+                                          details or [{}] * len(texts))
+        if merge_due:
+            self._merge_in_background()
+        return ids
+
+    def _append(self, signatures_new, bill_keys, details):
+        """Write bills under the file lock; returns their ids and whether a merge is due"""
+        keys_new = np.stack([self.band_keys(signature) for signature in signatures_new])
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        first, count = meta['count'], meta['count'] + len(signatures_new)
+        self._grow(meta, count)
+        for name, dtype, width, rows in (('signatures.u32', np.uint32, meta['num_perm'], signatures_new),
+                                         ('band_keys.u64', np.uint64, meta['bands'], keys_new)):
+            array = np.memmap(self._path(name), dtype=dtype, mode='r+', shape=(meta['capacity'], width))
+            array[first:count] = rows
+            array.flush()
+            del array
+
+        now = time.time()
+        conn = self._entries()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("INSERT INTO entries (id, bill_key, details, created) VALUES (?, ?, ?, ?)",
+                             [(first + offset, bill_key, json.dumps(detail), now)
+                              for offset, (bill_key, detail) in enumerate(zip(bill_keys, details))])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        meta['count'] = count
+        self._write_meta(meta)
+        return list(range(first, count)), count - meta['sorted_count'] >= self.merge_every
+
+    def check_and_add(self, text, bill_key=None, k=5, min_similarity=0.8, **details):
+        """Similar prior bills for this claim, then record the claim itself.
+
+        Both happen under the writers' lock, so of two identical submissions
+        arriving together the second always finds the first.
+        """
+        signature = self.signature(text or '')
+        query_signature = signature if text and text.strip() else None
+        with self._file_lock():
+            hits = self._query(query_signature, bill_key, k, min_similarity)
+            _, merge_due = self._append(signature[None, :], [bill_key], [details])
+        if merge_due:
+            self._merge_in_background()
+        return hits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect a duplicate bill index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show_parser = subparsers.add_parser('show', help="Print the stored claim details of bill ids from duplicate hits")
+    show_parser.add_argument('--dir', default=os.environ.get('DUPLICATE_INDEX_DIR'))
+    show_parser.add_argument('ids', type=int, nargs='+')
+    args = parser.parse_args(argv)
+    if not args.dir:
+        parser.error("give --dir or set DUPLICATE_INDEX_DIR")
+
+    if args.command == 'show':
+        details = DuplicateIndex(args.dir).details(args.ids)
+        for row_id in args.ids:
+            print(json.dumps(dict(details.get(row_id, {}), id=row_id)))
+
+
+if __name__ == '__main__':
+    main()
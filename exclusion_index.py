@@ -0,0 +1,140 @@
+"""Indexed policy exclusion matching.
+
+An ``ExclusionIndex`` is built once per policy from its exclusion rules. A rule is
+either a plain term or a dict::
+
+    {'term': "HIV/AIDS",
+     'synonyms': ["human immunodeficiency virus"],
+     'icd10': ["B20", "B24", "Z21"],
+     'allow': []}
+
+Terms and synonyms are normalized to lowercase alphanumeric tokens. A diagnosis
+is excluded when a rule's token sequence occurs in it, or when the whole
+diagnosis is a contiguous part of a rule's term (e.g. "HIV" against "HIV/AIDS";
+synonyms only match forward, so "Infection" is not part of "sexually transmitted
+infection"). It is
+also excluded when one of its ICD-10 codes starts with a rule's code. ``allow``
+phrases exempt a diagnosis from that rule only (e.g. "pregnancy test" for
+"pregnancy").
+
+Lookups walk a token trie and probe hash maps, so their cost depends on the
+length of the diagnosis, not on the number of rules.
+"""
+import re
+
+PLACEHOLDER_DISEASES = {'see claim reason', 'extraction failed', 'not found', ''}
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+ICD10_PATTERN = re.compile(r'\b([A-TV-Z][0-9][0-9A-Z](?:\.?[0-9A-Z]{1,4})?)\b')
+
+# Trie node key holding the ids of rules that end at that node
+_END = None
+
+
+def normalize_tokens(text):
+    """Lowercase alphanumeric tokens of ``text``"""
+    return tuple(TOKEN_PATTERN.findall(text.lower()))
+
+
+def normalize_icd10(code):
+    """'O09.1' -> 'O091'"""
+    return code.replace('.', '').strip().upper()
+
+
+class ExclusionIndex:
+    """Token trie over exclusion terms and synonyms, plus ICD-10 prefix and allow-pattern maps"""
+
+    def __init__(self, rules):
+        self.terms = []
+        self._trie = {}
+        self._fragments = {}
+        self._allow_trie = {}
+        self._icd10 = {}
+        self._max_icd10_length = 0
+
+        for rule in rules:
+            if isinstance(rule, str):
+                rule = {'term': rule}
+            rule_id = len(self.terms)
+            self.terms.append(rule['term'])
+
+            for phrase in [rule['term']] + list(rule.get('synonyms', [])):
+                tokens = normalize_tokens(phrase)
+                if tokens:
+                    self._insert(self._trie, tokens, rule_id)
+
+            # Every contiguous fragment of the term, so a diagnosis that is part of it also
+            # matches; synonyms are longer descriptions whose single words are too generic
+            tokens = normalize_tokens(rule['term'])
+            for start in range(len(tokens)):
+                for end in range(start + 1, len(tokens) + 1):
+                    self._fragments.setdefault(tokens[start:end], []).append(rule_id)
+
+            for phrase in rule.get('allow', []):
+                tokens = normalize_tokens(phrase)
+                if tokens:
+                    self._insert(self._allow_trie, tokens, rule_id)
+
+            for code in rule.get('icd10', []):
+                code = normalize_icd10(code)
+                self._icd10.setdefault(code, []).append(rule_id)
+                self._max_icd10_length = max(self._max_icd10_length, len(code))
+
+    def __len__(self):
+        return len(self.terms)
+
+    @staticmethod
+    def _insert(trie, tokens, rule_id):
+        node = trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(_END, []).append(rule_id)
+
+    @staticmethod
+    def _scan(trie, tokens):
+        """Rule ids of every trie phrase occurring as a token sequence in ``tokens``"""
+        found = []
+        for start in range(len(tokens)):
+            node = trie
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                if _END in node:
+                    found.extend(node[_END])
+        return found
+
+    def _icd10_matches(self, text):
+        found = []
+        for code in ICD10_PATTERN.findall(text.upper()):
+            code = normalize_icd10(code)
+            for length in range(1, min(len(code), self._max_icd10_length) + 1):
+                found.extend(self._icd10.get(code[:length], ()))
+        return found
+
+    def find(self, disease):
+        """The first exclusion term matching ``disease``, or None"""
+        if not disease:
+            return None
+        disease_lower = disease.lower().strip()
+
+        # Don't exclude if disease is just a placeholder
+        if disease_lower in PLACEHOLDER_DISEASES:
+            return None
+
+        tokens = normalize_tokens(disease_lower)
+        candidates = self._scan(self._trie, tokens)
+        candidates += self._fragments.get(tokens, ())
+        if self._icd10:
+            candidates += self._icd10_matches(disease)
+        if not candidates:
+            return None
+
+        allowed = set(self._scan(self._allow_trie, tokens)) if self._allow_trie else ()
+        for rule_id in candidates:
+            if rule_id not in allowed:
+                return self.terms[rule_id]
+        return None
+
+    def is_excluded(self, disease):
+        return self.find(disease) is not None
@@ -0,0 +1,99 @@
+"""Confidence-scored extraction cascade for bill fields.
+
+Each tier (regex, the Hugging Face endpoint, the local QA model) extracts only
+the fields it is asked for. It returns ``{field: (value, confidence)}``, with
+confidence in [0, 1]. A field is settled once a tier reports it at
+``min_confidence`` or above. Later tiers are only asked for the fields that are
+still missing or uncertain, so a bill whose diagnosis was found by regex costs
+the remote endpoint one question instead of two.
+
+Tiers also carry a ``cost`` and a ``min_seconds``. A tier is skipped when its
+cost would take the claim past ``cost_budget``, or when less than
+``min_seconds`` remain before the request's deadline. It is also skipped when it
+reports itself unavailable (circuit open, model not installed). If no tier
+settles a field, the value with the highest confidence seen is used.
+
+Calls and skips are counted per tier, and the source of each final field per
+field and tier.
+"""
+import logging
+import time
+
+from metrics import FIELD_TIER, TIER_CALLS, TIER_SKIPS
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('disease', 'expense')
+
+
+class Tier:
+    """One extractor: ``extract(text, fields, deadline)`` -> {field: (value, confidence)}"""
+
+    def __init__(self, name, extract, cost=0.0, min_seconds=0.0, available=None):
+        self.name = name
+        self.extract = extract
+        self.cost = cost
+        self.min_seconds = min_seconds
+        self.available = available
+
+    def __repr__(self):
+        return f"<Tier {self.name} cost={self.cost} min_seconds={self.min_seconds}>"
+
+
+class ExtractionCascade:
+    """Runs tiers in order, forwarding only unsettled fields, within a cost budget and deadline"""
+
+    def __init__(self, tiers, fields=FIELDS, min_confidence=0.7, cost_budget=float('inf'), deadline_seconds=None):
+        self.tiers = list(tiers)
+        self.fields = tuple(fields)
+        self.min_confidence = min_confidence
+        self.cost_budget = cost_budget
+        self.deadline_seconds = deadline_seconds
+
+    def _skip_reason(self, tier, spent, deadline):
+        if spent + tier.cost > self.cost_budget:
+            return 'budget'
+        if deadline is not None and deadline - time.monotonic() < tier.min_seconds:
+            return 'deadline'
+        if tier.available is not None and not tier.available():
+            return 'unavailable'
+        return None
+
+    def run(self, text, deadline=None):
+        """Best {field: (value, confidence, tier name)} for every field any tier found.
+
+        ``deadline`` is a ``time.monotonic()`` value; without one, ``deadline_seconds``
+        from now applies (if set).
+        """
+        if deadline is None and self.deadline_seconds is not None:
+            deadline = time.monotonic() + self.deadline_seconds
+
+        best = {}
+        spent = 0.0
+        for tier in self.tiers:
+            pending = [field for field in self.fields
+                       if field not in best or best[field][1] < self.min_confidence]
+            if not pending:
+                break
+            reason = self._skip_reason(tier, spent, deadline)
+            if reason:
+                TIER_SKIPS.inc(tier=tier.name, reason=reason)
+                logger.debug("Skipping extraction tier %s (%s) for %s", tier.name, reason, pending)
+                continue
+
+            spent += tier.cost
+            TIER_CALLS.inc(tier=tier.name)
+            try:
+                found = tier.extract(text, pending, deadline) or {}
+            except Exception as e:
+                logger.warning("Extraction tier %s failed: %s", tier.name, e)
+                continue
+            for field in pending:
+                value, confidence = found.get(field, (None, 0.0))
+                if value and (field not in best or confidence > best[field][1]):
+                    best[field] = (value, confidence, tier.name)
+            logger.debug("Extraction tier %s found %s", tier.name, found)
+
+        for field, (_, _, tier_name) in best.items():
+            FIELD_TIER.inc(field=field, tier=tier_name)
+        return best
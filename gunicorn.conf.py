@@ -0,0 +1,72 @@
+"""Gunicorn settings for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is preloaded in the master and workers are forked from it, so the
+policies, templates and (with ``LOCAL_QA_PRELOAD=1``) the local QA model are
+shared copy-on-write. The master's objects are moved out of the garbage
+collector's reach before forking, so collections in a worker do not touch, and
+copy, the shared pages. Workers are threaded, since a claim mostly waits on PDF
+parsing, the inference endpoint or the model batcher. Each worker is replaced
+gracefully after ``max_requests`` requests (jittered, so workers do not restart
+together) to bound slow memory growth.
+
+Every setting can be overridden from the environment; see the README.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 8081)}")
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Every web worker starts its own OCR pool (each process loading easyocr), so by default
+# they split the cores between them instead of each taking up to 4
+os.environ.setdefault('OCR_WORKERS', str(max(1, (multiprocessing.cpu_count() or 1) // workers)))
+
+# A claim may spend EXTRACTION_DEADLINE (20s) on fallbacks plus PDF parsing and OCR
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Connections close after each response, so a recycled worker never drops an idle
+# keep-alive connection that a client is about to send a claim on
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 0))
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Heartbeat files on tmpfs, so a slow disk cannot make workers look hung
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def when_ready(server):
+    # Everything the preloaded app built is long-lived; freeze it once collected
+    gc.collect()
+    gc.freeze()
+    server.log.info("Frozen %s objects before forking workers", gc.get_freeze_count())
+
+
+def pre_fork(server, worker):
+    # Also covers objects the master created since, e.g. before replacing a recycled worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Preloaded workers inherit a loaded model; without preload, or if the master's load
+    # did not finish, the warm-up starts again here rather than on the first fallback
+    import local_model
+    if local_model.LOCAL_QA_WARMUP or local_model.LOCAL_QA_PRELOAD:
+        local_model.warm_up_local_qa()
+
+
+def post_worker_init(worker):
+    # Job worker threads belong to each web worker; threads started in the master
+    # would not survive the fork
+    import app
+    app.job_queue.start()
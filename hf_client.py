@@ -0,0 +1,190 @@
+"""Client for the Hugging Face inference endpoint used as the second extraction tier.
+
+One keep-alive ``requests.Session`` per process is shared by all calls, the
+number of in-flight requests is bounded, transient failures (timeouts,
+connection errors, 429 and 5xx) are retried with exponential backoff, and a
+circuit breaker fails fast while the endpoint is down so callers can go straight
+to the local fallback. ``agenerate``/``agenerate_many`` expose the same client to
+asyncio code such as batch pipelines.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HF_API_URL = os.environ.get('HF_API_URL', "https://api-inference.huggingface.co/models/google/flan-t5-xxl")
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class EndpointUnavailableError(Exception):
+    """Raised without calling the endpoint: the circuit is open or the concurrency limit is reached"""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; lets one probe through after ``reset_timeout``"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._probe_owner = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def allow(self):
+        """Whether a request may be sent now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            # Half-open: a single probe decides whether to close again
+            self._probing = True
+            self._probe_owner = threading.get_ident()
+            return True
+
+    def release_probe(self):
+        """Give up this thread's half-open probe without an outcome, so another request can probe"""
+        with self._lock:
+            if self._probing and self._probe_owner == threading.get_ident():
+                self._probing = False
+                self._probe_owner = None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+            self._probe_owner = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+            self._probe_owner = None
+
+
+class HFInferenceClient:
+    """Pooled, retrying, circuit-broken client for the text-generation endpoint"""
+
+    def __init__(self, api_url=HF_API_URL, token=None, connect_timeout=3.0, read_timeout=10.0,
+                 max_retries=2, backoff_base=0.25, backoff_max=2.0, max_concurrency=8,
+                 acquire_timeout=1.0, breaker=None):
+        self.api_url = api_url
+        self.token = token
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.breaker = breaker or CircuitBreaker()
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+    def _get_session(self):
+        # Pooled connections must not be shared with a forked child
+        if self._session is None or self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    if self.token:
+                        session.headers['Authorization'] = f"Bearer {self.token}"
+                    self._session = session
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # Full jitter keeps concurrent retries from arriving in lockstep
+        time.sleep(random.uniform(0, delay))
+
+    def generate(self, prompt, deadline=None):
+        """POST ``prompt`` and return the decoded JSON response.
+
+        ``deadline`` (a ``time.monotonic()`` value) shortens the read timeout and
+        stops retrying once it is reached.
+        """
+        acquire_timeout = self.acquire_timeout
+        if deadline is not None:
+            acquire_timeout = max(0.0, min(acquire_timeout, deadline - time.monotonic()))
+        if not self._slots.acquire(timeout=acquire_timeout):
+            raise EndpointUnavailableError(f"Too many concurrent requests to {self.api_url}")
+        try:
+            # Checked before allow(), which may hand this call the half-open probe
+            if deadline is not None and deadline - time.monotonic() <= 0:
+                raise EndpointUnavailableError("Deadline reached before calling the endpoint")
+            if not self.breaker.allow():
+                raise EndpointUnavailableError(f"Circuit open for {self.api_url}")
+            return self._send(prompt, deadline)
+        finally:
+            # A probe that ended without recording an outcome (e.g. an unexpected exception)
+            # must not keep the breaker half-open forever
+            self.breaker.release_probe()
+            self._slots.release()
+
+    def _send(self, prompt, deadline):
+        """The retry loop of ``generate``; records the outcome on the breaker"""
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._backoff(attempt - 1)
+            timeout = self.timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if last_error is None:
+                        raise EndpointUnavailableError("Deadline reached before calling the endpoint")
+                    break
+                timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+            try:
+                response = self._get_session().post(self.api_url, json={"inputs": prompt}, timeout=timeout)
+                if response.status_code in RETRYABLE_STATUS:
+                    last_error = requests.exceptions.HTTPError(
+                        f"{response.status_code} from inference endpoint", response=response)
+                    continue
+                response.raise_for_status()
+                result = response.json()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                last_error = e
+                continue
+            except requests.exceptions.RequestException:
+                # Non-retryable client errors (bad token, bad request) still count against the endpoint
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return result
+
+        self.breaker.record_failure()
+        raise last_error
+
+    async def agenerate(self, prompt):
+        """asyncio wrapper around ``generate`` sharing the same pool, limits and breaker"""
+        return await asyncio.to_thread(self.generate, prompt)
+
+    async def agenerate_many(self, prompts):
+        """Generate for several prompts concurrently; failures are returned as exceptions"""
+        return await asyncio.gather(*(self.agenerate(prompt) for prompt in prompts), return_exceptions=True)
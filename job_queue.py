@@ -0,0 +1,268 @@
+"""Durable SQLite-backed job queue for asynchronous claim processing.
+
+The web request only stores the claim (form fields plus the bill bytes) and
+returns a job id; a pool of worker threads claims queued jobs, runs the handler
+and records the result, which clients fetch by polling or long-polling. Because
+the queue lives in SQLite, workers can also run as separate processes:
+
+    python job_queue.py work --workers 4
+
+A running job's row is touched every ``heartbeat_interval`` seconds; jobs left
+'running' by a crashed worker stop getting those and are re-queued after
+``stale_after`` seconds, up to ``max_attempts`` tries. Each try is identified by
+its attempt number, so a worker whose job was taken over cannot overwrite the
+newer result.
+
+Jobs keep the claim form fields and the decision, so finished jobs are deleted
+``retention`` seconds after they were submitted, and a new database file is
+created readable by its owner only.
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+class JobQueue:
+    """SQLite job table plus a pool of background worker threads"""
+
+    def __init__(self, db_path, handler, workers=2, poll_interval=0.5, stale_after=600, max_attempts=3,
+                 heartbeat_interval=None, retention=7 * 24 * 3600, prune_interval=3600):
+        self.db_path = db_path
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.heartbeat_interval = heartbeat_interval or stale_after / 4
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+
+        self._local = threading.local()
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+
+        os.close(os.open(db_path, os.O_CREAT | os.O_RDWR, 0o600))
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                bill BLOB,
+                filename TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                updated REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+
+    def _connect(self):
+        """One connection per thread (and per process, after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def start(self):
+        """Start the worker threads in this process (idempotent, fork-aware)"""
+        if not self.workers or (self._pid == os.getpid() and all(t.is_alive() for t in self._threads)):
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [threading.Thread(target=self._work, name=f'claim-job-worker-{i}', daemon=True)
+                             for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def enqueue(self, payload, bill=None, filename=None):
+        """Persist a job and return its id; workers pick it up asynchronously"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (id, status, payload, bill, filename, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(payload), bill, filename, now, now))
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return job_id
+
+    def get(self, job_id):
+        """Job status dict, with the result once finished; None for unknown ids"""
+        row = self._connect().execute(
+            "SELECT status, result, error, attempts, created, updated FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        status, result, error, attempts, created, updated = row
+        job = {'job_id': job_id, 'status': status, 'attempts': attempts, 'created': created, 'updated': updated}
+        if result is not None:
+            job['result'] = json.loads(result)
+        if error is not None:
+            job['error'] = error
+        return job
+
+    def wait(self, job_id, timeout):
+        """Long-poll: return the job once finished or when ``timeout`` seconds have passed"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in (DONE, FAILED) or remaining <= 0:
+                return job
+            # In-process workers notify on completion; the timeout covers workers in other processes
+            with self._wakeup:
+                self._wakeup.wait(min(remaining, 0.1))
+
+    def _claim_next(self):
+        """Atomically move the oldest queued (or stale running) job to running"""
+        conn = self._connect()
+        while True:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, payload, bill, filename, attempts FROM jobs "
+                    "WHERE status = ? OR (status = ? AND updated < ?) ORDER BY created LIMIT 1",
+                    (QUEUED, RUNNING, now - self.stale_after)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                job_id, payload, bill, filename, attempts = row
+                if attempts >= self.max_attempts:
+                    conn.execute("UPDATE jobs SET status = ?, error = ?, bill = NULL, updated = ? WHERE id = ?",
+                                 (FAILED, f"Gave up after {attempts} attempts", now, job_id))
+                    conn.execute("COMMIT")
+                    continue
+                conn.execute("UPDATE jobs SET status = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                             (RUNNING, now, job_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return job_id, attempts + 1, json.loads(payload), bill, filename
+
+    def _heartbeat(self, job_id, attempt, done):
+        """Renew a running job's lease until ``done`` is set, so it is not taken as stale"""
+        while not done.wait(self.heartbeat_interval):
+            try:
+                renewed = self._connect().execute(
+                    "UPDATE jobs SET updated = ? WHERE id = ? AND status = ? AND attempts = ?",
+                    (time.time(), job_id, RUNNING, attempt)).rowcount
+            except sqlite3.Error as e:
+                logger.warning("Error renewing claim job %s: %s", job_id, e)
+                continue
+            if not renewed:
+                return
+
+    def _finish(self, job_id, attempt, status, result=None, error=None):
+        # The bill is dropped once processed; only the decision is kept
+        finished = self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, bill = NULL, updated = ? "
+            "WHERE id = ? AND status = ? AND attempts = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(),
+             job_id, RUNNING, attempt)).rowcount
+        if not finished:
+            logger.warning("Claim job %s was taken over by another worker; dropping attempt %s", job_id, attempt)
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def prune(self):
+        """Delete finished jobs submitted more than ``retention`` seconds ago; returns how many"""
+        return self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND created < ?",
+            (DONE, FAILED, time.time() - self.retention)).rowcount
+
+    def run_once(self):
+        """Process one job if available; returns False when the queue is empty"""
+        if self.retention is not None and time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + self.prune_interval
+            try:
+                pruned = self.prune()
+            except sqlite3.Error as e:
+                logger.warning("Error pruning finished claim jobs: %s", e)
+            else:
+                if pruned:
+                    logger.info("Deleted %s finished claim jobs past retention", pruned)
+        try:
+            job = self._claim_next()
+        except sqlite3.Error as e:
+            logger.error("Job queue error: %s", e)
+            return False
+        if job is None:
+            return False
+
+        job_id, attempt, payload, bill, filename = job
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, attempt, done),
+                         name=f'claim-job-heartbeat-{job_id[:8]}', daemon=True).start()
+        try:
+            result = self.handler(payload, bill, filename)
+        except Exception as e:
+            logger.exception("Claim job %s failed: %s", job_id, e)
+            self._finish(job_id, attempt, FAILED, error=str(e))
+        else:
+            self._finish(job_id, attempt, DONE, result=result)
+        finally:
+            done.set()
+        return True
+
+    def _work(self):
+        while not self._stopping.is_set():
+            if not self.run_once():
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+
+    def counts(self):
+        """Number of jobs per status"""
+        return dict(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run claim job workers outside the web process")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    work_parser = subparsers.add_parser('work', help="Process queued claims until interrupted")
+    work_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+    if args.command == 'work':
+        import app
+
+        queue = app.job_queue
+        queue.workers = args.workers
+        queue.start()
+        logger.info("Processing claim jobs from %s with %s workers", queue.db_path, args.workers)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            queue.stop(timeout=5)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+"""Lazily loaded local question-answering model used as the last extraction fallback.
+
+Nothing heavy happens at import: transformers/torch are imported and the model
+is loaded on first use, or ahead of time by ``warm_up_local_qa`` in a background
+thread. A model loaded before a fork (gunicorn ``preload_app``) is shared by the
+forked workers; a load still in progress is not, and the child starts its own.
+When ``LOCAL_QA_SOCKET`` is set, workers do not load the model at all and
+instead talk to a single shared model server over a local socket. Questions are
+micro-batched across concurrent claims (see ``qa_batcher``), in the worker or,
+with a model server, across all workers:
+
+    export LOCAL_QA_AUTHKEY=$(python -c 'import secrets; print(secrets.token_hex(32))')
+    python local_model.py serve --socket "$XDG_RUNTIME_DIR/claim-qa.sock"
+
+The server unpickles what clients send, so it only talks to clients holding
+``LOCAL_QA_AUTHKEY``; there is no default key, and the socket is created
+readable and writable by its owner only.
+"""
+import argparse
+import logging
+import os
+import socket
+import stat
+import threading
+from multiprocessing.connection import Client, Listener
+
+from qa_batcher import QABatcher
+
+logger = logging.getLogger(__name__)
+
+LOCAL_QA_MODEL = os.environ.get('LOCAL_QA_MODEL', "distilbert-base-cased-distilled-squad")
+LOCAL_QA_SOCKET = os.environ.get('LOCAL_QA_SOCKET') or None
+LOCAL_QA_AUTHKEY = os.environ.get('LOCAL_QA_AUTHKEY', '').encode() or None
+LOCAL_QA_BATCH_SIZE = int(os.environ.get('LOCAL_QA_BATCH_SIZE', 16))
+LOCAL_QA_BATCH_WAIT_MS = float(os.environ.get('LOCAL_QA_BATCH_WAIT_MS', 5))
+LOCAL_QA_MAX_CONTEXT_TOKENS = int(os.environ.get('LOCAL_QA_MAX_CONTEXT_TOKENS', 1024))
+# LOCAL_QA_WARMUP=1 loads the model in the background at boot, LOCAL_QA_PRELOAD=1 before
+# gunicorn forks its workers (see wsgi.py); either way readiness waits for it
+LOCAL_QA_WARMUP = os.environ.get('LOCAL_QA_WARMUP') == '1'
+LOCAL_QA_PRELOAD = os.environ.get('LOCAL_QA_PRELOAD') == '1'
+
+_local_qa = None
+_load_attempted = False
+_load_lock = threading.Lock()
+_warmup_thread = None
+_qa_batcher = None
+
+
+def load_local_qa():
+    """Import transformers and build the QA pipeline; None if unavailable"""
+    try:
+        from transformers import pipeline
+        # Use a smaller, efficient model
+        return pipeline('question-answering', model=LOCAL_QA_MODEL)
+    except ImportError:
+        return None
+    except Exception as e:
+        logger.error("Error loading local model: %s", e)
+        return None
+
+
+def get_local_qa():
+    """The local QA callable, loading it on first use (or a model-server client)"""
+    global _local_qa, _load_attempted
+
+    if LOCAL_QA_SOCKET:
+        return ModelServerClient(LOCAL_QA_SOCKET)
+
+    if not _load_attempted:
+        with _load_lock:
+            if not _load_attempted:
+                _local_qa = load_local_qa()
+                _load_attempted = True
+    return _local_qa
+
+
+def warm_up_local_qa():
+    """Start loading the model in a background thread so the first fallback is not slow"""
+    global _warmup_thread
+
+    if LOCAL_QA_SOCKET or _load_attempted:
+        return None
+    if _warmup_thread is None or not _warmup_thread.is_alive():
+        _warmup_thread = threading.Thread(target=get_local_qa, name='local-qa-warmup', daemon=True)
+        _warmup_thread.start()
+    return _warmup_thread
+
+
+def get_qa_batcher():
+    """Process-wide batcher around the local pipeline; None if the model is unavailable"""
+    global _qa_batcher
+
+    if _qa_batcher is None:
+        qa = get_local_qa()
+        if qa is None:
+            return None
+        with _load_lock:
+            if _qa_batcher is None:
+                _qa_batcher = QABatcher(qa, max_batch_size=LOCAL_QA_BATCH_SIZE,
+                                        max_wait_ms=LOCAL_QA_BATCH_WAIT_MS,
+                                        max_context_tokens=LOCAL_QA_MAX_CONTEXT_TOKENS)
+    return _qa_batcher
+
+
+def ask_local_qa(pairs, timeout=None):
+    """Answer (question, context) pairs with the local model; None if it is unavailable.
+
+    Raises TimeoutError if the answers take longer than ``timeout`` seconds.
+    """
+    if LOCAL_QA_SOCKET:
+        return ModelServerClient(LOCAL_QA_SOCKET).ask_many(pairs, timeout=timeout)
+
+    batcher = get_qa_batcher()
+    if batcher is None:
+        return None
+    return batcher.ask_many(pairs, timeout=timeout)
+
+
+def is_local_qa_loaded():
+    """True once a load attempt has finished (successfully or not)"""
+    return _load_attempted
+
+
+def model_server_reachable(address, timeout=1.0):
+    """True if something accepts connections on the model server socket (a stale file does not)"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.settimeout(timeout)
+            probe.connect(address)
+    except OSError:
+        return False
+    return True
+
+
+def local_qa_status():
+    """'ready', 'unavailable', 'loading', 'not_loaded', or 'server'/'server_down' with a model server"""
+    if LOCAL_QA_SOCKET:
+        return 'server' if model_server_reachable(LOCAL_QA_SOCKET) else 'server_down'
+    if _load_attempted:
+        return 'ready' if _local_qa is not None else 'unavailable'
+    if _warmup_thread is not None and _warmup_thread.is_alive():
+        return 'loading'
+    return 'not_loaded'
+
+
+def is_local_qa_warm():
+    """False while a configured warm-up or preload has not finished, or the model server is down"""
+    status = local_qa_status()
+    if status in ('loading', 'server_down'):
+        return False
+    return status != 'not_loaded' or not (LOCAL_QA_WARMUP or LOCAL_QA_PRELOAD)
+
+
+def _reset_after_fork():
+    # A worker forked while the parent's warm-up thread held the load lock would wait on
+    # it forever; the thread itself is gone, so the child loads the model on first use
+    # (gunicorn's post_fork restarts the warm-up in web workers; other forked children,
+    # such as OCR and batch pool processes, must not load the model)
+    global _load_lock, _warmup_thread
+    _load_lock = threading.Lock()
+    _warmup_thread = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _authkey():
+    """The model server key; it has no default, since anyone holding it can run code in the server"""
+    if not LOCAL_QA_AUTHKEY:
+        raise RuntimeError("LOCAL_QA_AUTHKEY must be set to use the local QA model server")
+    return LOCAL_QA_AUTHKEY
+
+
+class ModelServerClient:
+    """Callable with the pipeline's ``(question=, context=)`` interface, backed by the model server"""
+
+    _local = threading.local()
+
+    def __init__(self, address):
+        self.address = address
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = Client(self.address, family='AF_UNIX', authkey=_authkey())
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def ask_many(self, pairs, timeout=None):
+        """Send a group of (question, context) pairs in one round trip"""
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send({'pairs': list(pairs)})
+                if timeout is not None and not conn.poll(timeout):
+                    # The late answer would be read by the next request, so the connection is dropped
+                    conn.close()
+                    self._local.conn = None
+                    raise TimeoutError(f"No answer from the model server within {timeout:.1f}s")
+                response = conn.recv()
+                break
+            except TimeoutError:
+                # A timeout is not a dropped connection: asking again would double the deadline
+                raise
+            except (OSError, EOFError):
+                # The server may have restarted; reconnect once before giving up
+                self._local.conn = None
+                if attempt:
+                    raise
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['answers']
+
+    def __call__(self, question, context):
+        return self.ask_many([(question, context)])[0]
+
+
+def _serve_connection(conn, batcher):
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                return
+            try:
+                conn.send({'answers': batcher.ask_many(request['pairs'])})
+            except Exception as e:
+                conn.send({'error': str(e)})
+
+
+def serve(address):
+    """Load the model once and answer QA requests from any number of workers"""
+    authkey = _authkey()
+    qa = load_local_qa()
+    if qa is None:
+        raise SystemExit("Local QA model could not be loaded")
+
+    # One model instance shared by all connections, batching their questions together
+    batcher = QABatcher(qa, max_batch_size=LOCAL_QA_BATCH_SIZE, max_wait_ms=LOCAL_QA_BATCH_WAIT_MS,
+                        max_context_tokens=LOCAL_QA_MAX_CONTEXT_TOKENS)
+    if os.path.lexists(address):
+        if not stat.S_ISSOCK(os.lstat(address).st_mode):
+            raise SystemExit(f"{address} exists and is not a socket")
+        os.remove(address)
+    # The socket is owner-only from the moment it is bound
+    umask = os.umask(0o177)
+    try:
+        listener = Listener(address, family='AF_UNIX', authkey=authkey)
+    finally:
+        os.umask(umask)
+    with listener:
+        logger.info("Local QA model server listening on %s", address)
+        while True:
+            try:
+                conn = listener.accept()
+            except EOFError:
+                # Readiness probes connect and hang up without authenticating
+                logger.debug("Model server connection closed before authenticating")
+                continue
+            except Exception as e:
+                logger.warning("Model server accept error: %s", e)
+                continue
+            threading.Thread(target=_serve_connection, args=(conn, batcher), daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared local QA model server")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help="Host the model for all workers")
+    serve_parser.add_argument('--socket', default=LOCAL_QA_SOCKET,
+                              help="Socket path in a directory only the service user can write to "
+                                   "(default: LOCAL_QA_SOCKET)")
+    args = parser.parse_args(argv)
+    if not args.socket:
+        parser.error("--socket or LOCAL_QA_SOCKET is required")
+    if not LOCAL_QA_AUTHKEY:
+        parser.error("set LOCAL_QA_AUTHKEY to a secret shared with the workers")
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+    if args.command == 'serve':
+        serve(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""OCR fallback for bill pages that have no text layer (scanned bills).
+
+Only pages where PyPDF2 finds no text are OCR'd. Each page is rasterized with
+pdf2image, downscaled so its longest side is at most ``OCR_MAX_SIDE`` pixels and
+binarized with OpenCV, then read with easyocr. Pages run in parallel on a process
+pool of ``OCR_WORKERS`` workers; each worker loads the easyocr reader once in its
+initializer and reuses it for every page. ``OCR_WORKERS=0`` runs in the calling
+process, which is what batch workers do since they are already one per core.
+Each web worker has its own pool, so gunicorn.conf.py defaults ``OCR_WORKERS`` to
+the cores divided among the web workers. Pool processes come from a forkserver
+rather than a fork of a threaded web worker, whose locks another thread may hold.
+
+Results are cached per page fingerprint (a hash of the page's content and image
+streams), so a scan resubmitted inside a different PDF is not OCR'd again.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+OCR_ENABLED = os.environ.get('OCR_ENABLED', '1') == '1'
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', min(4, os.cpu_count() or 1)))
+OCR_LANGUAGES = os.environ.get('OCR_LANGUAGES', 'en').split(',')
+OCR_DPI = int(os.environ.get('OCR_DPI', 200))
+OCR_MAX_SIDE = int(os.environ.get('OCR_MAX_SIDE', 2000))
+
+# Bump when rasterization or post-processing changes so cached page text is ignored
+OCR_VERSION = '1'
+
+_reader = None
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_unavailable_logged = False
+
+
+def is_ocr_available():
+    """True when easyocr, pdf2image and OpenCV can all be imported"""
+    try:
+        import cv2  # noqa: F401
+        import easyocr  # noqa: F401
+        import pdf2image  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def page_fingerprint(page):
+    """Hash of a PyPDF2 page's content stream and image XObjects; None for pages without images"""
+    contents = page.get_contents()
+    data = contents.get_data() if contents is not None else b''
+    resources = page.get('/Resources')
+    xobjects = resources.get_object().get('/XObject') if resources else None
+    # Blank pages have nothing to OCR; inline images start with the BI operator
+    if not xobjects and b'BI' not in data:
+        return None
+
+    digest = hashlib.sha256(OCR_VERSION.encode())
+    digest.update(data)
+    if xobjects:
+        for name, ref in sorted(xobjects.get_object().items()):
+            digest.update(name.encode())
+            # The encoded stream is enough to identify the image; decoding it is not needed
+            digest.update(getattr(ref.get_object(), '_data', b'') or b'')
+    return digest.hexdigest()
+
+
+def prepare_image(image):
+    """Grayscale page raster -> downscaled, binarized uint8 array"""
+    import cv2
+    import numpy as np
+
+    image = np.asarray(image)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    height, width = image.shape[:2]
+    scale = OCR_MAX_SIDE / float(max(height, width))
+    if scale < 1:
+        image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    _, image = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return image
+
+
+def boxes_to_lines(results):
+    """Join easyocr (box, text, confidence) results into text lines, top to bottom.
+
+    Boxes whose vertical centres lie within half a box height of each other form
+    one line, so "Amount payable" and "3150" stay on the same line as in the bill.
+    """
+    boxes = []
+    for box, text, _ in results:
+        ys = [point[1] for point in box]
+        boxes.append(((min(ys) + max(ys)) / 2.0, max(ys) - min(ys), min(point[0] for point in box), text))
+    boxes.sort()
+
+    lines = []
+    current = []
+    for box in boxes:
+        if current and abs(box[0] - current[-1][0]) > max(box[1], current[-1][1]) / 2.0:
+            lines.append(current)
+            current = []
+        current.append(box)
+    if current:
+        lines.append(current)
+    return "\n".join(" ".join(box[3] for box in sorted(line, key=lambda b: b[2])) for line in lines)
+
+
+def _init_worker():
+    """Load the OCR reader once per process"""
+    global _reader
+    if _reader is None:
+        import easyocr
+        _reader = easyocr.Reader(OCR_LANGUAGES, gpu=False, verbose=False)
+
+
+def _ocr_page(pdf_path, index):
+    """Rasterize and OCR one page; runs in a pool worker (or inline)"""
+    from pdf2image import convert_from_path
+
+    _init_worker()
+    images = convert_from_path(pdf_path, dpi=OCR_DPI, first_page=index + 1, last_page=index + 1, grayscale=True)
+    if not images:
+        return index, ""
+    image = prepare_image(images[0])
+    images[0].close()
+    return index, boxes_to_lines(_reader.readtext(image))
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    # A pool inherited through fork belongs to the parent
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=_init_worker,
+                                            mp_context=multiprocessing.get_context('forkserver'))
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def ocr_pages(file, pages, cache=None):
+    """OCR text for ``pages``, a dict of page index -> fingerprint; returns {index: text}.
+
+    ``file`` is the PDF as a seekable binary file. ``cache`` is an optional
+    BillCache; page text is stored under the page fingerprint.
+    """
+    global _unavailable_logged
+
+    if not pages or not OCR_ENABLED:
+        return {}
+    if not is_ocr_available():
+        if not _unavailable_logged:
+            logger.warning("Bill has pages without a text layer, but easyocr, pdf2image or opencv is not installed")
+            _unavailable_logged = True
+        return {}
+
+    texts = {}
+    missing = []
+    for index, fingerprint in pages.items():
+        entry = cache.get(f"ocr:{fingerprint}") if cache is not None else None
+        if entry is not None:
+            texts[index] = entry['text']
+        else:
+            missing.append(index)
+    if not missing:
+        return texts
+
+    # pdf2image needs a path; workers read their page from the same spooled copy
+    fd, pdf_path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if hasattr(file, 'getbuffer'):
+                with file.getbuffer() as view:
+                    f.write(view)
+            else:
+                file.seek(0)
+                f.write(file.read())
+                file.seek(0)
+
+        if OCR_WORKERS > 0:
+            results = _get_pool().map(_ocr_page, [pdf_path] * len(missing), missing)
+        else:
+            results = (_ocr_page(pdf_path, index) for index in missing)
+        for index, text in results:
+            texts[index] = text
+            if cache is not None and text:
+                cache.put(f"ocr:{pages[index]}", text=text)
+    except Exception as e:
+        logger.warning("OCR failed: %s", e)
+    finally:
+        os.remove(pdf_path)
+
+    logger.debug("OCR'd %s of %s image-only pages", len(missing), len(pages))
+    return texts
@@ -0,0 +1,165 @@
+"""Insurance product definitions loaded from versioned policy files.
+
+Each product lives in ``<policy_dir>/<product>.v<version>.json``; when several
+versions of a product are present the highest one is active. A file defines::
+
+    product, version, name, documents_required,
+    required_fields      patient fields that must be filled in
+    amount_tolerance     {"percent": 1.0, "minimum": 1.0}
+    coverage_cap         maximum approved amount per claim, or null
+    decision_order       order of the "completeness", "exclusion" and "amount" checks
+    exclusions           rules as accepted by exclusion_index.ExclusionIndex
+
+Files are compiled into ``CompiledPolicy`` objects at startup and looked up by
+product id in a dict. The directory is re-checked at most every
+``reload_interval`` seconds; changed files are recompiled and swapped in without
+restarting workers, and a broken file leaves the previous policies active.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from exclusion_index import ExclusionIndex
+
+logger = logging.getLogger(__name__)
+
+POLICY_FILE_PATTERN = re.compile(r'^(?P<product>[A-Za-z0-9_-]+)\.v(?P<version>\d+)\.json$')
+
+DECISION_CHECKS = ('completeness', 'exclusion', 'amount')
+
+# Claim outcomes shared by claim reports and bulk re-adjudication; bulk results
+# store the position in this tuple
+DECISION_CODES = ('APPROVED_FULL', 'APPROVED_PARTIAL', 'APPROVED_CAPPED', 'REJECTED_INCOMPLETE',
+                  'REJECTED_EXCLUDED', 'REJECTED_AMOUNT', 'UNKNOWN_PRODUCT')
+
+# Rejection code for each failed check
+CHECK_DECISION_CODES = {'completeness': 'REJECTED_INCOMPLETE', 'exclusion': 'REJECTED_EXCLUDED',
+                        'amount': 'REJECTED_AMOUNT'}
+
+
+class PolicyError(ValueError):
+    """Raised for an invalid policy file"""
+
+
+class CompiledPolicy:
+    """In-memory decision structure for one product version"""
+
+    def __init__(self, definition, source=None):
+        try:
+            self.product = definition['product']
+            self.version = int(definition['version'])
+        except (KeyError, TypeError, ValueError):
+            raise PolicyError(f"Policy {source or ''} needs a 'product' and an integer 'version'")
+
+        self.source = source
+        self.name = definition.get('name', self.product)
+        self.documents_required = definition.get('documents_required', '')
+        self.required_fields = tuple(definition.get('required_fields', ('name', 'address', 'claim_reason')))
+
+        tolerance = definition.get('amount_tolerance', {})
+        self.tolerance_percent = float(tolerance.get('percent', 1.0))
+        self.tolerance_minimum = float(tolerance.get('minimum', 1.0))
+
+        cap = definition.get('coverage_cap')
+        self.coverage_cap = float(cap) if cap is not None else None
+
+        self.decision_order = tuple(definition.get('decision_order', DECISION_CHECKS))
+        if sorted(self.decision_order) != sorted(DECISION_CHECKS):
+            raise PolicyError(f"Policy {self.product} decision_order must list each of {', '.join(DECISION_CHECKS)} once")
+
+        self.exclusion_rules = list(definition.get('exclusions', []))
+        self.exclusion_index = ExclusionIndex(self.exclusion_rules)
+        self.exclusions = list(self.exclusion_index.terms)
+
+    def amount_tolerance(self, bill_expense):
+        """Allowed difference between claim and bill amounts"""
+        return max(self.tolerance_minimum, bill_expense * self.tolerance_percent / 100.0)
+
+    def documents(self):
+        """Human-readable policy summary, as shown to claimants"""
+        return {
+            "claim_approval": f"Documents required: {self.documents_required}",
+            "exclusions": "General exclusions: " + ", ".join(self.exclusions)
+        }
+
+
+class PolicyEngine:
+    """Holds the active version of every product and hot-reloads the policy directory"""
+
+    def __init__(self, policy_dir, default_product, reload_interval=2.0):
+        self.policy_dir = policy_dir
+        self.default_product = default_product
+        self.reload_interval = reload_interval
+
+        self._policies = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+        self.reload()
+
+    def _directory_signature(self):
+        entries = []
+        for entry in os.scandir(self.policy_dir):
+            if POLICY_FILE_PATTERN.match(entry.name):
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(entries))
+
+    def reload(self):
+        """Recompile every policy file; keeps the current policies if any file is invalid"""
+        with self._reload_lock:
+            signature = self._directory_signature()
+            policies = {}
+            for name, _, _ in signature:
+                path = os.path.join(self.policy_dir, name)
+                try:
+                    with open(path) as f:
+                        policy = CompiledPolicy(json.load(f), source=path)
+                except (OSError, ValueError) as e:
+                    # json.JSONDecodeError and PolicyError are both ValueErrors
+                    logger.error("Error loading policy %s: %s", path, e)
+                    if self._policies:
+                        self._signature = signature
+                        return False
+                    raise
+                current = policies.get(policy.product)
+                if current is None or policy.version > current.version:
+                    policies[policy.product] = policy
+
+            if self.default_product not in policies:
+                message = f"Default policy product '{self.default_product}' not found in {self.policy_dir}"
+                if self._policies:
+                    logger.error(message)
+                    self._signature = signature
+                    return False
+                raise PolicyError(message)
+
+            # Swapping the dict is atomic, so readers never see a half-built set
+            self._policies = policies
+            self._signature = signature
+            self._checked_at = time.monotonic()
+            return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            if self._directory_signature() != self._signature:
+                logger.info("Policy files changed, reloading %s", self.policy_dir)
+                self.reload()
+        except OSError as e:
+            logger.warning("Error checking policy directory: %s", e)
+
+    def get(self, product=None):
+        """Active CompiledPolicy for ``product`` (default product if empty), or None if unknown"""
+        self._maybe_reload()
+        return self._policies.get(product or self.default_product)
+
+    def products(self):
+        """product -> active version"""
+        return {product: policy.version for product, policy in self._policies.items()}
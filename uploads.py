@@ -0,0 +1,165 @@
+"""Size-limited, spooled bill uploads read through a single buffer.
+
+Request bodies over ``MAX_UPLOAD_BYTES`` are refused by Werkzeug from the
+Content-Length header (or once that much has been streamed) before anything is
+buffered. ``POST /batch`` has its own limit, ``BATCH_MAX_UPLOAD_BYTES``, since it
+carries a whole archive. Uploaded files stay in memory up to
+``UPLOAD_SPOOL_BYTES`` and are spooled to a temporary file in ``UPLOAD_TMP_DIR``
+beyond that.
+
+``open_upload`` turns an uploaded file into a ``BillUpload``. Small uploads are
+read once into bytes. Spooled ones are memory-mapped from the spool file, so no
+copy is made. Either buffer is checked for the ``%PDF-`` header, hashed for the
+bill cache and duplicate index, and read by PdfReader, without reading the
+stream again. Mapped pages are dropped from the process once they have been
+hashed or copied out by a large read, so concurrent large uploads do not each
+keep their full size resident.
+"""
+import hashlib
+import io
+import logging
+import mmap
+import os
+import tempfile
+
+from flask import Request
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 64 * 1024 * 1024))
+BATCH_MAX_UPLOAD_BYTES = int(os.environ.get('BATCH_MAX_UPLOAD_BYTES', 2 * 1024 * 1024 * 1024))
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_BYTES', 1024 * 1024))
+UPLOAD_TMP_DIR = os.environ.get('UPLOAD_TMP_DIR') or None
+
+# PDF readers accept the header anywhere in the first 1024 bytes
+PDF_MAGIC = b'%PDF-'
+PDF_HEADER_WINDOW = 1024
+
+# Hashing granularity; each hashed block of a mapped upload is released right after
+HASH_BLOCK_BYTES = 4 * 1024 * 1024
+# Reads from a mapped upload at least this large release their pages afterwards
+RELEASE_READ_BYTES = 1024 * 1024
+
+
+class UploadError(ValueError):
+    """An upload that is too large or not a PDF"""
+
+
+class UploadRequest(Request):
+    """Flask request with per-endpoint body limits and a configurable upload spool"""
+
+    @property
+    def max_content_length(self):
+        return BATCH_MAX_UPLOAD_BYTES if self.path == '/batch' else MAX_UPLOAD_BYTES
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES, mode='rb+', dir=UPLOAD_TMP_DIR)
+
+
+def looks_like_pdf(file):
+    """True if a seekable binary file starts with a PDF header; the position is kept"""
+    position = file.tell()
+    try:
+        head = file.read(PDF_HEADER_WINDOW)
+    finally:
+        file.seek(position)
+    return PDF_MAGIC in head
+
+
+class BillUpload:
+    """A bill upload opened once: its bytes (or mapping), size, digest and a reader position.
+
+    It is file-like (``read``/``seek``/``tell``) for PdfReader, and ``buffer``
+    can be passed to anything that accepts bytes-like objects.
+    """
+
+    def __init__(self, buffer, filename, mapping=None):
+        self.buffer = buffer
+        self.filename = filename
+        self.size = len(buffer)
+        self._mapping = mapping
+        self._reader = mapping if mapping is not None else io.BytesIO(buffer)
+        self._sha256 = None
+
+    def _release(self, start, length):
+        """Drop mapped pages from this process; they are read back from the spool file if touched again"""
+        if self._mapping is None or not hasattr(self._mapping, 'madvise'):
+            return
+        aligned = start - start % mmap.PAGESIZE
+        self._mapping.madvise(mmap.MADV_DONTNEED, aligned, min(length + start - aligned, self.size - aligned))
+
+    def sha256(self):
+        """Hex digest of the upload, computed once"""
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            with memoryview(self.buffer) as view:
+                for start in range(0, self.size, HASH_BLOCK_BYTES):
+                    digest.update(view[start:start + HASH_BLOCK_BYTES])
+                    self._release(start, HASH_BLOCK_BYTES)
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    def read(self, size=-1):
+        start = self._reader.tell()
+        data = self._reader.read(size)
+        # Large reads (image streams) are copied out by the caller, so their pages are not needed twice
+        if len(data) >= RELEASE_READ_BYTES:
+            self._release(start, len(data))
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._reader.seek(offset, whence)
+
+    def tell(self):
+        return self._reader.tell()
+
+    def getbuffer(self):
+        return memoryview(self.buffer)
+
+    def close(self):
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _check_size(size, max_bytes):
+    if size > max_bytes:
+        raise UploadError(f"The uploaded bill is {size // (1024 * 1024)} MB; the limit is "
+                          f"{max_bytes // (1024 * 1024)} MB.")
+
+
+def open_upload(file, filename=None, max_bytes=MAX_UPLOAD_BYTES):
+    """BillUpload for a Werkzeug FileStorage or binary file object; raises UploadError"""
+    filename = filename or getattr(file, 'filename', None) or ''
+    stream = getattr(file, 'stream', file)
+
+    mapping = None
+    if isinstance(stream, io.BytesIO):
+        # Already in memory (batch and queued bills); getvalue() shares the bytes
+        with stream.getbuffer() as view:
+            _check_size(view.nbytes, max_bytes)
+        data = stream.getvalue()
+    else:
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        _check_size(size, max_bytes)
+        if size > UPLOAD_SPOOL_BYTES:
+            try:
+                mapping = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+                mapping = None
+        data = mapping if mapping is not None else stream.read()
+
+    if PDF_MAGIC not in data[:PDF_HEADER_WINDOW]:
+        if mapping is not None:
+            mapping.close()
+        logger.info("Rejected upload %r: no PDF header", filename)
+        raise UploadError("The uploaded file is not a PDF. Please upload the medical bill as a PDF file.")
+    return BillUpload(data, filename, mapping)
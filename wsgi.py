@@ -0,0 +1,22 @@
+"""WSGI entry point for production serving: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Importing this module builds everything workers only read: policies and their
+exclusion indexes, bill templates, compiled patterns and, with
+``LOCAL_QA_PRELOAD=1`` or ``LOCAL_QA_WARMUP=1``, the local QA model. Under gunicorn's ``preload_app``
+that happens once in the master, and forked workers share those pages
+copy-on-write instead of each building a copy. Per-process resources (SQLite
+connections, the HTTP session, batcher, job and OCR workers) are opened lazily
+in each worker.
+"""
+import logging
+
+import local_model
+from app import app  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+if local_model.LOCAL_QA_PRELOAD or local_model.LOCAL_QA_WARMUP:
+    # Loaded (or the warm-up started by app waited for) before returning, so workers are
+    # forked with the model in memory instead of each loading their own
+    local_model.get_local_qa()
+    logger.info("Local QA model preloaded: %s", local_model.local_qa_status())